@@ -0,0 +1,4 @@
+import sys
+from prrd.prrdcli import main
+
+sys.exit(main())
@@ -0,0 +1,288 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import json
+import math
+import os
+import shlex
+import subprocess
+import sys
+import time as systime
+
+from prrd.prrdgraphs import SPECS
+
+# rules checked when the settings file has none, thresholds in the unit of the
+# graph after multiplying by 'factor'
+RULES = [
+    {'name': 'temperature', 'type': 'temperature', 'reduce': 'MAX', 'warn': 50, 'alarm': 70},
+    {'name': 'temperature', 'type': 'temperature_rpi', 'factor': 0.001, 'reduce': 'MAX', 'warn': 50, 'alarm': 70},
+    {'name': 'gpu_temperature', 'type': 'gpu_temperature', 'instances': '*', 'reduce': 'MAX', 'warn': 50, 'alarm': 70},
+    {'name': 'disk_free', 'type': 'df_root', 'rrd': 'free', 'reduce': 'LAST', 'below': True,
+     'warn': 5e9, 'alarm': 1e9},
+    {'name': 'disk_free', 'type': 'df', 'rrd': 'free', 'instances': '*', 'reduce': 'LAST', 'below': True,
+     'warn': 5e9, 'alarm': 1e9},
+    {'name': 'load', 'type': 'load', 'ds': 'shortterm', 'warn': 4, 'alarm': 8},
+    # bans per hour
+    {'name': 'fail2ban_bans', 'type': 'fail2ban', 'rrd': 'ban', 'factor': 3600, 'warn': 10, 'alarm': 60},
+]
+
+# VDEF function of every reduction
+VDEFS = {'AVERAGE': 'AVERAGE', 'MIN': 'MINIMUM', 'MAX': 'MAXIMUM', 'LAST': 'LAST'}
+
+##
+## @brief      Checks thresholds on the RRD files of the graphs and keeps the
+##             alert state in a json file.
+##
+## Every rule names a graph 'type' and, for graphs of several RRD files, the
+## 'rrd' of the graph specification to check; 'ds' is the data source. The
+## values of the last 'window' seconds are reduced by 'reduce' (AVERAGE, MIN,
+## MAX or LAST), multiplied by 'factor' and compared against 'warn' and
+## 'alarm', which are lower bounds when 'below' is set:
+##
+##     "alerts": {"window": 600, "state": "alerts.json", "command": "notify-send-alerts",
+##                "rules": [{"name": "load", "type": "load", "ds": "shortterm", "warn": 4, "alarm": 8}]}
+##
+## The values are not read from the RRD files again: the graphs a rule applies
+## to reduce them with a VDEF and PRINT them when they are drawn, see probe.
+## A rule whose graph was not drawn by the run, e.g. because its image was
+## up-to-date, keeps its previous state. When the level of an alert changes,
+## 'command' is run with the changed alerts as json on its standard input.
+##
+class prrdalert:
+
+    def __init__(self, base, outdir='.'):
+        """
+        @brief      Constructs the object.
+
+        @param      self    The object
+        @param      base    prrdbase object holding the settings
+        @param      outdir  directory the state file is written to by default
+        """
+        config = base.settings.get('alerts') or {}
+        self.rules = config.get('rules', RULES)
+        self.window = config.get('window', 600)
+        self.state = config.get('state', os.path.join(outdir, 'alerts.json'))
+        self.command = config.get('command')
+
+    def get_key(self, base, rule, instance=None):
+        """
+        @brief      Get the key of the alert of a rule
+
+        @param      self      The object
+        @param      base      prrdbase object of the host
+        @param      rule      alert rule
+        @param      instance  graph instance
+
+        @return     'host/name[/instance]'
+        """
+        return '/'.join([base.hostname, rule.get('name', rule['type'])] +
+                        ([str(instance)] if instance is not None else []))
+
+    def check(self, base, rule, path):
+        """
+        @brief      Check that a rule refers to a known reduction and data
+                    source of its RRD file
+
+        @param      self  The object
+        @param      base  prrdbase object of the host
+        @param      rule  alert rule
+        @param      path  path to the RRD file of the rule
+
+        @return     void, raises ValueError
+        """
+        if rule.get('reduce', 'AVERAGE') not in VDEFS:
+            raise ValueError('Unknown reduction in alert rule: %s' % rule['reduce'])
+        ds = rule.get('ds', 'value')
+        if ds not in base.get_index().get_data_sources(path):
+            raise ValueError('Unknown data source %s of %s in alert rule' % (ds, path))
+
+    def get_targets(self, base, rule):
+        """
+        @brief      Get the RRD files a rule applies to on a host
+
+        @param      self  The object
+        @param      base  prrdbase object of the host
+        @param      rule  alert rule
+
+        @return     list of tuples of the instance and the path to the RRD
+                    file, only files that exist
+        """
+        if rule['type'] not in SPECS:
+            raise ValueError('Unknown graph type in alert rule: %s' % rule['type'])
+        spec = SPECS[rule['type']]
+        instances = rule.get('instances')
+        if instances is None:
+            instances = [None]
+        elif instances == '*':
+            instances = base.get_graph_instances(rule['type'])
+
+        targets = []
+        for instance in instances:
+            rrds = spec.get_rrds(base.get_rrd_root(), instance)
+            path = rrds[rule.get('rrd', spec.rrds[0][0])]
+            if base.rrd_exists(path):
+                targets.append((instance, path))
+
+        return targets
+
+    def get_level(self, rule, value):
+        """
+        @brief      Compare a value against the thresholds of a rule
+
+        @param      self   The object
+        @param      rule   alert rule
+        @param      value  value to check, NaN if unknown
+
+        @return     'ok', 'warning', 'alarm' or 'unknown'
+        """
+        if math.isnan(value):
+            return 'unknown'
+
+        beyond = (lambda limit: value < limit) if rule.get('below') else (lambda limit: value > limit)
+        if beyond(rule['alarm']):
+            return 'alarm'
+        if beyond(rule['warn']):
+            return 'warning'
+        return 'ok'
+
+    def probe(self, base, type, instance, paths):
+        """
+        @brief      Get the graph arguments that print the reduced values of
+                    the rules applying to a graph, read back by evaluate;
+                    rules that fail their check are left out and reported by
+                    evaluate
+
+        @param      self      The object
+        @param      base      prrdbase object of the host
+        @param      type      type of the graph
+        @param      instance  graph instance
+        @param      paths     dictionary mapping RRD keys to paths
+
+        @return     list of rrdtool graph arguments
+        """
+        args = []
+        for i, rule in enumerate(self.rules):
+            instances = rule.get('instances')
+            if rule['type'] != type or not (instances == '*' or instance == instances or
+                                            isinstance(instances, list) and instance in instances):
+                continue
+            try:
+                path = paths[rule.get('rrd', SPECS[type].rrds[0][0])]
+                self.check(base, rule, path)
+            except (ValueError, KeyError):
+                continue
+
+            reduce = rule.get('reduce', 'AVERAGE')
+            # only the pixels of the last 'window' seconds are reduced
+            args += ['DEF:alert%i=%s:%s:%s' % (i, path.replace(':', '\\:'), rule.get('ds', 'value'),
+                                                reduce if reduce in ('MIN', 'MAX') else 'AVERAGE'),
+                     'CDEF:alert%iwin=TIME,NOW,%i,-,LT,UNKN,alert%i,IF' % (i, self.window, i),
+                     'VDEF:alert%ival=alert%iwin,%s' % (i, i, VDEFS[reduce]),
+                     'PRINT:alert%ival:%s=%%le' % (i, self.get_key(base, rule, instance).replace(':', '\\:'))]
+
+        return args
+
+    def evaluate(self, bases, results):
+        """
+        @brief      Check all rules on all hosts against the values printed by
+                    the graphs of a run; a rule that fails is reported as an
+                    alert of level 'error'
+
+        @param      self     The object
+        @param      bases    prrdbase objects of the hosts
+        @param      results  prrdresult objects of the run
+
+        @return     dictionary mapping 'host/name[/instance]' to the alert,
+                    None for rules whose graph was not drawn
+        """
+        # the shortest window of a graph reduces the finest rows
+        printed = {}
+        for result in sorted(results, key=lambda r: r.job.args[0], reverse=True):
+            for line in result.stats.get('prints', []):
+                key, _, value = line.rpartition('=')
+                printed[key] = float(value)
+
+        alerts = {}
+        for base in bases:
+            for rule in self.rules:
+                try:
+                    for instance, path in self.get_targets(base, rule):
+                        self.check(base, rule, path)
+                        key = self.get_key(base, rule, instance)
+                        if key not in printed:
+                            alerts[key] = None
+                            continue
+                        value = printed[key] * rule.get('factor', 1)
+                        alerts[key] = {'level': self.get_level(rule, value),
+                                       'value': None if math.isnan(value) else float(value),
+                                       'warn': rule['warn'], 'alarm': rule['alarm'],
+                                       'below': bool(rule.get('below'))}
+                except Exception as e:
+                    alerts[self.get_key(base, rule)] = {'level': 'error',
+                                                        'error': '%s: %s' % (type(e).__name__, e)}
+
+        return alerts
+
+    def update(self, alerts):
+        """
+        @brief      Merge alerts into the state file and run the command on
+                    the alerts whose level changed
+
+        @param      self    The object
+        @param      alerts  dictionary of alerts, see evaluate
+
+        @return     dictionary of the changed alerts
+        """
+        try:
+            with open(self.state) as f:
+                previous = json.load(f)['alerts']
+        except (OSError, ValueError, KeyError):
+            previous = {}
+        alerts = {key: alert if alert is not None else previous[key]
+                  for key, alert in alerts.items() if alert is not None or key in previous}
+
+        now = systime.time()
+        changed = {}
+        for key, alert in alerts.items():
+            before = previous.get(key, {'level': 'ok', 'since': now})
+            if before['level'] == alert['level']:
+                alert['since'] = before['since']
+            else:
+                alert['since'] = now
+                alert['previous'] = before['level']
+                changed[key] = alert
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.state)), exist_ok=True)
+        with open(self.state + '.tmp', 'w') as f:
+            json.dump({'updated': now, 'alerts': alerts}, f, indent=1, sort_keys=True)
+        os.replace(self.state + '.tmp', self.state)
+
+        if changed and self.command:
+            try:
+                subprocess.run(shlex.split(self.command), input=json.dumps(changed).encode('utf-8'),
+                               timeout=60, check=True)
+            except (OSError, subprocess.SubprocessError) as e:
+                sys.stderr.write('Alert command failed: %s\n' % e)
+
+        return changed
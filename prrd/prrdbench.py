@@ -0,0 +1,380 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import time as systime
+from time import perf_counter
+
+import numpy as np
+import rrdtool
+
+from prrd import prrddata
+from prrd import prrdfleet
+from prrd import prrdgen
+from prrd.prrdgraphs import CPU_STATES, GPU
+from prrd.prrdmanifest import prrdmanifest
+from prrd.prrdrender import prrdrender
+
+# graph types drawn by the benchmark and whether they take instances
+GRAPHS = [
+    ('load', False),
+    ('cpu_all', False),
+    ('cpu', True),
+    ('memory', False),
+    ('internet', True),
+    ('internet_all', False),
+    ('gpu_temperature', True),
+    ('gpu_power', True),
+    ('gpu_utilization', True),
+    ('gpu_fan', True),
+    ('temperature', False),
+    ('df_root', False),
+    ('df', True),
+    ('ping', True),
+    ('ssh_invalid_user', False),
+    ('fail2ban', False),
+]
+
+def get_layout(cores=4, interfaces=2, partitions=2, gpus=1, targets=2):
+    """
+    Get the RRD files of a synthetic collectd host
+
+    cores       number of cpu cores
+    interfaces  number of network interfaces
+    partitions  number of partitions besides root
+    gpus        number of gpus
+    targets     number of ping targets
+
+    @return dictionary mapping paths relative to the host directory to tuples
+            of the data source type, the data source names and the range of
+            the values (per second for DERIVE)
+    """
+    layout = {'load/load.rrd': ('GAUGE', ('shortterm', 'midterm', 'longterm'), (0, 4))}
+    for core in range(cores):
+        for state, _, _ in CPU_STATES:
+            layout['cpu-%i/cpu-%s.rrd' % (core, state)] = ('DERIVE', ('value',), (0, 100))
+    for state in ('buffered', 'cached', 'free', 'used'):
+        layout['memory/memory-%s.rrd' % state] = ('GAUGE', ('value',), (0, 2 ** 30))
+    for i in range(interfaces):
+        layout['interface-eth%i/if_octets.rrd' % i] = ('DERIVE', ('rx', 'tx'), (0, 10 ** 7))
+    for partition in ['root'] + ['data%i' % i for i in range(partitions)]:
+        for state in ('free', 'reserved', 'used'):
+            layout['df-%s/df_complex-%s.rrd' % (partition, state)] = ('GAUGE', ('value',), (0, 10 ** 11))
+    for gpu in range(gpus):
+        path = GPU.format(instance=gpu)
+        layout[path + 'temperature-temperature_gpu.rrd'] = ('GAUGE', ('value',), (30, 80))
+        layout[path + 'power-power_draw.rrd'] = ('GAUGE', ('value',), (0, 200))
+        layout[path + 'percent-utilization_gpu.rrd'] = ('GAUGE', ('value',), (0, 100))
+        layout[path + 'percent-fan_speed.rrd'] = ('GAUGE', ('value',), (0, 100))
+    for i in range(targets):
+        layout['ping/ping-target%i.example.org.rrd' % i] = ('GAUGE', ('value',), (1, 100))
+    layout['sensors-coretemp-isa-0000/temperature-temp2.rrd'] = ('GAUGE', ('value',), (30, 90))
+    layout['tail-auth/counter-sshd-invalid_user.rrd'] = ('DERIVE', ('value',), (0, 1))
+    layout['tail-fail2ban/counter-fail2ban-ban.rrd'] = ('DERIVE', ('value',), (0, 1))
+    layout['tail-fail2ban/counter-fail2ban-unban.rrd'] = ('DERIVE', ('value',), (0, 1))
+    return layout
+
+def write_synthetic(path, dstype, names, bounds, start, end, step, rng):
+    """
+    Create an RRD file with the archives collectd uses and fill it with a
+    daily cycle plus noise
+
+    path        path to RRD file
+    dstype      GAUGE or DERIVE
+    names       names of the data sources
+    bounds      range of the values, per second for DERIVE
+    start       time of the first update in seconds since the epoch
+    end         time of the last update in seconds since the epoch
+    step        number of seconds between two updates
+    rng         numpy random generator
+
+    @return void
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dsmin = '0' if dstype == 'DERIVE' else 'U'
+    rrdtool.create(path, '--start', str(start - step), '--step', str(step),
+                   *['DS:%s:%s:%i:%s:U' % (name, dstype, 2 * step, dsmin) for name in names],
+                   *prrddata.collectd_rras(step))
+
+    times = np.arange(start, end + 1, step)
+    phase = rng.uniform(0, 2 * np.pi, len(names))
+    level = 0.5 + 0.3 * np.sin(2 * np.pi * times[:, None] / 86400 + phase)
+    level += 0.1 * rng.standard_normal((len(times), len(names)))
+    values = bounds[0] + (bounds[1] - bounds[0]) * np.clip(level, 0, 1)
+    if dstype == 'DERIVE':
+        values = np.cumsum(values * step, axis=0).astype(np.int64)
+        fmt = '%d'
+    else:
+        fmt = '%.4g'
+
+    # rrdtool takes many updates per call
+    for i in range(0, len(times), 5000):
+        rrdtool.update(path, *['%i:' % t + ':'.join(fmt % v for v in row)
+                               for t, row in zip(times[i:i + 5000], values[i:i + 5000])])
+
+def make_tree(path, hosts=1, days=100, step=60, seed=0, **layout):
+    """
+    Generate a synthetic collectd tree with one directory per host, named
+    host00, host01 and so on. A tree generated with the same parameters less
+    than an hour ago is reused.
+
+    path        directory to create the tree in
+    hosts       number of hosts
+    days        number of days of data
+    step        number of seconds between two updates
+    seed        seed of the random generator
+    layout      keyword arguments of get_layout
+
+    @return list of host names
+    """
+    params = dict(layout, hosts=hosts, days=days, step=step, seed=seed)
+    names = ['host%02i' % i for i in range(hosts)]
+    marker = os.path.join(path, '.prrdbench.json')
+    try:
+        with open(marker) as f:
+            previous = json.load(f)
+        if previous['params'] == params and systime.time() - previous['end'] < 3600:
+            return names
+    except (OSError, ValueError, KeyError):
+        pass
+
+    shutil.rmtree(path, ignore_errors=True)
+    end = int(systime.time()) // step * step
+    start = end - days * 86400
+    rng = np.random.default_rng(seed)
+    for host in names:
+        for name, (dstype, dsnames, bounds) in get_layout(**layout).items():
+            write_synthetic(os.path.join(path, host, name), dstype, dsnames, bounds, start, end, step, rng)
+
+    with open(marker, 'w') as f:
+        json.dump({'params': params, 'end': end}, f)
+    return names
+
+##
+## @brief      Times the graphs of a synthetic collectd tree: every graph
+##             method per time window in-process, and full runs of the
+##             manifest for different numbers of hosts and workers.
+##
+## Besides the times, the number of RRD files and DEFs every graph method
+## reads is counted. The counts only depend on the layout of the tree and
+## the windows, so that they can be compared against a baseline measured on
+## any machine.
+##
+class prrdbench:
+
+    def __init__(self, tree, hosts, windows=('day', 'week', '100days'), repeat=3, workdir=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self     The object
+        @param      tree     directory holding the synthetic collectd tree
+        @param      hosts    list of host names in the tree
+        @param      windows  names of the time windows to draw
+        @param      repeat   number of times every measurement is repeated,
+                             the median is reported
+        @param      workdir  directory for the settings file, images and
+                             derived RRD files
+        """
+        self.hosts = hosts
+        self.windows = list(windows)
+        self.repeat = repeat
+        # 'method/window' -> number of 'rrds' and 'defs' read, see time_methods
+        self.work = {}
+        self.workdir = workdir or os.path.join(os.path.dirname(os.path.abspath(tree)), 'prrd-bench-work')
+        self.outdir = os.path.join(self.workdir, 'images')
+        os.makedirs(self.outdir, exist_ok=True)
+
+        settings = {
+            'settings': {
+                'width': 450,
+                'height': 100,
+                'base_path': os.path.abspath(tree) + '/',
+                'hostname': hosts[0],
+                'workdir': os.path.join(self.workdir, 'derived'),
+            },
+            'graphs': [],
+        }
+        for type, instanced in GRAPHS:
+            entry = {'type': type, 'windows': self.windows, 'output': type + '_{window}.png'}
+            if instanced:
+                entry.update(instances='*', output=type + '_{instance}_{window}.png')
+            settings['graphs'].append(entry)
+        self.settings = os.path.join(self.workdir, 'settings.json')
+        with open(self.settings, 'w') as f:
+            json.dump(settings, f, indent=1)
+
+    def time_methods(self):
+        """
+        @brief      Time every graph method per time window on the first host,
+                    averaged over the instances of the graph; the RRD files
+                    and DEFs read by all instances are summed up in work
+
+        @param      self  The object
+
+        @return     dictionary mapping 'method/window' to seconds
+        """
+        base = prrdgen.prrdbase(self.settings)
+        names = {base.get_window(w): w for w in self.windows}
+        jobs, _ = prrdmanifest(base).expand(self.outdir)
+
+        times = {}
+        self.work = {}
+        for job in jobs:
+            samples = []
+            for _ in range(self.repeat):
+                base.stats = {}
+                start = perf_counter()
+                getattr(base, job.method)(*job.args)
+                samples.append(perf_counter() - start)
+            key = '%s/%s' % (job.method, names[job.args[0]])
+            times.setdefault(key, []).append(statistics.median(samples))
+            counts = self.work.setdefault(key, {'rrds': 0, 'defs': 0})
+            for name in counts:
+                counts[name] += base.stats.get(name, 0)
+
+        return {key: sum(t) / len(t) for key, t in times.items()}
+
+    def time_batches(self, host_counts, worker_counts):
+        """
+        @brief      Time full runs of the manifest, including the scan of the
+                    collectd tree, like render.py
+
+        @param      self           The object
+        @param      host_counts    list of numbers of hosts to draw
+        @param      worker_counts  list of numbers of worker processes
+
+        @return     dictionary mapping 'batch/hosts=N/workers=M' to seconds
+        """
+        times = {}
+        for count in host_counts:
+            for workers in worker_counts:
+                samples = []
+                for _ in range(self.repeat):
+                    start = perf_counter()
+                    base = prrdgen.prrdbase(self.settings)
+                    bases, jobs, _ = prrdfleet.expand(base, self.outdir, self.hosts[:count])
+                    prrdrender.make_dirs(jobs)
+                    results = prrdrender(self.settings, workers, bases).run(jobs)
+                    samples.append(perf_counter() - start)
+                    failed = [r for r in results if not r.success]
+                    if failed:
+                        raise RuntimeError(prrdrender.summary(results))
+                times['batch/hosts=%i/workers=%i' % (count, workers)] = statistics.median(samples)
+
+        return times
+
+    @staticmethod
+    def save(path, results, work, layout, tolerance=0.25, floor=0.005):
+        """
+        @brief      Store results as baseline, along with the platform they
+                    were measured on and the thresholds of the comparison
+
+        @param      path       path to json file
+        @param      results    dictionary mapping names to seconds
+        @param      work       dictionary mapping names to the number of
+                               'rrds' and 'defs' read, see time_methods
+        @param      layout     dictionary of the parameters of the tree and
+                               the windows the work depends on
+        @param      tolerance  relative slowdown that counts as regression
+        @param      floor      slowdowns of fewer seconds are ignored as noise
+
+        @return     void
+        """
+        meta = {'python': platform.python_version(), 'machine': platform.machine(),
+                'platform': platform.platform(), 'cpus': os.cpu_count()}
+        if hasattr(rrdtool, 'lib_version'):
+            meta['rrdtool'] = rrdtool.lib_version()
+        with open(path, 'w') as f:
+            json.dump({'meta': meta, 'tolerance': tolerance, 'floor': floor, 'results': results,
+                       'layout': layout, 'work': work}, f, indent=1, sort_keys=True)
+
+    @staticmethod
+    def compare(results, path, tolerance=None, floor=None, work=None, layout=None):
+        """
+        @brief      Compare results against a stored baseline. Times are
+                    compared with the thresholds of the baseline unless
+                    given, the RRD files and DEFs read exactly, if the tree
+                    has the layout of the baseline.
+
+        @param      results    dictionary mapping names to seconds
+        @param      path       path to the json file of the baseline
+        @param      tolerance  relative slowdown that counts as regression
+        @param      floor      slowdowns of fewer seconds are ignored as noise
+        @param      work       dictionary mapping names to the number of
+                               'rrds' and 'defs' read, see time_methods
+        @param      layout     dictionary of the parameters of the tree and
+                               the windows the work depends on
+
+        @return     tuple of a report as string and the list of names that
+                    regressed, holding 'baseline' if the baseline has no
+                    times to compare against
+        """
+        with open(path) as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        tolerance = stored.get('tolerance', 0.25) if tolerance is None else tolerance
+        floor = stored.get('floor', 0.005) if floor is None else floor
+
+        lines = []
+        regressed = []
+        if work and stored.get('work') and stored.get('layout') == layout:
+            lines.append('%9s %9s %7s  %s' % ('baseline', 'now', '', 'rrds/defs'))
+            for name in sorted(work):
+                now = work[name]
+                before = stored['work'].get(name)
+                if before is None:
+                    lines.append('%9s %4i/%-4i %7s  %s' % ('-', now['rrds'], now['defs'], 'new', name))
+                    continue
+                flag = ''
+                if now['rrds'] > before['rrds'] or now['defs'] > before['defs']:
+                    regressed.append('work/' + name)
+                    flag = '  REGRESSION'
+                lines.append('%4i/%-4i %4i/%-4i %7s  %s%s' % (before['rrds'], before['defs'],
+                                                            now['rrds'], now['defs'], '', name, flag))
+        elif work:
+            lines.append('The tree or windows differ from the baseline, RRD files and DEFs are not compared')
+
+        if results and not baseline:
+            # a baseline without times would pass any slowdown
+            lines.append('NO TIMES IN THE BASELINE %s, record them with --save on this machine' % path)
+            regressed.append('baseline')
+        lines.append('%9s %9s %7s  %s' % ('baseline', 'now', 'change', 'name'))
+        for name in sorted(results):
+            now = results[name]
+            if name not in baseline:
+                lines.append('%9s %9.4f %7s  %s' % ('-', now, 'new', name))
+                continue
+            before = baseline[name]
+            change = (now - before) / before if before > 0 else 0.0
+            flag = ''
+            if now > before * (1 + tolerance) and now - before > floor:
+                regressed.append(name)
+                flag = '  REGRESSION'
+            lines.append('%9.4f %9.4f %+6.0f%%  %s%s' % (before, now, 100 * change, name, flag))
+
+        return '\n'.join(lines), regressed
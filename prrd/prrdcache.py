@@ -0,0 +1,206 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import hashlib
+import json
+import os
+import re
+import time as systime
+
+# the timestamp footer changes on every call and is left out of the cache key
+FOOTER = re.compile(r'^COMMENT:\d{4}-\d{2}-\d{2} ')
+
+# the RRD file of a DEF, colons in the path are escaped by a backslash
+DEF = re.compile(r'^DEF:[^=]+=((?:\\:|[^:])+):')
+
+##
+## @brief      Skip-if-unchanged cache of rendered images.
+##
+## For every image the cache stores the modification times of the RRD files it
+## was drawn from, a hash of the rrdtool arguments and the time bucket (one
+## pixel column) that the right edge of the graph fell into. An image is not
+## drawn again if all of these are unchanged, or if it is younger than the
+## freshness interval configured for its time window. Every image has its own
+## entry file so that worker processes never write to the same file.
+##
+class prrdcache:
+
+    def __init__(self, path, freshness=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self       The object
+        @param      path       directory holding the cache entries
+        @param      freshness  dictionary mapping a time window in seconds to
+                               the number of seconds an image stays fresh
+        """
+        self.path = path
+        self.freshness = freshness or {}
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def get_rrds(args):
+        """
+        @brief      Get the RRD files read by a list of rrdtool arguments
+
+        @param      args  rrdtool graph arguments
+
+        @return     sorted list of paths to RRD files
+        """
+        rrds = set()
+        for arg in args:
+            m = DEF.match(arg)
+            if m:
+                rrds.add(m.group(1).replace('\\:', ':'))
+
+        return sorted(rrds)
+
+    @staticmethod
+    def get_bucket(time, width):
+        """
+        @brief      Get the time bucket the right edge of a graph falls into,
+                    one bucket per pixel column
+
+        @param      time   number of seconds shown in the graph
+        @param      width  width of the graph in pixels
+
+        @return     bucket number
+        """
+        return int(systime.time() // max(1, time // width))
+
+    def get_entry_file(self, imgfile):
+        """
+        @brief      Get the cache entry file of an image
+
+        @param      self     The object
+        @param      imgfile  path to image file
+
+        @return     path to entry file
+        """
+        key = hashlib.sha1(os.path.abspath(imgfile).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key + '.json')
+
+    def build_entry(self, time, width, args, mtimes):
+        """
+        @brief      Build the cache entry describing an image
+
+        @param      self    The object
+        @param      time    number of seconds shown in the graph
+        @param      width   width of the graph in pixels
+        @param      args    rrdtool graph arguments
+        @param      mtimes  dictionary mapping RRD files to modification times
+
+        @return     dictionary
+        """
+        key = '\n'.join(a for a in args if not FOOTER.match(a))
+        return {
+            'args': hashlib.sha1(key.encode('utf-8')).hexdigest(),
+            'mtimes': mtimes,
+            'bucket': self.get_bucket(time, width),
+        }
+
+    def is_recent(self, imgfile, time):
+        """
+        @brief      Check whether an image is younger than the freshness
+                    interval of its time window
+
+        @param      self     The object
+        @param      imgfile  path to image file
+        @param      time     number of seconds shown in the graph
+
+        @return     True if the image does not have to be drawn again
+        """
+        try:
+            age = systime.time() - os.stat(imgfile).st_mtime
+        except OSError:
+            return False
+
+        return age < self.freshness.get(time, 0)
+
+    def is_fresh(self, imgfile, time, width, args, mtimes):
+        """
+        @brief      Check whether an image can be kept as it is
+
+        @param      self     The object
+        @param      imgfile  path to image file
+        @param      time     number of seconds shown in the graph
+        @param      width    width of the graph in pixels
+        @param      args     rrdtool graph arguments
+        @param      mtimes   dictionary mapping RRD files to modification times
+
+        @return     True if the image does not have to be drawn again
+        """
+        try:
+            age = systime.time() - os.stat(imgfile).st_mtime
+            with open(self.get_entry_file(imgfile)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if age < self.freshness.get(time, 0):
+            return True
+
+        return entry == self.build_entry(time, width, args, mtimes)
+
+    def is_unchanged(self, imgfile, time, width, mtimes):
+        """
+        @brief      Check whether the files an image was drawn from and the
+                    time bucket of its right edge are unchanged, before its
+                    rrdtool arguments are known, e.g. of a graph drawn from
+                    an RRD file derived from these files
+
+        @param      self     The object
+        @param      imgfile  path to image file
+        @param      time     number of seconds shown in the graph
+        @param      width    width of the graph in pixels
+        @param      mtimes   dictionary mapping files to modification times
+
+        @return     True if the image does not have to be drawn again
+        """
+        try:
+            with open(self.get_entry_file(imgfile)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        return (os.path.isfile(imgfile) and entry['mtimes'] == mtimes and
+                entry['bucket'] == self.get_bucket(time, width))
+
+    def store(self, imgfile, time, width, args, mtimes):
+        """
+        @brief      Record a freshly drawn image
+
+        @param      self     The object
+        @param      imgfile  path to image file
+        @param      time     number of seconds shown in the graph
+        @param      width    width of the graph in pixels
+        @param      args     rrdtool graph arguments
+        @param      mtimes   dictionary mapping RRD files to modification times
+
+        @return     void
+        """
+        filename = self.get_entry_file(imgfile)
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.build_entry(time, width, args, mtimes), f)
+        os.replace(filename + '.tmp', filename)
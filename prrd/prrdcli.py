@@ -0,0 +1,345 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from prrd import prrdbench
+from prrd import prrdexport
+from prrd import prrdgen
+from prrd import prrdfleet
+from prrd.prrdalert import prrdalert
+from prrd.prrddaemon import prrddaemon
+from prrd.prrdqueue import prrdlock, prrdqueue
+from prrd.prrdrender import prrdrender, prrdresult
+from prrd.prrdrollup import prrdrollup
+from prrd.prrdself import prrdself
+from prrd.prrdserver import prrdserver
+from prrd.prrdwriter import prrdwriter
+
+def get_hosts(args, base):
+    """
+    Get the hosts to draw the graphs of from the command line or settings
+
+    args        parsed command line arguments
+    base        prrdbase object holding the settings
+
+    @return list of host names, "*" or None for the host of the settings file
+    """
+    hosts = args.hosts or base.settings['settings'].get('hosts')
+    if not hosts or hosts == '*' or isinstance(hosts, list):
+        return hosts
+
+    return hosts.split(',')
+
+def render(args):
+    """
+    Draw all graphs listed in the manifest of the settings file. Only one run
+    at a time draws into an output directory; graphs deferred by a busy host
+    or the time budget are drawn first by the next run.
+
+    args        parsed command line arguments
+
+    @return exit code
+    """
+    start = time.perf_counter()
+    base = prrdgen.prrdbase(args.settings)
+    if args.dry_run:
+        for job in prrdfleet.expand(base, args.output, get_hosts(args, base))[1]:
+            print(job)
+        return 0
+
+    queue = prrdqueue(base, args.output, args.budget)
+    lock = prrdlock(queue.lock)
+    if not lock.acquire():
+        if args.verbose:
+            sys.stderr.write('Another run holds %s, not drawing\n' % queue.lock)
+        return 0
+
+    try:
+        # a run that does not get the lock does not scan the collectd tree
+        bases, jobs, skipped = prrdfleet.expand(base, args.output, get_hosts(args, base))
+        jobs, deferred = queue.schedule(jobs)
+        prrdrender.make_dirs(jobs)
+        renderer = prrdrender(args.settings, args.workers, bases)
+        renderer.deadline = queue.get_deadline()
+        # stop starting graphs when killed, e.g. by timeout(1)
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(renderer, 'deadline', 0))
+        results = renderer.run(jobs)
+        deferred += [job for job, r in zip(jobs, results) if r is None]
+        results = [r for r in results if r is not None]
+        queue.save(deferred)
+
+        # the graphs printed the values the alert rules check
+        if 'alerts' in base.settings:
+            alerts = prrdalert(base, args.output)
+            alerts.update(alerts.evaluate(bases, results))
+    finally:
+        lock.release()
+
+    # SQLite serializes overlapping updates, so the next run need not wait
+    if 'rollup' in base.settings['settings']:
+        prrdrollup(base).update(bases)
+
+    if base.settings['settings'].get('self_metrics'):
+        monitor = prrdself(base)
+        monitor.record(monitor.collect(results, skipped, time.perf_counter() - start))
+    if base.settings['settings'].get('output_index'):
+        prrdwriter().update_index(os.path.join(args.output, base.settings['settings']['output_index']),
+                                  [r.job.args[1] for r in results if r.success])
+    if args.verbose or not all(r.success for r in results):
+        sys.stderr.write(prrdrender.summary(results) + '\n')
+        sys.stderr.write('%i graphs skipped, RRD files missing\n' % len(skipped))
+        sys.stderr.write('%i graphs deferred to the next run\n' % len(deferred))
+
+    profiled = results + [prrdresult(job, True, 0.0, stats={'status': 'missing'}) for job in skipped]
+    if args.profile:
+        print(prrdrender.profile(profiled))
+    if args.profile_json:
+        with open(args.profile_json, 'w') as f:
+            for r in profiled:
+                f.write(json.dumps(r.to_dict()) + '\n')
+
+    return 0 if all(r.success for r in results) else 1
+
+def export(args):
+    """
+    Export the data of a single graph to stdout, or of all graphs listed in
+    the manifest of the settings file next to their images
+
+    args        parsed command line arguments
+
+    @return exit code, 1 if RRD files are missing
+    """
+    base = prrdgen.prrdbase(args.settings)
+    if args.type:
+        # graphs of cpu cores and gpus take a number as instance
+        instance = args.instance
+        if instance is not None and instance.isdigit():
+            instance = int(instance)
+        data = base.export(args.type, base.get_window(args.window), instance, args.points)
+        if data is None:
+            sys.stderr.write('RRD files missing\n')
+            return 1
+        sys.stdout.buffer.write(prrdexport.encode(data, args.format, base.get_title(args.type, instance)))
+        return 0
+
+    bases, jobs, skipped = prrdfleet.expand(base, args.output, get_hosts(args, base))
+    bases = {b.hostname: b for b in bases}
+    prrdrender.make_dirs(jobs)
+    writer = prrdwriter()
+    for job in jobs:
+        # jobs of the host of the settings file have no host
+        b = bases.get(job.host, base)
+        type = job.method[len('graph_'):]
+        # the heatmap is drawn without rrdtool, its table is written with the image
+        if type == 'ping_heatmap':
+            continue
+        data = b.export(type, job.args[0], *job.args[2:], points=args.points)
+        if data is not None:
+            path = os.path.splitext(job.args[1])[0] + '.' + args.format
+            writer.write(path, prrdexport.encode(data, args.format, b.get_title(type, *job.args[2:])))
+
+    return 0
+
+def rollup(args):
+    """
+    Append the new rows of all RRD files to the rollup store, or print the
+    stored rows of a plugin as csv
+
+    args        parsed command line arguments
+
+    @return exit code
+    """
+    base = prrdgen.prrdbase(args.settings)
+    store = prrdrollup(base)
+    if not args.query:
+        hosts = get_hosts(args, base)
+        bases = prrdfleet.prrdfleet(base, hosts).bases if hosts else [base]
+        added = store.update(bases)
+        if args.verbose:
+            sys.stderr.write('%i rows appended to %s\n' % (added, store.path))
+        return 0
+
+    end = int(time.time())
+    rows = store.query(args.host or base.hostname, args.query, end - base.get_window(args.window), end)
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    out.writerow(['pinstance', 'type', 'tinstance', 'ds', 'time', 'step', 'value'])
+    out.writerows(rows)
+    return 0
+
+def daemon(args):
+    """
+    Keep drawing the graphs listed in the manifest of the settings file, each
+    on the refresh cadence of its time window
+
+    args        parsed command line arguments
+
+    @return exit code
+    """
+    base = prrdgen.prrdbase(args.settings)
+    prrddaemon(args.settings, args.output, args.workers, get_hosts(args, base)).run()
+    return 0
+
+def serve(args):
+    """
+    Draw graphs on request over HTTP
+
+    args        parsed command line arguments
+
+    @return exit code
+    """
+    base = prrdgen.prrdbase(args.settings)
+    prrdserver(args.settings, args.bind, args.port, args.workers, get_hosts(args, base)).run()
+    return 0
+
+def bench(args):
+    """
+    Time the graphs of a synthetic collectd tree and compare the times
+    against a stored baseline
+
+    args        parsed command line arguments
+
+    @return exit code, 1 if a measurement regressed
+    """
+    host_counts = [int(h) for h in args.hosts.split(',')]
+    worker_counts = [int(w) for w in args.workers.split(',')]
+    hosts = prrdbench.make_tree(args.tree, max(host_counts), args.days, args.step,
+                                cores=args.cores, interfaces=args.interfaces, partitions=args.partitions,
+                                gpus=args.gpus, targets=args.targets)
+
+    benchmark = prrdbench.prrdbench(args.tree, hosts, args.windows.split(','), args.repeat)
+    results = benchmark.time_methods()
+    results.update(benchmark.time_batches(host_counts, worker_counts))
+
+    # the files and DEFs read only depend on these
+    layout = {'cores': args.cores, 'interfaces': args.interfaces, 'partitions': args.partitions,
+              'gpus': args.gpus, 'targets': args.targets, 'windows': args.windows}
+    if args.save:
+        prrdbench.prrdbench.save(args.save, results, benchmark.work, layout,
+                                 0.25 if args.tolerance is None else args.tolerance)
+    if not args.baseline:
+        for name in sorted(results):
+            print('%9.4f  %s' % (results[name], name))
+        return 0
+
+    report, regressed = prrdbench.prrdbench.compare(results, args.baseline, args.tolerance,
+                                                    work=benchmark.work, layout=layout)
+    print(report)
+    return 1 if regressed else 0
+
+def main(argv=None):
+    """
+    Entry point of the prrd command line interface
+
+    argv        list of command line arguments
+
+    @return exit code
+    """
+    parser = argparse.ArgumentParser(prog='prrd', description='Generate rrdtool graphs of collectd statistics')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    p = commands.add_parser('render', help='draw all graphs listed in the settings file')
+    p.add_argument('-s', '--settings', default='settings.json', help='path to settings json file')
+    p.add_argument('-o', '--output', default='.', help='directory to write the images to')
+    p.add_argument('-H', '--hosts', help='comma separated list of hosts or "*" for every host below '
+                   'the base path; the images of every host go to a directory of their own')
+    p.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    p.add_argument('-n', '--dry-run', action='store_true', help='only list the graphs that would be drawn')
+    p.add_argument('-b', '--budget', type=float, help='number of seconds to start graphs for, the '
+                   'remaining graphs are drawn first by the next run')
+    p.add_argument('-v', '--verbose', action='store_true', help='print a summary of the run')
+    p.add_argument('--profile', action='store_true', help='print the time spent per graph, slowest first')
+    p.add_argument('--profile-json', metavar='FILE', help='write the time spent per graph as json lines')
+    p.set_defaults(func=render)
+
+    p = commands.add_parser('export', help='export the data of graphs as json or csv')
+    p.add_argument('-s', '--settings', default='settings.json', help='path to settings json file')
+    p.add_argument('-o', '--output', default='.', help='directory to write the files to when exporting '
+                   'all graphs of the settings file')
+    p.add_argument('-H', '--hosts', help='comma separated list of hosts or "*" for every host below '
+                   'the base path')
+    p.add_argument('-t', '--type', help='type of a single graph to export to stdout, e.g. load')
+    p.add_argument('-w', '--window', default='day', help='time window of the single graph')
+    p.add_argument('-i', '--instance', help='interface, partition, gpu id or ping target of the single graph')
+    p.add_argument('-p', '--points', type=int, help='number of rows to downsample to, the graph width by default')
+    p.add_argument('-f', '--format', choices=sorted(prrdexport.FORMATS), default='json', help='output format')
+    p.set_defaults(func=export)
+
+    p = commands.add_parser('rollup', help='append new rows to the long-term rollup store or query it')
+    p.add_argument('-s', '--settings', default='settings.json', help='path to settings json file')
+    p.add_argument('-H', '--hosts', help='comma separated list of hosts or "*" for every host below '
+                   'the base path')
+    p.add_argument('-q', '--query', metavar='PLUGIN', help='print the stored rows of a plugin as csv')
+    p.add_argument('--host', help='host of the query, the host of the settings file by default')
+    p.add_argument('-w', '--window', default='day', help='time window of the query')
+    p.add_argument('-v', '--verbose', action='store_true', help='print the number of rows appended')
+    p.set_defaults(func=rollup)
+
+    p = commands.add_parser('daemon', help='keep drawing all graphs listed in the settings file')
+    p.add_argument('-s', '--settings', default='settings.json', help='path to settings json file')
+    p.add_argument('-o', '--output', default='.', help='directory to write the images to')
+    p.add_argument('-H', '--hosts', help='comma separated list of hosts or "*" for every host below '
+                   'the base path; the images of every host go to a directory of their own')
+    p.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    p.set_defaults(func=daemon)
+
+    p = commands.add_parser('serve', help='draw graphs on request over HTTP')
+    p.add_argument('-s', '--settings', default='settings.json', help='path to settings json file')
+    p.add_argument('-b', '--bind', help='address to listen on, 127.0.0.1 by default')
+    p.add_argument('-p', '--port', type=int, help='port to listen on, 8080 by default')
+    p.add_argument('-H', '--hosts', help='comma separated list of hosts or "*" for every host below '
+                   'the base path; the host is chosen with the host query parameter')
+    p.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    p.set_defaults(func=serve)
+
+    p = commands.add_parser('bench', help='time the graphs of a synthetic collectd tree')
+    p.add_argument('--tree', default=os.path.join(tempfile.gettempdir(), 'prrd-bench', 'rrd'),
+                   help='directory to generate the collectd tree in')
+    p.add_argument('-H', '--hosts', default='1,4', help='comma separated numbers of hosts to draw')
+    p.add_argument('-j', '--workers', default='1,4', help='comma separated numbers of worker processes')
+    p.add_argument('-w', '--windows', default='day,week,100days', help='comma separated time windows')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='number of repetitions per measurement')
+    p.add_argument('--days', type=int, default=100, help='number of days of data in the tree')
+    p.add_argument('--step', type=int, default=60, help='number of seconds between two updates')
+    p.add_argument('--cores', type=int, default=4, help='number of cpu cores per host')
+    p.add_argument('--interfaces', type=int, default=2, help='number of network interfaces per host')
+    p.add_argument('--partitions', type=int, default=2, help='number of partitions besides root per host')
+    p.add_argument('--gpus', type=int, default=1, help='number of gpus per host')
+    p.add_argument('--targets', type=int, default=2, help='number of ping targets per host')
+    p.add_argument('--save', metavar='FILE', help='store the results as baseline')
+    p.add_argument('--baseline', metavar='FILE', help='compare the results against a baseline')
+    p.add_argument('--tolerance', type=float,
+                   help='relative slowdown that fails the comparison, by default that of the baseline')
+    p.set_defaults(func=bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,177 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import collections
+import heapq
+import os
+import signal
+import sys
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from prrd import prrdfleet
+from prrd import prrdgen
+from prrd.prrdrender import prrdrender, run_group
+from prrd.prrdwriter import prrdwriter
+
+##
+## @brief      Long-running render daemon. Every graph is drawn again on a
+##             cadence that depends on its time window, on a pool of worker
+##             processes that is kept warm between renders.
+##
+## Graphs are kept in a priority queue keyed on the time they are due next.
+## The first renders are spread evenly over the refresh interval, and at most
+## one graph per worker is in flight, so the load is spread out instead of
+## arriving in a burst every minute. Rescanning the collectd tree only adds
+## and removes graphs; the others stay due when they were.
+##
+class prrddaemon:
+
+    def __init__(self, settings, outdir='.', workers=None, hosts=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self      The object
+        @param      settings  path to settings json file
+        @param      outdir    directory to write the images to
+        @param      workers   number of worker processes
+        @param      hosts     list of host names, "*" or None, see prrdfleet
+        """
+        self.settings = settings
+        self.outdir = outdir
+        self.hosts = hosts
+        self.base = prrdgen.prrdbase(settings)
+        self.workers = max(1, workers or self.base.workers)
+        # the collectd tree is scanned again every so often to pick up new RRD files
+        self.rescan = self.base.settings['settings'].get('rescan', 3600)
+        self.running = False
+        self.queue = []
+        # index json file of the images, updated after every batch of renders
+        self.index = self.base.settings['settings'].get('output_index')
+        if self.index:
+            self.index = os.path.join(outdir, self.index)
+        self.writer = prrdwriter()
+
+    def load(self):
+        """
+        @brief      Expand the manifest and schedule its graphs. Graphs that
+                    are already queued keep the time they are due; the first
+                    renders of new graphs with the same interval are spread
+                    evenly over it
+
+        @param      self  The object
+
+        @return     list of prrdbase objects of the hosts
+        """
+        self.base.index = None
+        bases, jobs, skipped = prrdfleet.expand(self.base, self.outdir, self.hosts)
+        prrdrender.make_dirs(jobs)
+
+        due = {repr(entry[3]): entry[0] for entry in self.queue}
+        now = time.time()
+        intervals = [self.base.get_refresh(job.args[0]) for job in jobs]
+        totals = collections.Counter(interval for job, interval in zip(jobs, intervals) if repr(job) not in due)
+        counts = collections.Counter()
+        self.queue = []
+        for i, (job, interval) in enumerate(zip(jobs, intervals)):
+            if repr(job) in due:
+                self.queue.append([due[repr(job)], i, interval, job])
+                continue
+            self.queue.append([now + interval * counts[interval] / totals[interval], i, interval, job])
+            counts[interval] += 1
+        heapq.heapify(self.queue)
+
+        return bases
+
+    def stop(self, *args):
+        """
+        @brief      Stop the daemon after the graphs in flight are done
+
+        @param      self  The object
+
+        @return     void
+        """
+        self.running = False
+
+    def run(self):
+        """
+        @brief      Draw graphs until stopped
+
+        @param      self  The object
+
+        @return     void
+        """
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            bases = self.load()
+            rescan = time.time() + self.rescan
+            with prrdrender(self.settings, self.workers, bases).pool() as pool:
+                self.loop(pool, rescan)
+
+    def loop(self, pool, until):
+        """
+        @brief      Hand due graphs to the worker pool, at most one graph per
+                    worker at a time
+
+        @param      self   The object
+        @param      pool   executor to run the graphs on
+        @param      until  time to stop at to rescan the collectd tree
+
+        @return     void
+        """
+        inflight = {}
+        while self.running and (time.time() < until or inflight):
+            now = time.time()
+            while (self.queue and self.queue[0][0] <= now and len(inflight) < self.workers
+                   and now < until):
+                entry = heapq.heappop(self.queue)
+                inflight[pool.submit(run_group, [entry[3]])] = entry
+
+            # wake up at least every second to notice stop requests
+            timeout = 1.0
+            if self.queue and len(inflight) < self.workers:
+                timeout = min(timeout, max(0.0, self.queue[0][0] - now))
+            if not inflight:
+                time.sleep(timeout)
+                continue
+
+            done, _ = wait(inflight, timeout=timeout, return_when=FIRST_COMPLETED)
+            imgfiles = []
+            for future in done:
+                entry = inflight.pop(future)
+                for result in future.result():
+                    if result.success:
+                        imgfiles.append(result.job.args[1])
+                    else:
+                        sys.stderr.write('%r: %s\n' % (result.job, result.error))
+
+                # the next render is due one interval after this one was due
+                entry[0] = max(entry[0] + entry[2], time.time())
+                heapq.heappush(self.queue, entry)
+
+            if self.index and imgfiles:
+                self.writer.update_index(self.index, imgfiles)
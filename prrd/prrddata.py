@@ -0,0 +1,344 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import os
+import time as systime
+import numpy as np
+import rrdtool
+
+def fetch(path, cf, start, end, resolution=None, daemon=None):
+    """
+    Fetch a consolidated time series from an RRD file
+
+    path        path to RRD file
+    cf          consolidation function
+    start       start time in seconds since the epoch
+    end         end time in seconds since the epoch
+    resolution  preferred number of seconds per row
+    daemon      address of rrdcached, which then flushes the file first
+
+    @return tuple of the time of the first row, the step, the names of the
+            data sources and a rows x data sources array; unknown values are
+            NaN
+    """
+    args = ['--start', str(start), '--end', str(end)]
+    if resolution:
+        args += ['--resolution', str(int(resolution))]
+    if daemon:
+        args += ['--daemon', daemon]
+    (first, last, step), names, rows = rrdtool.fetch(path, cf, *args)
+    values = np.array(rows, dtype=float).reshape(len(rows), len(names))
+    return first, step, list(names), values
+
+def read(path, cf, time, width=1, daemon=None):
+    """
+    Fetch the last seconds of an RRD file at about one row per pixel
+
+    path        path to RRD file
+    cf          consolidation function
+    time        number of seconds in the past
+    width       number of pixels
+    daemon      address of rrdcached, which then flushes the file first
+
+    @return prrdseries
+    """
+    end = int(systime.time())
+    return prrdseries(*fetch(path, cf, end - time, end, max(1, time // width), daemon))
+
+def collectd_rras(step, rows=1200, timespans=(3600, 86400, 604800, 2678400, 31622400)):
+    """
+    Get the archives the collectd rrdtool plugin creates by default
+
+    step        number of seconds per primary data point
+    rows        number of rows per archive
+    timespans   number of seconds covered by the archives
+
+    @return list of rrdtool RRA arguments
+    """
+    return ['RRA:%s:0.1:%i:%i' % (cf, max(1, span // (step * rows)), rows)
+            for cf in ('AVERAGE', 'MIN', 'MAX') for span in timespans]
+
+def choose_rra(rras, cf, time, width):
+    """
+    Choose the archive to read a time window from at about one row per pixel:
+    the coarsest archive that is not coarser than a pixel, or the finest one if
+    all are coarser, among the archives that cover the window
+
+    rras        list of (consolidation function, seconds per row, number of
+                rows) tuples, see prrdindex.get_rras
+    cf          preferred consolidation function, AVERAGE is used if the RRD
+                file has no archive of it
+    time        number of seconds in the past
+    width       number of pixels
+
+    @return tuple of the consolidation function, the seconds per row and
+            whether the archive covers the window, or None if there are no
+            archives; if none covers the window, the longest one is chosen
+    """
+    cfs = set(r[0] for r in rras)
+    if not cfs:
+        return None
+    if cf not in cfs:
+        cf = 'AVERAGE' if 'AVERAGE' in cfs else sorted(cfs)[0]
+
+    archives = [(step, rows) for c, step, rows in rras if c == cf]
+    covering = [step for step, rows in archives if step * rows >= time]
+    if not covering:
+        return cf, max(archives, key=lambda a: a[0] * a[1])[0], False
+
+    fine = [step for step in covering if step <= time / width]
+    return cf, max(fine) if fine else min(covering), True
+
+def write_rrd(path, first, step, names, values, rras=None):
+    """
+    Write a time series to a new RRD file, e.g. to draw data computed in
+    Python with rrdtool. The file is replaced atomically.
+
+    path        path to RRD file
+    first       time of the first row in seconds since the epoch
+    step        number of seconds per row
+    names       names of the data sources
+    values      rows x data sources array, NaN for unknown values
+    rras        list of rrdtool RRA arguments, by default a single archive
+                holding the rows as they are
+
+    @return void
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmpfile = '%s.%i.tmp' % (path, os.getpid())
+    rows = max(1, len(values))
+    rrdtool.create(tmpfile, '--start', str(first), '--step', str(step),
+                   *['DS:%s:GAUGE:%i:U:U' % (name, 2 * step) for name in names],
+                   *(rras or ['RRA:AVERAGE:0.5:1:%i' % rows]))
+
+    updates = []
+    for i, row in enumerate(values):
+        updates.append('%i:' % (first + (i + 1) * step) +
+                       ':'.join('U' if np.isnan(v) else repr(float(v)) for v in row))
+    if updates:
+        rrdtool.update(tmpfile, *updates)
+    os.replace(tmpfile, path)
+
+def combine(arrays, how='average'):
+    """
+    Combine equally shaped arrays element by element, ignoring unknown
+    values
+
+    arrays      list of arrays
+    how         'average' or 'sum'
+
+    @return array, NaN where all inputs are unknown
+    """
+    # series of different length are cut to the shortest one
+    rows = min(len(a) for a in arrays)
+    stack = np.stack([a[:rows] for a in arrays])
+    known = ~np.isnan(stack)
+    total = np.where(known, stack, 0.0).sum(axis=0)
+    count = known.sum(axis=0)
+    if how == 'sum':
+        return np.where(count > 0, total, np.nan)
+
+    return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+##
+## @brief      A time series of one or more data sources held in memory.
+##
+class prrdseries:
+
+    def __init__(self, first, step, names, values):
+        """
+        @brief      Constructs the object.
+
+        @param      self    The object
+        @param      first   time of the first row in seconds since the epoch
+        @param      step    number of seconds per row
+        @param      names   names of the data sources
+        @param      values  rows x data sources array, NaN for unknown values
+        """
+        self.first = first
+        self.step = step
+        self.names = names
+        self.values = values
+
+    @property
+    def last(self):
+        """
+        Time just after the last row
+
+        @return seconds since the epoch
+        """
+        return self.first + len(self.values) * self.step
+
+    def covers(self, start, end):
+        """
+        @brief      Check whether the series holds the period start to end
+
+        @param      self   The object
+        @param      start  start time in seconds since the epoch
+        @param      end    end time in seconds since the epoch
+
+        @return     True if the period is covered
+        """
+        return self.first <= start + self.step and self.last >= end - self.step
+
+    def window(self, start, end):
+        """
+        @brief      Cut out the rows of the period start to end
+
+        @param      self   The object
+        @param      start  start time in seconds since the epoch
+        @param      end    end time in seconds since the epoch
+
+        @return     prrdseries
+        """
+        lo = max(0, (start - self.first) // self.step)
+        hi = max(lo, (end - self.first) // self.step)
+        return prrdseries(self.first + lo * self.step, self.step, self.names, self.values[lo:hi])
+
+    def column(self, name='value'):
+        """
+        @brief      Get the values of a data source
+
+        @param      self  The object
+        @param      name  name of the data source
+
+        @return     array
+        """
+        return self.values[:, self.names.index(name)]
+
+    def stats(self, name='value'):
+        """
+        @brief      Get the AVERAGE, MIN, MAX and LAST value of a data source,
+                    as printed in the legends of the graphs
+
+        @param      self  The object
+        @param      name  name of the data source
+
+        @return     dictionary, values are NaN if no value is known
+        """
+        v = self.column(name)
+        known = v[~np.isnan(v)]
+        if len(known) == 0:
+            return {'AVERAGE': np.nan, 'MIN': np.nan, 'MAX': np.nan, 'LAST': np.nan}
+
+        return {'AVERAGE': known.mean(), 'MIN': known.min(), 'MAX': known.max(), 'LAST': known[-1]}
+
+##
+## @brief      Fetch-once buffer of RRD data.
+##
+## When the graphs of the same data are drawn for several time windows, every
+## RRD file and consolidation function is fetched once for the longest planned
+## window, from the coarsest archive that covers it and still has about one
+## row per pixel for the shortest window. The windows are cut from that
+## buffer, and prrdbase draws them from RRD files derived in the workdir. A
+## file without such an archive is not buffered; its windows are read as
+## they would be without the store.
+##
+class prrdstore:
+
+    def __init__(self, daemon=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self    The object
+        @param      daemon  address of rrdcached to fetch through
+        """
+        self.daemon = daemon
+        self.plan([])
+
+    def plan(self, windows, width=1):
+        """
+        @brief      Drop all buffers and set the time windows that will be
+                    requested; the end of all windows is the current time
+
+        @param      self     The object
+        @param      windows  list of time windows in seconds
+        @param      width    width of the graphs in pixels
+
+        @return     void
+        """
+        self.end = int(systime.time())
+        self.windows = set(windows)
+        self.span = max(windows) if windows else 0
+        self.resolution = min(windows) // width if windows else 0
+        self.buffers = {}
+
+    def shares(self, time):
+        """
+        @brief      Check whether a time window is planned together with
+                    others, so that drawing it from a buffer saves fetches
+
+        @param      self  The object
+        @param      time  number of seconds in the past
+
+        @return     True if the window is planned with others
+        """
+        return time in self.windows and len(self.windows) > 1
+
+    def get_buffer(self, path, cf, rras):
+        """
+        @brief      Get the buffer of the planned windows of an RRD file,
+                    fetched on first use
+
+        @param      self  The object
+        @param      path  path to RRD file
+        @param      cf    consolidation function
+        @param      rras  list of (consolidation function, seconds per row,
+                          number of rows) tuples, see prrdindex.get_rras
+
+        @return     prrdseries or None if no archive is both fine enough for
+                    the shortest and long enough for the longest window
+        """
+        if (path, cf) not in self.buffers:
+            steps = [step for c, step, rows in rras
+                     if c == cf and step <= max(1, self.resolution) and step * rows >= self.span]
+            self.buffers[path, cf] = prrdseries(*fetch(path, cf, self.end - self.span, self.end, max(steps),
+                                                       self.daemon)) if steps else None
+
+        return self.buffers[path, cf]
+
+    def get(self, path, cf, time, width=1, rras=None):
+        """
+        @brief      Get the data of a time window, from the buffer if the
+                    window is planned with others and the RRD file has a
+                    suitable archive, otherwise fetched at about one row per
+                    pixel
+
+        @param      self   The object
+        @param      path   path to RRD file
+        @param      cf     consolidation function
+        @param      time   number of seconds in the past
+        @param      width  width of the graph in pixels
+        @param      rras   archives of the RRD file, see get_buffer; the
+                           window is fetched on its own if omitted
+
+        @return     prrdseries
+        """
+        start = self.end - time
+        if rras is not None and self.shares(time):
+            series = self.get_buffer(path, cf, rras)
+            if series is not None:
+                return series.window(start, self.end)
+
+        return prrdseries(*fetch(path, cf, start, self.end, max(1, time // width), self.daemon))
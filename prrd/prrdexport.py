@@ -0,0 +1,114 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import csv
+import io
+import json
+import math
+
+#
+# Encoding of the data exported by prrdbase.export for charts drawn by clients
+#
+
+FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+def get_times(data):
+    """
+    Get the time of every row of exported data
+
+    data        dictionary returned by rrdtool.xport
+
+    @return list of seconds since the epoch
+    """
+    meta = data['meta']
+    return [meta['start'] + (i + 1) * meta['step'] for i in range(len(data['data']))]
+
+def compact(value):
+    """
+    Round a value to four significant digits
+
+    value       number or None
+
+    @return float or None for unknown values
+    """
+    if value is None or math.isnan(value):
+        return None
+
+    return float('%.4g' % value)
+
+def to_json(data, title=None):
+    """
+    Encode exported data as json, rows hold the values of the columns
+
+    data        dictionary returned by rrdtool.xport
+    title       title of the graph
+
+    @return json document as bytes
+    """
+    meta = data['meta']
+    document = {
+        'title': title,
+        'start': meta['start'],
+        'end': meta['end'],
+        'step': meta['step'],
+        'columns': meta['legend'],
+        'data': [[compact(v) for v in row] for row in data['data']],
+    }
+    return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+def to_csv(data):
+    """
+    Encode exported data as csv with a time column
+
+    data        dictionary returned by rrdtool.xport
+
+    @return csv document as bytes
+    """
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['time'] + data['meta']['legend'])
+    for t, row in zip(get_times(data), data['data']):
+        writer.writerow([t] + ['' if v is None else v for v in map(compact, row)])
+
+    return out.getvalue().encode('utf-8')
+
+def encode(data, format, title=None):
+    """
+    Encode exported data
+
+    data        dictionary returned by rrdtool.xport
+    format      'json' or 'csv'
+    title       title of the graph, json only
+
+    @return document as bytes
+    """
+    if format == 'json':
+        return to_json(data, title)
+    if format == 'csv':
+        return to_csv(data)
+
+    raise ValueError('Unknown export format: %s' % format)
@@ -0,0 +1,105 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import itertools
+import os
+
+from prrd.prrdmanifest import prrdmanifest
+
+##
+## @brief      Draws the graphs of every host below the base path, e.g. on a
+##             central server that receives the RRD files of many hosts
+##             through the collectd network plugin.
+##
+class prrdfleet:
+
+    def __init__(self, base, hosts='*'):
+        """
+        @brief      Constructs the object.
+
+        @param      self   The object
+        @param      base   prrdbase object holding the settings
+        @param      hosts  list of host names or "*" for every host directory
+                           below the base path
+        """
+        if hosts == '*':
+            hosts = self.discover_hosts(base.base_path)
+        self.bases = [base.for_host(host) for host in hosts]
+
+    @staticmethod
+    def discover_hosts(base_path):
+        """
+        @brief      List the host directories below the base path
+
+        @param      base_path  directory holding one directory per host
+
+        @return     sorted list of host names
+        """
+        if not os.path.isdir(base_path):
+            return []
+
+        with os.scandir(base_path) as entries:
+            return sorted(e.name for e in entries if e.is_dir())
+
+    def expand(self, outdir='.'):
+        """
+        @brief      Expand the manifest for every host, the images of a host
+                    are written to a directory of its own. The jobs of the
+                    hosts are interleaved so that a host with many graphs does
+                    not hold up the others.
+
+        @param      self    The object
+        @param      outdir  directory to create the host directories in
+
+        @return     tuple of the list of jobs to run and the list of jobs that
+                    were skipped because their RRD files are missing
+        """
+        jobs = []
+        skipped = []
+        for base in self.bases:
+            hostjobs, hostskipped = prrdmanifest(base).expand(os.path.join(outdir, base.hostname))
+            jobs.append(hostjobs)
+            skipped.extend(hostskipped)
+
+        jobs = [job for row in itertools.zip_longest(*jobs) for job in row if job is not None]
+        return jobs, skipped
+
+def expand(base, outdir='.', hosts=None):
+    """
+    Expand the manifest for the host of the settings file, or for a list of
+    hosts below the base path
+
+    base        prrdbase object holding the settings
+    outdir      directory to write the images to
+    hosts       list of host names, "*" for every host or None
+
+    @return tuple of the prrdbase objects of the hosts, the list of jobs to
+            run and the list of jobs that were skipped because their RRD
+            files are missing
+    """
+    if hosts:
+        fleet = prrdfleet(base, hosts)
+        return (fleet.bases,) + fleet.expand(outdir)
+
+    return ([base],) + prrdmanifest(base).expand(outdir)
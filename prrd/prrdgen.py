@@ -23,19 +23,45 @@
  ##################################################################################
 
 import sys
-import socket       # hostname
+import copy
 import rrdtool
 import json
+import numpy as np
 import os.path
+import re
+import tempfile
 from datetime import datetime
+from time import perf_counter
 from pprint import pprint
+from prrd import prrddata
+from prrd.prrdalert import prrdalert
+from prrd.prrdcache import prrdcache
+from prrd.prrdgraphs import FLEET_METRICS, SPECS
+from prrd.prrdhost import prrdhost
+from prrd.prrdheatmap import prrdheatmap
+from prrd.prrdindex import prrdindex
+from prrd.prrdinterfaces import prrdinterfaces
+from prrd.prrdpercentiles import prrdpercentiles
+from prrd.prrdrollup import prrdrollup
+from prrd.prrdwriter import prrdwriter
+
+# default time windows that can be referred to by name in the settings file
+WINDOWS = {
+    'day': 86400,
+    'week': 86400 * 7,
+    '100days': 86400 * 100,
+}
+
+# default number of seconds between two renders of a graph, keyed on window
+REFRESH = {
+    86400: 60,
+    86400 * 7: 900,
+    86400 * 100: 3600,
+}
 
 ##
-## @brief      Class for rrd graph.
-##
-##
-## Usage note: remember to use \\n for newlines, see:
-## https://github.com/oetiker/rrdtool-1.x/issues/23
+## @brief      Class for rrd graph. The graphs themselves are specified in
+##             prrdgraphs.
 ##
 class prrdbase:
 
@@ -47,17 +73,79 @@ class prrdbase:
         @param      filename  path to settings json file
         """
         self.base_path = '/var/lib/collectd/rrd/'
-        self.hostname = socket.getfqdn()
-        self.hostnamelabel = self.hostname
         self.defaultfont = 'DEFAULT:8'
+        self.index = None
+        # statistics of the last graph drawn, see graph
+        self.stats = {}
+        # RRD files and windows that no archive covers, reported once
+        self.uncovered = set()
 
         # load json file
         if filename:
             with open(filename, 'r') as f:
                 data = json.load(f)
 
+        self.settings = data
         self.width = data['settings']['width']
         self.height = data['settings']['height']
+        self.base_path = data['settings'].get('base_path', self.base_path)
+
+        # graphs and fetches go through rrdcached, which flushes the RRD files
+        # they read, when its address is set
+        self.daemon = data['settings'].get('daemon')
+        self.store = prrddata.prrdstore(self.daemon)
+
+        # the hostname is only resolved when it is not set in the settings
+        self.host = prrdhost(data['settings'].get('hostname'))
+        self.hostnamelabel = data['settings'].get('hostnamelabel')
+
+        self.windows = dict(WINDOWS)
+        self.windows.update(data.get('windows', {}))
+
+        self.refresh = dict(REFRESH)
+        self.refresh.update({self.get_window(k): v for k, v in data.get('refresh', {}).items()})
+
+        # render cache, images younger than their freshness are not redrawn
+        self.cache = None
+        if data['settings'].get('cache'):
+            freshness = {self.get_window(k): v for k, v in data.get('freshness', {}).items()}
+            self.cache = prrdcache(data['settings']['cache'], freshness)
+        self.workers = data['settings'].get('workers', os.cpu_count() or 1)
+        self.writer = prrdwriter()
+
+        # directory for RRD files derived from the collectd data
+        self.workdir = data['settings'].get('workdir', os.path.join(tempfile.gettempdir(), 'prrd'))
+        self.cpu_aggregate = data['settings'].get('cpu_aggregate', 'average')
+
+        # the graphs print the values the alert rules check
+        self.alerts = prrdalert(self) if 'alerts' in data else None
+
+    def for_host(self, hostname):
+        """
+        @brief      Get a copy of this object that draws the graphs of another
+                    host below the same base path
+
+        @param      self      The object
+        @param      hostname  name of the host directory
+
+        @return     prrdbase object
+        """
+        other = copy.copy(self)
+        other.host = prrdhost(hostname)
+        # the label of the settings file names its own host
+        other.hostnamelabel = None
+        other.index = None
+        other.stats = {}
+        return other
+
+    @property
+    def hostname(self):
+        """
+        Name of the host, resolved on first use
+
+        @return hostname
+        """
+        return self.host.get_hostname()
 
     def get_os_name(self):
         """
@@ -65,14 +153,15 @@ class prrdbase:
 
         @return get the operating system name
         """
-        with open("/etc/os-release") as f:
-            d = {}
-            for line in f:
-                k,v = line.rstrip().split("=")
-                d[k] = v
-            return d['PRETTY_NAME'].strip('"')
+        return self.host.get_os_name()
 
-        return "Unknown"
+    def get_footer(self):
+        """
+        Get the operating system and timestamp footer of a graph
+
+        @return tuple of rrdtool COMMENT arguments
+        """
+        return self.host.get_footer()
 
     def create_graph(self, type, time, imgfile):
         """
@@ -104,6 +193,496 @@ class prrdbase:
         """
         return self.base_path + self.hostname
 
+    def get_window(self, window):
+        """
+        @brief      Resolve a time window to a number of seconds
+
+        @param      self    The object
+        @param      window  name of the window or a number of seconds
+
+        @return     number of seconds
+        """
+        if isinstance(window, int):
+            return window
+        if window in self.windows:
+            return self.windows[window]
+        if window.isdigit():
+            return int(window)
+
+        raise ValueError('Unknown time window: %s' % window)
+
+    def get_refresh(self, time):
+        """
+        @brief      Get the number of seconds between two renders of a graph
+
+        @param      self  The object
+        @param      time  time window of the graph in seconds
+
+        @return     number of seconds
+        """
+        if time in self.refresh:
+            return self.refresh[time]
+
+        # about one render per pixel column of the default width
+        return max(60, time // 1440)
+
+    def graph(self, time, imgfile, *args, resolve=None, mtimes=None):
+        """
+        @brief      Draw a graph with rrdtool, unless the render cache holds an
+                    up-to-date image. The image is drawn in memory and written
+                    atomically. With imgfile '-' it is returned instead,
+                    bypassing the render cache.
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file or '-'
+        @param      args     rrdtool graph arguments
+        @param      resolve  function mapping the arguments to the arguments
+                             to draw with, only called when the graph is
+                             drawn, e.g. to choose the archives to read
+        @param      mtimes   dictionary mapping RRD files to modification
+                             times to key the render cache on and to count
+                             as read instead of the files of the arguments,
+                             see check_sources
+
+        @return     True if the graph was drawn, False if it was up-to-date;
+                    for imgfile '-' the dictionary returned by rrdtool.graphv,
+                    holding the png under 'image' and the graph metadata
+        """
+        rrds = prrdcache.get_rrds(args)
+        self.stats.update(rrds=len(rrds if mtimes is None else mtimes),
+                          defs=sum(1 for a in args if a.startswith('DEF:')))
+
+        resolve = resolve or tuple
+        if imgfile == '-':
+            return self.render(*resolve(args))
+
+        if self.cache is None:
+            self.writer.write(imgfile, self.render(*resolve(args))['image'])
+            return True
+
+        if mtimes is None:
+            mtimes = self.get_mtimes(rrds, flush=not self.cache.is_recent(imgfile, time))
+        if self.cache.is_fresh(imgfile, time, self.width, args, mtimes):
+            return False
+
+        self.writer.write(imgfile, self.render(*resolve(args))['image'])
+        self.cache.store(imgfile, time, self.width, args, mtimes)
+        return True
+
+    def get_mtimes(self, paths, flush=True):
+        """
+        @brief      Get the modification times of RRD files
+
+        @param      self   The object
+        @param      paths  paths to RRD files
+        @param      flush  whether to flush the files below the base path
+                           from rrdcached first
+
+        @return     dictionary mapping the files to their modification times
+        """
+        index = self.get_index()
+        flushed = [path for path in paths if path.startswith(self.base_path)] if self.daemon and flush else []
+        if flushed:
+            # rrdcached holds updates back, so the mtimes only tell whether the
+            # data changed once the files are flushed
+            rrdtool.flushcached('--daemon', self.daemon, *flushed)
+            for path in flushed:
+                index.mtimes.pop(path, None)
+
+        return {path: index.get_mtime(path) for path in paths}
+
+    def get_sources(self, type, instance=None):
+        """
+        @brief      Get the files the RRD file of a derived graph is computed
+                    from, see derive
+
+        @param      self      The object
+        @param      type      'cpu_all', 'internet_all', 'fleet' or 'rollup'
+        @param      instance  metric of the fleet graph
+
+        @return     list of paths
+        """
+        if type == 'cpu_all':
+            return [self.get_rrd_root() + '/cpu-%i/cpu-%s.rrd' % (core, state)
+                    for state, _ in self.get_spec('cpu').rrds for core in self.get_graph_instances('cpu')]
+        if type == 'internet_all':
+            index = self.get_index()
+            return [index.find('interface', name, 'if_octets') for name in prrdinterfaces(self).get_names()]
+        if type == 'fleet':
+            return prrdpercentiles(self).get_paths(instance)
+        if type == 'rollup':
+            return [prrdrollup.get_path(self)]
+
+        raise ValueError('Not a derived graph: %s' % type)
+
+    def check_sources(self, type, time, imgfile, instance=None):
+        """
+        @brief      Check whether a derived graph has to be drawn again,
+                    before its RRD file is computed: its image is kept while
+                    it is fresh or while the files it is derived from and the
+                    time bucket of its right edge are unchanged
+
+        @param      self      The object
+        @param      type      'cpu_all', 'internet_all', 'fleet' or 'rollup'
+        @param      time      number of seconds in the past
+        @param      imgfile   url to image file or '-'
+        @param      instance  metric of the fleet graph
+
+        @return     dictionary mapping the source files to their
+                    modification times, to key the render cache on, or None
+                    if the image is up-to-date; the times are not looked up
+                    without the render cache
+        """
+        if self.cache is not None and imgfile != '-' and self.cache.is_recent(imgfile, time):
+            return None
+
+        sources = self.get_sources(type, instance)
+        if self.cache is None or imgfile == '-':
+            return dict.fromkeys(sources)
+        mtimes = self.get_mtimes(sources)
+        if self.cache.is_unchanged(imgfile, time, self.width, mtimes):
+            return None
+
+        return mtimes
+
+    def render(self, *args):
+        """
+        @brief      Draw a graph in memory with rrdtool and record the time
+                    spent, the size of the image and the lines printed by
+                    PRINT elements in the statistics
+
+        @param      self  The object
+        @param      args  rrdtool graph arguments
+
+        @return     dictionary returned by rrdtool.graphv
+        """
+        # RRD files derived in the workdir are not written through rrdcached
+        if self.daemon and any(path.startswith(self.base_path) for path in prrdcache.get_rrds(args)):
+            args = ('--daemon', self.daemon) + args
+        start = perf_counter()
+        graph = rrdtool.graphv('-', *args)
+        self.stats.update(rrdtool=perf_counter() - start, size=len(graph['image']))
+        prints = [graph['print[%i]' % i] for i in range(sum(1 for key in graph if key.startswith('print[')))]
+        if prints:
+            self.stats['prints'] = prints
+        return graph
+
+    def get_index(self):
+        """
+        Get the index of the RRD files of this host, the collectd tree is
+        only scanned on first use
+
+        @return prrdindex object
+        """
+        if self.index is None:
+            self.index = prrdindex(self.get_rrd_root())
+
+        return self.index
+
+    def rrd_exists(self, path):
+        """
+        Check whether an RRD file is present
+
+        @param path path to RRD file
+
+        @return True if the file exists
+        """
+        return self.get_index().exists(path)
+
+    def get_graph_instances(self, type):
+        """
+        @brief      List every instance of a graph type found in the collectd
+                    tree
+
+        @param      self  The object
+        @param      type  type of the graph
+
+        @return     list of interfaces, partitions, gpu ids or ping targets
+        """
+        index = self.get_index()
+        if type == 'cpu':
+            return sorted(int(c) for c in index.get_plugin_instances('cpu') if c.isdigit())
+        if type == 'internet':
+            return index.get_plugin_instances('interface')
+        if type == 'df':
+            # the root partition has its own graph
+            return [p for p in index.get_plugin_instances('df') if p != 'root']
+        if type == 'ping':
+            return index.get_type_instances('ping', None, 'ping')
+        if type == 'fleet':
+            targets = index.get_type_instances('ping', None, 'ping')
+            return [m for m in FLEET_METRICS if m != 'ping'] + ['ping-' + t for t in targets]
+        if type.startswith('gpu_'):
+            gpus = []
+            for pinstance in index.get_plugin_instances('cuda'):
+                m = re.match(r'00000000:(\d+):00\.0$', pinstance)
+                if m:
+                    gpus.append(int(m.group(1)))
+            return sorted(gpus)
+
+        raise ValueError('Cannot discover instances of graph type: %s' % type)
+
+    def get_spec(self, type):
+        """
+        @brief      Get the specification of a graph type
+
+        @param      self  The object
+        @param      type  type of the graph
+
+        @return     prrdspec object
+        """
+        if type == 'utilization':
+            type = 'memory'
+        if type == 'temperature':
+            # temperature sensors on Raspberry Pi or mac mini
+            rpi = SPECS['temperature_rpi']
+            if self.rrd_exists(self.get_rrd_root() + '/' + rpi.rrds[0][1]):
+                return rpi
+        if type not in SPECS:
+            raise ValueError('Unknown graph type: %s' % type)
+
+        return SPECS[type]
+
+    def get_graph_rrds(self, type, instance=None):
+        """
+        @brief      Get the RRD files read by a graph
+
+        @param      self      The object
+        @param      type      type of the graph, i.e. the name of the graph_*
+                              method without the prefix
+        @param      instance  interface, partition, gpu id or ping target
+
+        @return     list of paths to RRD files
+        """
+        if type == 'cpu_all':
+            # the combined file is derived from the files of the cores
+            cores = self.get_graph_instances('cpu')
+            return self.get_graph_rrds('cpu', cores[0] if cores else 0)
+        if type == 'internet_all':
+            interfaces = prrdinterfaces(self).get_names()
+            return self.get_graph_rrds('internet', interfaces[0] if interfaces else 'all')
+        if type == 'ping_heatmap':
+            targets = self.get_graph_instances('ping')
+            return self.get_graph_rrds('ping', targets[0] if targets else 'none')
+        if type == 'rollup':
+            # the store is only looked at when drawing
+            return []
+        if type == 'fleet':
+            # the files of other hosts are not in the index of this host
+            if prrdpercentiles(self).get_paths(instance):
+                return []
+            return [os.path.join(self.get_rrd_root(), prrdpercentiles.get_metric(instance)[0])]
+
+        return list(self.get_spec(type).get_rrds(self.get_rrd_root(), instance).values())
+
+    def draw(self, type, time, imgfile, instance=None, paths=None, mtimes=None, derived=None):
+        """
+        @brief      Draw a graph from its specification; nothing is drawn when
+                    one of its RRD files is missing
+
+        @param      self      The object
+        @param      type      type of the graph
+        @param      time      number of seconds in the past
+        @param      imgfile   url to image file or '-' to draw in memory
+        @param      instance  interface, partition, gpu id or ping target
+        @param      paths     dictionary mapping RRD keys to paths, for RRD
+                              files outside the collectd tree
+        @param      mtimes    modification times to key the render cache on,
+                              see graph
+        @param      derived   dictionary mapping (path, consolidation
+                              function) to RRD files holding the rows of that
+                              function, see share
+
+        @return     True if the graph was drawn, False if it was up-to-date
+                    and None if RRD files are missing; see graph for
+                    imgfile '-'
+        """
+        spec = self.get_spec(type)
+        if paths is None:
+            paths = spec.get_rrds(self.get_rrd_root(), instance)
+            if not all(self.rrd_exists(path) for path in paths.values()):
+                return None
+
+        title = self.get_title(type, instance)
+        args = spec.build(time, self.width, self.height, self.defaultfont, paths, title, self.get_footer())
+        if self.alerts is not None:
+            args += self.alerts.probe(self, type, instance, paths)
+
+        def resolve(args):
+            # the archives are only looked up when the graph is drawn
+            resolutions = self.get_resolutions(spec, time, paths, self.width)
+            written = dict(derived or {})
+            return [self.share(arg, time, written) or spec.resolve(arg, resolutions) if arg.startswith('DEF:')
+                    else arg for arg in args]
+
+        return self.graph(time, imgfile, *args, resolve=resolve, mtimes=mtimes)
+
+    def share(self, arg, time, derived):
+        """
+        @brief      Point a DEF at an RRD file in the workdir holding the rows
+                    of its window cut from the data store, so that the graphs
+                    of the same data for different windows share one fetch
+
+        @param      self     The object
+        @param      arg      DEF argument with the path filled in
+        @param      time     number of seconds in the past
+        @param      derived  dictionary mapping (path, consolidation
+                             function) to the RRD files already written for
+                             the graph, e.g. by prrdrollup.derive
+
+        @return     DEF argument or None if the data store does not buffer
+                    the window of the RRD file
+        """
+        head, ds, cf = arg.rsplit(':', 2)
+        name, _, path = head[4:].partition('=')
+        path = path.replace('\\:', ':')
+        if (path, cf) not in derived:
+            if not self.store.shares(time) or not path.startswith(self.base_path):
+                return None
+            if self.store.get_buffer(path, cf, self.get_index().get_rras(path)) is None:
+                return None
+            series = self.store.get(path, cf, time, self.width, self.get_index().get_rras(path))
+            derived[path, cf] = os.path.join(self.workdir, 'shared', os.path.relpath(path[:-4], self.base_path) +
+                                             '-%s-%i.rrd' % (cf, time))
+            prrddata.write_rrd(derived[path, cf], series.first, series.step, series.names, series.values)
+        # the file holds the rows of the consolidation function as averages,
+        # rrdtool still consolidates them to pixels by the original one
+        return 'DEF:%s=%s:%s:AVERAGE:reduce=%s' % (name, derived[path, cf].replace(':', '\\:'), ds, cf)
+
+    def export(self, type, time, instance=None, points=None):
+        """
+        @brief      Export the data of a graph with rrdtool xport, computed
+                    from the same definitions as the graph
+
+        @param      self      The object
+        @param      type      type of the graph
+        @param      time      number of seconds in the past
+        @param      instance  interface, partition, gpu id or ping target;
+                              the graph and its instance for 'rollup'
+        @param      points    number of rows to downsample to, one per
+                              pixel column of the graph by default
+
+        @return     dictionary returned by rrdtool.xport or None if RRD files
+                    are missing
+        """
+        derived = {}
+        if type == 'rollup':
+            type, instance = prrdrollup.split_graph(instance)
+            paths, derived = prrdrollup(self).derive(type, instance, time) or (None, {})
+        elif type in ('cpu_all', 'internet_all', 'fleet'):
+            path = self.derive(type, time, instance)
+            paths = None if path is None else {self.get_spec(type).rrds[0][0]: path}
+        else:
+            paths = self.get_spec(type).get_rrds(self.get_rrd_root(), instance)
+            if not all(self.rrd_exists(path) for path in paths.values()):
+                paths = None
+        if paths is None:
+            return None
+
+        spec = self.get_spec(type)
+        points = points or self.width
+        if derived:
+            # the DEFs read the files of their consolidation function
+            args = [self.share(arg, time, derived) or arg if arg.startswith('DEF:') else arg
+                    for arg in spec.export(time, points, paths)]
+        else:
+            args = spec.export(time, points, paths, self.get_resolutions(spec, time, paths, points))
+        if self.daemon and any(path.startswith(self.base_path) for path in paths.values()):
+            args = ['--daemon', self.daemon] + args
+        return rrdtool.xport(*args)
+
+    def derive(self, type, time, instance=None):
+        """
+        @brief      Compute the RRD file of a graph that combines other RRD
+                    files: all cpu cores, all interfaces or a metric of all
+                    hosts
+
+        @param      self      The object
+        @param      type      'cpu_all', 'internet_all' or 'fleet'
+        @param      time      number of seconds in the past
+        @param      instance  metric of the fleet graph
+
+        @return     path to the RRD file or None if there is nothing to combine
+        """
+        if type == 'cpu_all':
+            return self.aggregate_cpu(time)
+        if type == 'internet_all':
+            return prrdinterfaces(self).aggregate(time)
+
+        return prrdpercentiles(self).aggregate(instance, time)
+
+    def get_resolutions(self, spec, time, paths, width):
+        """
+        @brief      Choose the archive every DEF of a graph reads from, so that
+                    about one row is read per pixel column instead of the finest
+                    rows rrdtool would otherwise consider. The archives of every
+                    RRD file are read once with rrdtool info. Files and
+                    windows that no archive covers are listed once under
+                    'uncovered' in the statistics, so that the process that
+                    runs the jobs warns about them. RRD files derived in the
+                    workdir hold a single archive and are left out.
+
+        @param      self   The object
+        @param      spec   prrdspec of the graph
+        @param      time   number of seconds in the past
+        @param      paths  dictionary mapping RRD keys to paths
+        @param      width  number of pixel columns or rows to export
+
+        @return     dictionary mapping DEF names to tuples of the
+                    consolidation function and seconds per row
+        """
+        index = self.get_index()
+        resolutions = {}
+        for name, rrd, cf in spec.get_defs():
+            path = paths[rrd]
+            if not path.startswith(self.base_path):
+                continue
+            rra = prrddata.choose_rra(index.get_rras(path), cf, time, width)
+            if rra is None:
+                continue
+
+            cf, step, covered = rra
+            if not covered and (path, time) not in self.uncovered:
+                self.uncovered.add((path, time))
+                self.stats.setdefault('uncovered', []).append((path, time))
+            resolutions[name] = (cf, step)
+
+        return resolutions
+
+    def aggregate_cpu(self, time):
+        """
+        @brief      Combine the cpu states of all cores into a single RRD file
+                    with one data source per state. The RRD files are fetched
+                    through the data store, so that the day and week graph
+                    share their fetches, and the cores are summed or averaged
+                    (setting 'cpu_aggregate') with NumPy. The graph then reads
+                    one file instead of one file per core and state.
+
+        @param      self  The object
+        @param      time  number of seconds in the past
+
+        @return     path to the RRD file or None if there are no cpu cores
+        """
+        cores = self.get_graph_instances('cpu')
+        if not cores:
+            return None
+
+        states = [s for s, _ in self.get_spec('cpu').rrds]
+        columns = []
+        for state in states:
+            series = []
+            for core in cores:
+                path = self.get_rrd_root() + '/cpu-%i/cpu-%s.rrd' % (core, state)
+                data = self.store.get(path, 'AVERAGE', time, self.width, self.get_index().get_rras(path))
+                series.append(data.column())
+            columns.append(prrddata.combine(series, self.cpu_aggregate))
+
+        rows = min(len(c) for c in columns)
+        path = os.path.join(self.workdir, self.hostname, 'cpu-all-%i.rrd' % time)
+        prrddata.write_rrd(path, data.first, data.step, states, np.stack([c[:rows] for c in columns], axis=1))
+        return path
+
     def get_time(self):
         """
         Grab current time
@@ -114,7 +693,24 @@ class prrdbase:
         return dtobj.strftime("%Y-%m-%d %H:%M:%S")
 
     def build_title(self, name):
-        return self.hostnamelabel + " / " + name
+        return (self.hostnamelabel or self.hostname) + " / " + name
+
+    def get_title(self, type, instance=None):
+        """
+        @brief      Get the title of a graph
+
+        @param      self      The object
+        @param      type      type of the graph
+        @param      instance  interface, partition, gpu id or ping target
+
+        @return     title including the host name
+        """
+        if type == 'fleet':
+            return 'Fleet / ' + prrdpercentiles.get_metric(instance)[2]
+        if type == 'rollup':
+            return self.get_title(*prrdrollup.split_graph(instance))
+
+        return self.build_title(self.get_spec(type).title.format(instance=instance))
 
     def graph_load(self, time, imgfile):
         """
@@ -124,756 +720,315 @@ class prrdbase:
         @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        path = self.base_path + self.hostname + "/load/load.rrd"
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', "end - " + str(time),
-            '--end', "now",
-            '--font',self.defaultfont,
-            '--title', self.build_title("Load averages"),
-            'DEF:st=' + path + ':shortterm:AVERAGE',
-            'DEF:stmaxl=' + path + ':shortterm:MAX',
-            'DEF:mt=' + path + ':midterm:AVERAGE',
-            'DEF:lt=' + path + ':longterm:AVERAGE',
-            'VDEF:stlast=st,LAST',
-            'VDEF:stmin=st,MINIMUM',
-            'VDEF:stmax=st,MAXIMUM',
-            'VDEF:stavg=st,AVERAGE',
-            'VDEF:mtlast=mt,LAST',
-            'VDEF:mtmin=mt,MINIMUM',
-            'VDEF:mtmax=mt,MAXIMUM',
-            'VDEF:mtavg=mt,AVERAGE',
-            'VDEF:ltlast=lt,LAST',
-            'VDEF:ltmin=lt,MINIMUM',
-            'VDEF:ltmax=lt,MAXIMUM',
-            'VDEF:ltavg=lt,AVERAGE',
-            "COMMENT:            Now      Min     Max     Avg\\n",
-            'AREA:stmaxl#AAFFAA',
-            'LINE1:st#FF0000:1 min ',
-            'GPRINT:stlast:%6.2lf',
-            'GPRINT:stmin:%6.2lf',
-            'GPRINT:stmax:%6.2lf',
-            "GPRINT:stavg:%6.2lf\\n",
-            'LINE1:mt#00FF00:5 min ',
-            'GPRINT:mtlast:%6.2lf',
-            'GPRINT:mtmin:%6.2lf',
-            'GPRINT:mtmax:%6.2lf',
-            "GPRINT:mtavg:%6.2lf\\n",
-            'LINE1:lt#0000FF:15 min',
-            'GPRINT:ltlast:%6.2lf',
-            'GPRINT:ltmin:%6.2lf',
-            'GPRINT:ltmax:%6.2lf',
-            'GPRINT:ltavg:%6.2lf\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
-
-    def graph_cpu(self, time, imgfile):
-        """
-        @brief      generate cpu usage graph
+        return self.draw('load', time, imgfile)
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+    def graph_cpu(self, time, imgfile, core=0):
+        """
+        @brief      generate cpu usage graph of a single core
+
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
+        @param      core     number of the cpu core
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/cpu-0"
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-u', '100',
-            '-r',
-            '-l', '0',
-            '-L', '5',
-            '-v', 'Jiffies [-]',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', "end - " + str(time),
-            '--end', "now",
-            '--title', self.build_title("CPU Utilization"),
-            '--font',self.defaultfont,
-            'DEF:idle=' + pathb + '/cpu-idle.rrd:value:AVERAGE',
-            'DEF:nice=' + pathb + '/cpu-nice.rrd:value:AVERAGE',
-            'DEF:user=' + pathb + '/cpu-user.rrd:value:AVERAGE',
-            'DEF:wait=' + pathb + '/cpu-wait.rrd:value:AVERAGE',
-            'DEF:system=' + pathb + '/cpu-system.rrd:value:AVERAGE',
-            'DEF:softirq=' + pathb + '/cpu-softirq.rrd:value:AVERAGE',
-            'DEF:interrupt=' + pathb + '/cpu-interrupt.rrd:value:AVERAGE',
-            'DEF:steal=' + pathb + '/cpu-steal.rrd:value:AVERAGE',
-            'CDEF:cdef-steal=steal,UN,0,steal,IF',
-            'CDEF:cdef-interrupt=interrupt,UN,0,interrupt,IF,cdef-steal,+',
-            'CDEF:cdef-softirq=softirq,UN,0,softirq,IF,cdef-interrupt,+',
-            'CDEF:cdef-system=system,UN,0,system,IF,cdef-softirq,+',
-            'CDEF:cdef-wait=wait,UN,0,wait,IF,cdef-system,+',
-            'CDEF:cdef-user=user,UN,0,user,IF,cdef-wait,+',
-            'CDEF:cdef-nice=nice,UN,0,nice,IF,cdef-user,+',
-            'CDEF:cdef-idle=idle,UN,0,idle,IF,cdef-nice,+',
-            'AREA:cdef-idle#f1f1f1',
-            'AREA:cdef-nice#bff7bf',
-            'AREA:cdef-user#bfbfff',
-            'AREA:cdef-wait#ffebbf',
-            'AREA:cdef-system#ffbfbf',
-            'AREA:cdef-softirq#ffbfff',
-            'AREA:cdef-interrupt#e7bfe7',
-            'AREA:cdef-steal#bfbfbf',
-            'LINE1:cdef-idle#c8c8c8:idle',
-            'GPRINT:idle:AVERAGE:     %5.1lf Avg,',
-            'GPRINT:idle:MIN:%5.1lf Min,',
-            'GPRINT:idle:MAX:%5.1lf Max,',
-            "GPRINT:idle:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-nice#00e000:nice',
-            'GPRINT:nice:AVERAGE:     %5.1lf Avg,',
-            'GPRINT:nice:MIN:%5.1lf Min,',
-            'GPRINT:nice:MAX:%5.1lf Max,',
-            "GPRINT:nice:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-user#0000ff:user',
-            'GPRINT:user:AVERAGE:     %5.1lf Avg,',
-            'GPRINT:user:MIN:%5.1lf Min,',
-            'GPRINT:user:MAX:%5.1lf Max,',
-            "GPRINT:user:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-wait#ffb000:wait',
-            'GPRINT:wait:AVERAGE:     %5.1lf Avg,',
-            'GPRINT:wait:MIN:%5.1lf Min,',
-            'GPRINT:wait:MAX:%5.1lf Max,',
-            "GPRINT:wait:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-system#ff0000:system',
-            'GPRINT:system:AVERAGE:   %5.1lf Avg,',
-            'GPRINT:system:MIN:%5.1lf Min,',
-            'GPRINT:system:MAX:%5.1lf Max,',
-            "GPRINT:system:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-softirq#ff00ff:softirq',
-            'GPRINT:softirq:AVERAGE:  %5.1lf Avg,',
-            'GPRINT:softirq:MIN:%5.1lf Min,',
-            'GPRINT:softirq:MAX:%5.1lf Max,',
-            "GPRINT:softirq:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-interrupt#a000a0:interrupt',
-            'GPRINT:interrupt:AVERAGE:%5.1lf Avg,',
-            'GPRINT:interrupt:MIN:%5.1lf Min,',
-            'GPRINT:interrupt:MAX:%5.1lf Max,',
-            "GPRINT:interrupt:LAST:%5.1lf Last\\n",
-            'LINE1:cdef-steal#000000:steal',
-            'GPRINT:steal:AVERAGE:    %5.1lf Avg,',
-            'GPRINT:steal:MIN:%5.1lf Min,',
-            'GPRINT:steal:MAX:%5.1lf Max,',
-            "GPRINT:steal:LAST:%5.1lf Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        return self.draw('cpu', time, imgfile, core)
+
+    def graph_cpu_all(self, time, imgfile):
+        """
+        @brief      generate cpu usage graph of all cores combined
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        # skip the fetches when the cores are unchanged
+        mtimes = self.check_sources('cpu_all', time, imgfile)
+        if mtimes is None:
+            return False
+
+        path = self.aggregate_cpu(time)
+        if path is None:
+            return None
+
+        return self.draw('cpu_all', time, imgfile, paths={'cpu': path}, mtimes=mtimes)
 
     def graph_gpu_temperature(self, time, imgfile, gpu_id):
         """
-        Output GPU temperature
-
-        time        Number of seconds to plot
-        imgfile     Filename
-        gpu_id      ID of the GPU
-        """
-        pathb = self.base_path + self.hostname + '/cuda-00000000:%02i:00.0/temperature-temperature_gpu.rrd' % gpu_id
-        if not os.path.isfile(pathb):
-            return
-
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Temperature"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '30',
-            '-u', '80',
-            '-v Temperature',
-            'DEF:min=' + pathb.replace(':','\:') + ':value:MIN',
-            'DEF:avg=' + pathb.replace(':','\:') + ':value:AVERAGE',
-            'DEF:max=' + pathb.replace(':','\:') + ':value:MAX',
-            'CDEF:ds_red=max,70,GT,max,UNKN,IF',
-            'CDEF:ds_orange=max,50,GT,max,70,GT,70,max,IF,UNKN,IF',
-            'CDEF:ds_green=max,50,GT,50,max,IF',
-            'AREA:ds_red#FF4444',
-            'LINE1:ds_red#FF0000',
-            'AREA:ds_orange#FFD044',
-            'LINE1:ds_orange#FFB000',
-            'AREA:ds_green#CCFFCC',
-            'LINE1:ds_green#00FF00',
-            'GPRINT:max:AVERAGE:Temperature   %5.1lf Avg,',
-            'GPRINT:max:MIN:%5.1lf Min,',
-            'GPRINT:max:MAX:%5.1lf Max',
-            'GPRINT:max:LAST:%5.1lf Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        @brief      generate GPU temperature graph
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      gpu_id   ID of the GPU
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('gpu_temperature', time, imgfile, gpu_id)
 
     def graph_gpu_power(self, time, imgfile, gpu_id):
         """
-        Output GPU power consumption
-
-        time        Number of seconds to plot
-        imgfile     Filename
-        gpu_id      ID of the GPU
-        """
-        pathb = self.base_path + self.hostname + '/cuda-00000000:%02i:00.0/power-power_draw.rrd' % gpu_id
-        if not os.path.isfile(pathb):
-            return
-
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Power Consumption"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-u', '200',
-            '-v Power',
-            'DEF:min=' + pathb.replace(':','\:') + ':value:MIN',
-            'DEF:avg=' + pathb.replace(':','\:') + ':value:AVERAGE',
-            'DEF:max=' + pathb.replace(':','\:') + ':value:MAX',
-            'CDEF:ds_red=max,150,GT,max,UNKN,IF',
-            'CDEF:ds_orange=max,50,GT,max,150,GT,150,max,IF,UNKN,IF',
-            'CDEF:ds_green=max,50,GT,50,max,IF',
-            'AREA:ds_red#FF4444',
-            'LINE1:ds_red#FF0000',
-            'AREA:ds_orange#FFD044',
-            'LINE1:ds_orange#FFB000',
-            'AREA:ds_green#CCFFCC',
-            'LINE1:ds_green#00FF00',
-            'GPRINT:max:AVERAGE:Power   %5.1lf Avg,',
-            'GPRINT:max:MIN:%5.1lf Min,',
-            'GPRINT:max:MAX:%5.1lf Max',
-            'GPRINT:max:LAST:%5.1lf Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        @brief      generate GPU power consumption graph
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      gpu_id   ID of the GPU
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('gpu_power', time, imgfile, gpu_id)
 
     def graph_gpu_utilization(self, time, imgfile, gpu_id):
         """
-        Output GPU power consumption
-
-        time        Number of seconds to plot
-        imgfile     Filename
-        gpu_id      ID of the GPU
-        """
-        pathb = self.base_path + self.hostname + '/cuda-00000000:%02i:00.0/percent-utilization_gpu.rrd' % gpu_id
-        if not os.path.isfile(pathb):
-            return
-
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Utilization"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-u', '100',
-            '-v Utilization',
-            'DEF:min=' + pathb.replace(':','\:') + ':value:MIN',
-            'DEF:avg=' + pathb.replace(':','\:') + ':value:AVERAGE',
-            'DEF:max=' + pathb.replace(':','\:') + ':value:MAX',
-            'CDEF:ds_red=max,90,GT,max,UNKN,IF',
-            'CDEF:ds_orange=max,50,GT,max,90,GT,90,max,IF,UNKN,IF',
-            'CDEF:ds_green=max,50,GT,50,max,IF',
-            'AREA:ds_red#FF4444',
-            'LINE1:ds_red#FF0000',
-            'AREA:ds_orange#FFD044',
-            'LINE1:ds_orange#FFB000',
-            'AREA:ds_green#CCFFCC',
-            'LINE1:ds_green#00FF00',
-            'GPRINT:max:AVERAGE:Utilization   %5.1lf Avg,',
-            'GPRINT:max:MIN:%5.1lf Min,',
-            'GPRINT:max:MAX:%5.1lf Max',
-            'GPRINT:max:LAST:%5.1lf Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        @brief      generate GPU utilization graph
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      gpu_id   ID of the GPU
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('gpu_utilization', time, imgfile, gpu_id)
 
     def graph_gpu_fan(self, time, imgfile, gpu_id):
         """
-        Output GPU power consumption
-
-        time        Number of seconds to plot
-        imgfile     Filename
-        gpu_id      ID of the GPU
-        """
-        pathb = self.base_path + self.hostname + '/cuda-00000000:%02i:00.0/percent-fan_speed.rrd' % gpu_id
-        if not os.path.isfile(pathb):
-            return
-
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Fan speed"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-u', '100',
-            '-v Utilization',
-            'DEF:min=' + pathb.replace(':','\:') + ':value:MIN',
-            'DEF:avg=' + pathb.replace(':','\:') + ':value:AVERAGE',
-            'DEF:max=' + pathb.replace(':','\:') + ':value:MAX',
-            'CDEF:ds_red=max,90,GT,max,UNKN,IF',
-            'CDEF:ds_orange=max,50,GT,max,90,GT,90,max,IF,UNKN,IF',
-            'CDEF:ds_green=max,50,GT,50,max,IF',
-            'AREA:ds_red#FF4444',
-            'LINE1:ds_red#FF0000',
-            'AREA:ds_orange#FFD044',
-            'LINE1:ds_orange#FFB000',
-            'AREA:ds_green#CCFFCC',
-            'LINE1:ds_green#00FF00',
-            'GPRINT:max:AVERAGE:Utilization   %5.1lf Avg,',
-            'GPRINT:max:MIN:%5.1lf Min,',
-            'GPRINT:max:MAX:%5.1lf Max',
-            'GPRINT:max:LAST:%5.1lf Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        @brief      generate GPU fan speed graph
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      gpu_id   ID of the GPU
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('gpu_fan', time, imgfile, gpu_id)
 
     def graph_memory(self, time, imgfile):
         """
         @brief      generate memory usage graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/memory"
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-L', '5',
-            '-v', 'Memory [bytes]',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Memory"),
-            '--font',self.defaultfont,
-            'DEF:mem_buf=' + pathb + '/memory-buffered.rrd' + ':value:AVERAGE',
-            'DEF:mem_cached=' + pathb + '/memory-cached.rrd' + ':value:AVERAGE',
-            'DEF:mem_free=' + pathb + '/memory-free.rrd' + ':value:AVERAGE',
-            'DEF:mem_used=' + pathb + '/memory-used.rrd' + ':value:AVERAGE',
-            'CDEF:mem_buf_add=mem_buf,UN,0,mem_buf,IF,mem_used,+',
-            'CDEF:mem_cached_add=mem_cached,UN,0,mem_cached,IF,mem_buf_add,+',
-            'CDEF:mem_free_add=mem_free,UN,0,mem_free,IF,mem_cached_add,+',
-            'TEXTALIGN:left',
-            'AREA:mem_free_add#CCFFCC',
-            'AREA:mem_cached_add#CCCCFF',
-            'AREA:mem_buf_add#f3dfb7',
-            'AREA:mem_used#FFCCCC',
-            'LINE1:mem_free_add#00FF00:Free',
-            'GPRINT:mem_free:AVERAGE:        %5.1lf%s Avg,',
-            'GPRINT:mem_free:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_free:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_free:LAST:%5.1lf%s Last\\n",
-            'LINE1:mem_cached_add#0000FF:Page cache',
-            'GPRINT:mem_cached:AVERAGE:  %5.1lf%s Avg,',
-            'GPRINT:mem_cached:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_cached:MAX:%5.1lf%s Max,',
-            'GPRINT:mem_cached:LAST:%5.1lf%s Last',
-            'LINE1:mem_buf_add#f0a000:Buffer cache',
-            'GPRINT:mem_buf:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:mem_buf:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_buf:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_buf:LAST:%5.1lf%s Last\\n",
-            'LINE1:mem_used#FF0000:Used',
-            'GPRINT:mem_used:AVERAGE:        %5.1lf%s Avg,',
-            'GPRINT:mem_used:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_used:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_used:LAST:%5.1lf%s Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        return self.draw('memory', time, imgfile)
 
     def graph_utilization(self, time, imgfile):
         """
         @brief      generate memory usage graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/memory"
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-L', '5',
-            '-v', 'Memory [bytes]',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Memory"),
-            '--font',self.defaultfont,
-            'DEF:mem_buf=' + pathb + '/memory-buffered.rrd' + ':value:AVERAGE',
-            'DEF:mem_cached=' + pathb + '/memory-cached.rrd' + ':value:AVERAGE',
-            'DEF:mem_free=' + pathb + '/memory-free.rrd' + ':value:AVERAGE',
-            'DEF:mem_used=' + pathb + '/memory-used.rrd' + ':value:AVERAGE',
-            'CDEF:mem_buf_add=mem_buf,UN,0,mem_buf,IF,mem_used,+',
-            'CDEF:mem_cached_add=mem_cached,UN,0,mem_cached,IF,mem_buf_add,+',
-            'CDEF:mem_free_add=mem_free,UN,0,mem_free,IF,mem_cached_add,+',
-            'TEXTALIGN:left',
-            'AREA:mem_free_add#CCFFCC',
-            'AREA:mem_cached_add#CCCCFF',
-            'AREA:mem_buf_add#f3dfb7',
-            'AREA:mem_used#FFCCCC',
-            'LINE1:mem_free_add#00FF00:Free',
-            'GPRINT:mem_free:AVERAGE:        %5.1lf%s Avg,',
-            'GPRINT:mem_free:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_free:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_free:LAST:%5.1lf%s Last\\n",
-            'LINE1:mem_cached_add#0000FF:Page cache',
-            'GPRINT:mem_cached:AVERAGE:  %5.1lf%s Avg,',
-            'GPRINT:mem_cached:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_cached:MAX:%5.1lf%s Max,',
-            'GPRINT:mem_cached:LAST:%5.1lf%s Last',
-            'LINE1:mem_buf_add#f0a000:Buffer cache',
-            'GPRINT:mem_buf:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:mem_buf:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_buf:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_buf:LAST:%5.1lf%s Last\\n",
-            'LINE1:mem_used#FF0000:Used',
-            'GPRINT:mem_used:AVERAGE:        %5.1lf%s Avg,',
-            'GPRINT:mem_used:MIN:%5.1lf%s Min,',
-            'GPRINT:mem_used:MAX:%5.1lf%s Max,',
-            "GPRINT:mem_used:LAST:%5.1lf%s Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        return self.draw('utilization', time, imgfile)
 
     def graph_internet(self, time, imgfile, interface):
         """
-        @brief      generate memory usage graph
+        @brief      generate network interface graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self       The object
+        @param      time       number of seconds in the past
+        @param      imgfile    url to image file
+        @param      interface  name of the network interface
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('internet', time, imgfile, interface)
+
+    def graph_internet_all(self, time, imgfile):
+        """
+        @brief      generate network traffic graph of all interfaces combined
+
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        # skip the fetches when the interfaces are unchanged
+        mtimes = self.check_sources('internet_all', time, imgfile)
+        if mtimes is None:
+            return False
+
+        path = prrdinterfaces(self).aggregate(time)
+        if path is None:
+            return None
+
+        return self.draw('internet_all', time, imgfile, paths={'octets': path}, mtimes=mtimes)
+
+    def graph_fleet(self, time, imgfile, metric='load'):
+        """
+        @brief      generate graph of the p50, p95 and maximum of a metric
+                    across all hosts
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      metric   'load', 'memory', 'df_root' or 'ping-<target>'
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/interface-" + interface + "/if_octets.rrd"
-        if not os.path.isfile(pathb):
-            return
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-v Bytes/s',
-            '--title', self.build_title("Interface %s" % interface),
-            '--font',self.defaultfont,
-            'DEF:rx_max=' + pathb + ':rx:MAX',
-            'DEF:rx_avg=' + pathb + ':rx:AVERAGE',
-            'DEF:tx_max=' + pathb + ':tx:MAX',
-            'DEF:tx_avg=' + pathb + ':tx:AVERAGE',
-            'CDEF:tx_avg_m=0,tx_avg,-',
-            'CDEF:tx_max_m=0,tx_max,-',
-            'VDEF:rx_total=rx_avg,TOTAL',
-            'VDEF:tx_total=tx_avg,TOTAL',
-            'AREA:rx_avg#CCFFCC',
-            'AREA:tx_avg_m#CCCCFF',
-            'TEXTALIGN:left',
-            'LINE1:rx_avg#00FF00:Incoming',
-            'GPRINT:rx_avg:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:rx_avg:MAX:%5.1lf%s Max,',
-            'GPRINT:rx_avg:LAST:%5.1lf%s Last',
-            'GPRINT:rx_total:(ca. %5.1lf%s Total)',
-            'LINE1:tx_avg_m#0000FF:Outgoing',
-            'GPRINT:tx_avg:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:tx_avg:MAX:%5.1lf%s Max,',
-            'GPRINT:tx_avg:LAST:%5.1lf%s Last',
-            'GPRINT:tx_total:(ca. %5.1lf%s Total)\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        # skip the fetches when the files of all hosts are unchanged
+        mtimes = self.check_sources('fleet', time, imgfile, metric)
+        if mtimes is None:
+            return False
+
+        path = self.derive('fleet', time, metric)
+        if path is None:
+            return None
+
+        return self.draw('fleet', time, imgfile, metric, paths={'fleet': path}, mtimes=mtimes)
 
     def graph_ping(self, time, imgfile, website):
         """
-        @brief      generate memory usage graph
+        @brief      generate ping graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
+        @param      website  ping target
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('ping', time, imgfile, website)
+
+    def graph_ping_heatmap(self, time, imgfile):
         """
-        pathb = self.base_path + self.hostname + "/ping/ping-" + website + ".rrd"
-        if not os.path.isfile(pathb):
-            return
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-v ms',
-            '-l 0',
-            '--title', self.build_title("Ping %s" % website),
-            '--font',self.defaultfont,
-            'DEF:avg=' + pathb + ':value:AVERAGE',
-            'DEF:max=' + pathb + ':value:MAX',
-            'AREA:avg#AAAAFF',
-            'LINE1:avg#0000FF:Ping',
-            'GPRINT:avg:AVERAGE:%3.1lf%s Avg,',
-            'GPRINT:avg:MIN:%3.1lf%s Min,',
-            'GPRINT:avg:MAX:%3.1lf%s Max',
-            'GPRINT:avg:LAST:%3.1lf%s Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        @brief      generate latency heatmap of all ping targets, drawn without
+                    rrdtool; the table of the targets, worst first, is written
+                    next to the image as csv
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file or '-'
+
+        @return     True if drawn, False if up-to-date, None if RRD files are
+                    missing; for imgfile '-' the dictionary returned by
+                    prrdheatmap.draw
+        """
+        if self.cache is not None and imgfile != '-' and self.cache.is_recent(imgfile, time):
+            return False
+
+        heatmap = prrdheatmap(self).draw(time)
+        if heatmap is None:
+            return None
+
+        self.stats.update(rrds=len(self.get_graph_instances('ping')), size=len(heatmap['image']))
+        if imgfile == '-':
+            return heatmap
+
+        self.writer.write(imgfile, heatmap['image'])
+        self.writer.write(os.path.splitext(imgfile)[0] + '.csv', heatmap['table'])
+        return True
+
+    def graph_rollup(self, time, imgfile, graph='df_root'):
+        """
+        @brief      generate a graph from the rollup store, for time windows
+                    longer than the RRD files hold
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+        @param      graph    type of the graph and its instance, e.g. 'load'
+                             or 'df:home'
+
+        @return     True if drawn, False if up-to-date, None if the store
+                    holds no data of the graph
+        """
+        # skip reading the store when it is unchanged
+        mtimes = self.check_sources('rollup', time, imgfile)
+        if mtimes is None:
+            return False
+
+        type, instance = prrdrollup.split_graph(graph)
+        rollup = prrdrollup(self).derive(type, instance, time)
+        if rollup is None:
+            return None
+
+        paths, derived = rollup
+        return self.draw(type, time, imgfile, instance, paths=paths, mtimes=mtimes, derived=derived)
 
     def graph_temperature(self, time, imgfile):
-        # temperature sensors on Raspberry Pi
-        pathb = self.base_path + self.hostname + '/curl-CpuTemp/temperature-CPUTemp_switchpi.rrd'
-        rpi = True
-        if not os.path.isfile(pathb):
-            # temperature sensors on mac mini
-            pathb = self.base_path + self.hostname + '/sensors-coretemp-isa-0000/temperature-temp2.rrd'
-            rpi = False
-            if not os.path.isfile(pathb):
-                return
-
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("CPU Temperature"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '30',
-            '-u', '80' if rpi else '120',
-            '-v Temperature',
-            'DEF:min=' + pathb + ':value:MIN',
-            'DEF:avg=' + pathb + ':value:AVERAGE',
-            'DEF:max=' + pathb + ':value:MAX',
-            'CDEF:minc=min,1000,/' if rpi else 'CDEF:minc=min',
-            'CDEF:avgc=avg,1000,/' if rpi else 'CDEF:avgc=avg',
-            'CDEF:maxc=max,1000,/' if rpi else 'CDEF:maxc=max',
-            'CDEF:ds_red=maxc,70,GT,maxc,UNKN,IF',
-            'CDEF:ds_orange=maxc,50,GT,maxc,70,GT,70,maxc,IF,UNKN,IF',
-            'CDEF:ds_green=maxc,50,GT,50,maxc,IF',
-            'AREA:ds_red#FF4444',
-            'LINE1:ds_red#FF0000',
-            'AREA:ds_orange#FFD044',
-            'LINE1:ds_orange#FFB000',
-            'AREA:ds_green#CCFFCC',
-            'LINE1:ds_green#00FF00',
-            'GPRINT:max:AVERAGE:Temperature   %5.1lf Avg,',
-            'GPRINT:max:MIN:%5.1lf Min,',
-            'GPRINT:max:MAX:%5.1lf Max',
-            'GPRINT:max:LAST:%5.1lf Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        """
+        @brief      generate cpu temperature graph
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('temperature', time, imgfile)
 
     def graph_df_root(self, time, imgfile):
-        pathb = self.base_path + self.hostname + '/df-root'
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Disk space (root)"),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-L', '5',
-            '-v', 'Space',
-            'DEF:free=' + pathb + '/df_complex-free.rrd:value:AVERAGE',
-            'DEF:reserved=' + pathb + '/df_complex-reserved.rrd:value:AVERAGE',
-            'DEF:used=' + pathb + '/df_complex-used.rrd:value:AVERAGE',
-            'CDEF:cdef-used=used,UN,0,used,IF',
-            'CDEF:cdef-reserved=reserved,UN,0,reserved,IF,cdef-used,+',
-            'CDEF:cdef-free=free,UN,0,free,IF,cdef-reserved,+',
-            'AREA:cdef-free#bff7bf',
-            'AREA:cdef-reserved#bfbfff',
-            'AREA:cdef-used#FFCCCC',
-            'LINE1:cdef-free#00FF00:Free',
-            'GPRINT:free:AVERAGE:    %5.1lf%s Avg,',
-            'GPRINT:free:MIN:%5.1lf%s Min,',
-            'GPRINT:free:MAX:%5.1lf%s Max,',
-            "GPRINT:free:LAST:%5.1lf%s Last\\n",
-            'LINE1:cdef-reserved#0000FF:Reserved',
-            'GPRINT:reserved:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:reserved:MIN:%5.1lf%s Min,',
-            'GPRINT:reserved:MAX:%5.1lf%s Max,',
-            "GPRINT:reserved:LAST:%5.1lf%s Last\\n",
-            'LINE1:cdef-used#FF0000:Used    ',
-            'GPRINT:used:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:used:MIN:%5.1lf%s Min,',
-            'GPRINT:used:MAX:%5.1lf%s Max,',
-            "GPRINT:used:LAST:%5.1lf%s Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        """
+        @brief      generate disk space graph of the root partition
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('df_root', time, imgfile)
 
     def graph_df(self, time, imgfile, partition):
-        pathb = self.base_path + self.hostname + '/df-' + partition
-        if not os.path.isfile(pathb + '/df_complex-free.rrd'):
-            return
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '--title', self.build_title("Disk space (%s)" % partition),
-            '--font',self.defaultfont,
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-l', '0',
-            '-L', '5',
-            '-v', 'Space',
-            'DEF:free=' + pathb + '/df_complex-free.rrd:value:AVERAGE',
-            'DEF:reserved=' + pathb + '/df_complex-reserved.rrd:value:AVERAGE',
-            'DEF:used=' + pathb + '/df_complex-used.rrd:value:AVERAGE',
-            'CDEF:cdef-used=used,UN,0,used,IF',
-            'CDEF:cdef-reserved=reserved,UN,0,reserved,IF,cdef-used,+',
-            'CDEF:cdef-free=free,UN,0,free,IF,cdef-reserved,+',
-            'AREA:cdef-free#bff7bf',
-            'AREA:cdef-reserved#bfbfff',
-            'AREA:cdef-used#FFCCCC',
-            'LINE1:cdef-free#00FF00:Free',
-            'GPRINT:free:AVERAGE:    %5.1lf%s Avg,',
-            'GPRINT:free:MIN:%5.1lf%s Min,',
-            'GPRINT:free:MAX:%5.1lf%s Max,',
-            "GPRINT:free:LAST:%5.1lf%s Last\\n",
-            'LINE1:cdef-reserved#0000FF:Reserved',
-            'GPRINT:reserved:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:reserved:MIN:%5.1lf%s Min,',
-            'GPRINT:reserved:MAX:%5.1lf%s Max,',
-            "GPRINT:reserved:LAST:%5.1lf%s Last\\n",
-            'LINE1:cdef-used#FF0000:Used    ',
-            'GPRINT:used:AVERAGE:%5.1lf%s Avg,',
-            'GPRINT:used:MIN:%5.1lf%s Min,',
-            'GPRINT:used:MAX:%5.1lf%s Max,',
-            "GPRINT:used:LAST:%5.1lf%s Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        """
+        @brief      generate disk space graph
+
+        @param      self       The object
+        @param      time       number of seconds in the past
+        @param      imgfile    url to image file
+        @param      partition  name of the partition
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('df', time, imgfile, partition)
 
     def graph_ssh_invalid_user(self, time, imgfile):
         """
-        @brief      generate memory usage graph
+        @brief      generate invalid ssh login graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/tail-auth/counter-sshd-invalid_user.rrd"
-        if not os.path.isfile(pathb):
-            return
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-v attempts',
-            '-l 0',
-            '--title', self.build_title("Invalid SSHD login"),
-            '--font',self.defaultfont,
-            'DEF:avg=' + pathb + ':value:AVERAGE',
-            'DEF:max=' + pathb + ':value:MAX',
-            'AREA:avg#AAAAFF',
-            'LINE1:avg#0000FF:Invalid logins',
-            'GPRINT:avg:AVERAGE:%3.1lf%s Avg,',
-            'GPRINT:avg:MIN:%3.1lf%s Min,',
-            'GPRINT:avg:MAX:%3.1lf%s Max',
-            'GPRINT:avg:LAST:%3.1lf%s Last\\n',
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        return self.draw('ssh_invalid_user', time, imgfile)
 
     def graph_fail2ban(self, time, imgfile):
         """
-        @brief      generate memory usage graph
+        @brief      generate fail2ban graph
 
-        @param      self  The object
-        @param      time  number of seconds in the past
+        @param      self     The object
+        @param      time     number of seconds in the past
         @param      imgfile  url to image file
 
-        @return     void
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
+        """
+        return self.draw('fail2ban', time, imgfile)
+
+    def graph_prrd_self(self, time, imgfile):
+        """
+        @brief      generate graph of the render runs of prrd itself
+
+        @param      self     The object
+        @param      time     number of seconds in the past
+        @param      imgfile  url to image file
+
+        @return     True if drawn, False if up-to-date, None if RRD files are missing
         """
-        pathb = self.base_path + self.hostname + "/tail-fail2ban/"
-        if not os.path.isdir(pathb):
-            return
-        rrdtool.graph(imgfile,
-            '--imgformat', 'PNG',
-            '--width', str(self.width),
-            '--height', str(self.height),
-            '--start', 'end - ' + str(time),
-            '--end', 'now',
-            '-c', 'ARROW#000000',
-            '-Y',
-            '-r',
-            '-v Items',
-            '-l 0',
-            '--title', self.build_title("Fail2ban"),
-            '--font',self.defaultfont,
-            'DEF:ban=' + pathb + 'counter-fail2ban-ban.rrd:value:AVERAGE',
-            'DEF:unban=' + pathb + 'counter-fail2ban-unban.rrd:value:AVERAGE',
-            'LINE1:ban#FF0000:Ban     ',
-            'GPRINT:ban:AVERAGE:%3.1lf%s Avg,',
-            'GPRINT:ban:MIN:%3.1lf%s Min,',
-            'GPRINT:ban:MAX:%3.1lf%s Max',
-                "GPRINT:ban:LAST:%3.1lf%s Last\\n",
-            'LINE1:unban#00CC00:Unban   ',
-            'GPRINT:unban:AVERAGE:%3.1lf%s Avg,',
-            'GPRINT:unban:MIN:%3.1lf%s Min,',
-            'GPRINT:unban:MAX:%3.1lf%s Max',
-            "GPRINT:unban:LAST:%3.1lf%s Last\\n",
-            "COMMENT: \\n",
-            "COMMENT:" + self.get_os_name() + "\\r",
-            "COMMENT:" + self.get_time().replace(':','\:') + "\\r")
+        return self.draw('prrd_self', time, imgfile)
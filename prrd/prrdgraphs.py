@@ -0,0 +1,275 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+from prrd.prrdspec import prrdspec
+
+#
+# Specifications of the graphs drawn by prrdbase, keyed on graph type
+#
+
+ARROW = ['-c', 'ARROW#000000', '-Y', '-r']
+
+def load_spec():
+    spec = prrdspec('Load averages', [('load', 'load/load.rrd')])
+    spec.define('st', 'load', 'shortterm')
+    spec.define('stmaxl', 'load', 'shortterm', 'MAX')
+    spec.define('mt', 'load', 'midterm')
+    spec.define('lt', 'load', 'longterm')
+    for v in ['st', 'mt', 'lt']:
+        for name, rpn in [('last', 'LAST'), ('min', 'MINIMUM'), ('max', 'MAXIMUM'), ('avg', 'AVERAGE')]:
+            spec.var(v + name, v + ',' + rpn)
+    spec.comment("            Now      Min     Max     Avg\\n")
+    spec.area('stmaxl', '#AAFFAA')
+    for v, colour, label in [('st', '#FF0000', '1 min '), ('mt', '#00FF00', '5 min '), ('lt', '#0000FF', '15 min')]:
+        spec.line(v, colour, label)
+        spec.gprint(v + 'last', '%6.2lf')
+        spec.gprint(v + 'min', '%6.2lf')
+        spec.gprint(v + 'max', '%6.2lf')
+        spec.gprint(v + 'avg', '%6.2lf\\n')
+    return spec
+
+# cpu states from the bottom to the top of the stack with their area and line colours
+CPU_STATES = [
+    ('steal', '#bfbfbf', '#000000'),
+    ('interrupt', '#e7bfe7', '#a000a0'),
+    ('softirq', '#ffbfff', '#ff00ff'),
+    ('system', '#ffbfbf', '#ff0000'),
+    ('wait', '#ffebbf', '#ffb000'),
+    ('user', '#bfbfff', '#0000ff'),
+    ('nice', '#bff7bf', '#00e000'),
+    ('idle', '#f1f1f1', '#c8c8c8'),
+]
+
+def cpu_spec(title, rrds):
+    """
+    Stacked cpu states, either from one RRD file per state as written by
+    collectd or from a single RRD file with one data source per state
+    """
+    spec = prrdspec(title, rrds, ARROW[:2] + ['-Y', '-u', '100', '-r', '-l', '0', '-L', '5', '-v', 'Jiffies [-]'])
+    for state, _, _ in reversed(CPU_STATES):
+        if len(rrds) == 1:
+            spec.define(state, rrds[0][0], state)
+        else:
+            spec.define(state, state)
+    spec.stack([s for s, _, _ in CPU_STATES])
+    for state, colour, _ in reversed(CPU_STATES):
+        spec.area('cdef-' + state, colour)
+    for state, _, colour in reversed(CPU_STATES):
+        spec.line('cdef-' + state, colour, state)
+        spec.legend(state, '%5.1lf', ' ' * (9 - len(state)))
+    return spec
+
+def memory_spec():
+    spec = prrdspec('Memory', [(s, 'memory/memory-%s.rrd' % s) for s in ['buffered', 'cached', 'free', 'used']],
+                    ARROW + ['-l', '0', '-L', '5', '-v', 'Memory [bytes]'])
+    spec.define('mem_buf', 'buffered')
+    spec.define('mem_cached', 'cached')
+    spec.define('mem_free', 'free')
+    spec.define('mem_used', 'used')
+    spec.stack(['mem_buf', 'mem_cached', 'mem_free'], '%s_add', below='mem_used')
+    spec.raw('TEXTALIGN:left')
+    spec.area('mem_free_add', '#CCFFCC')
+    spec.area('mem_cached_add', '#CCCCFF')
+    spec.area('mem_buf_add', '#f3dfb7')
+    spec.area('mem_used', '#FFCCCC')
+    spec.line('mem_free_add', '#00FF00', 'Free')
+    spec.legend('mem_free', '%5.1lf%s', '        ')
+    spec.line('mem_cached_add', '#0000FF', 'Page cache')
+    spec.legend('mem_cached', '%5.1lf%s', '  ', last='Last')
+    spec.line('mem_buf_add', '#f0a000', 'Buffer cache')
+    spec.legend('mem_buf', '%5.1lf%s')
+    spec.line('mem_used', '#FF0000', 'Used')
+    spec.legend('mem_used', '%5.1lf%s', '        ')
+    return spec
+
+def internet_spec(title='Interface {instance}', path='interface-{instance}/if_octets.rrd'):
+    spec = prrdspec(title, [('octets', path)],
+                    ARROW + ['-v', 'Bytes/s'])
+    spec.define('rx_max', 'octets', 'rx', 'MAX')
+    spec.define('rx_avg', 'octets', 'rx', 'AVERAGE')
+    spec.define('tx_max', 'octets', 'tx', 'MAX')
+    spec.define('tx_avg', 'octets', 'tx', 'AVERAGE')
+    spec.calc('tx_avg_m', '0,tx_avg,-')
+    spec.calc('tx_max_m', '0,tx_max,-')
+    spec.var('rx_total', 'rx_avg,TOTAL')
+    spec.var('tx_total', 'tx_avg,TOTAL')
+    spec.area('rx_avg', '#CCFFCC')
+    spec.area('tx_avg_m', '#CCCCFF')
+    spec.raw('TEXTALIGN:left')
+    for v, line, colour, label, end in [('rx', 'rx_avg', '#00FF00', 'Incoming', ''),
+                                        ('tx', 'tx_avg_m', '#0000FF', 'Outgoing', '\\n')]:
+        spec.line(line, colour, label)
+        spec.gprint(v + '_avg', '%5.1lf%s Avg,', 'AVERAGE')
+        spec.gprint(v + '_avg', '%5.1lf%s Max,', 'MAX')
+        spec.gprint(v + '_avg', '%5.1lf%s Last', 'LAST')
+        spec.gprint(v + '_total', '(ca. %5.1lf%s Total)' + end)
+    return spec
+
+def counter_spec(title, rrd, vlabel, label):
+    spec = prrdspec(title, [('value', rrd)], ARROW + ['-v', vlabel, '-l', '0'])
+    spec.define('avg', 'value', 'value', 'AVERAGE')
+    spec.define('max', 'value', 'value', 'MAX')
+    spec.area('avg', '#AAAAFF')
+    spec.line('avg', '#0000FF', label)
+    spec.legend('avg', '%3.1lf%s', max='Max')
+    return spec
+
+def fail2ban_spec():
+    spec = prrdspec('Fail2ban', [(s, 'tail-fail2ban/counter-fail2ban-%s.rrd' % s) for s in ['ban', 'unban']],
+                    ARROW + ['-v', 'Items', '-l', '0'])
+    spec.define('ban', 'ban')
+    spec.define('unban', 'unban')
+    spec.line('ban', '#FF0000', 'Ban     ')
+    spec.legend('ban', '%3.1lf%s', max='Max')
+    spec.line('unban', '#00CC00', 'Unban   ')
+    spec.legend('unban', '%3.1lf%s', max='Max')
+    return spec
+
+def threshold_spec(title, rrd, lower, upper, warn, alarm, vlabel, label, scale=None):
+    """
+    Graph of a single value coloured green, orange and red by thresholds
+
+    scale       divisor of the values, e.g. 1000 for millidegrees
+    """
+    spec = prrdspec(title, [('value', rrd)],
+                    ARROW + ['-l', str(lower), '-u', str(upper), '-v', vlabel])
+    spec.define('min', 'value', 'value', 'MIN')
+    spec.define('avg', 'value', 'value', 'AVERAGE')
+    spec.define('max', 'value', 'value', 'MAX')
+    v = 'max'
+    if scale:
+        spec.calc('maxc', 'max,%i,/' % scale)
+        v = 'maxc'
+    spec.calc('ds_red', '%s,%i,GT,%s,UNKN,IF' % (v, alarm, v))
+    spec.calc('ds_orange', '%s,%i,GT,%s,%i,GT,%i,%s,IF,UNKN,IF' % (v, warn, v, alarm, alarm, v))
+    spec.calc('ds_green', '%s,%i,GT,%i,%s,IF' % (v, warn, warn, v))
+    for name, area, line in [('ds_red', '#FF4444', '#FF0000'), ('ds_orange', '#FFD044', '#FFB000'),
+                             ('ds_green', '#CCFFCC', '#00FF00')]:
+        spec.area(name, area)
+        spec.line(name, line)
+    spec.legend('max', '%5.1lf', label + '   ', max='Max')
+    return spec
+
+def df_spec(title, partition):
+    spec = prrdspec(title, [(s, 'df-%s/df_complex-%s.rrd' % (partition, s)) for s in ['free', 'reserved', 'used']],
+                    ARROW + ['-l', '0', '-L', '5', '-v', 'Space'])
+    spec.define('free', 'free')
+    spec.define('reserved', 'reserved')
+    spec.define('used', 'used')
+    spec.stack(['used', 'reserved', 'free'])
+    spec.area('cdef-free', '#bff7bf')
+    spec.area('cdef-reserved', '#bfbfff')
+    spec.area('cdef-used', '#FFCCCC')
+    spec.line('cdef-free', '#00FF00', 'Free')
+    spec.legend('free', '%5.1lf%s', '    ')
+    spec.line('cdef-reserved', '#0000FF', 'Reserved')
+    spec.legend('reserved', '%5.1lf%s')
+    spec.line('cdef-used', '#FF0000', 'Used    ')
+    spec.legend('used', '%5.1lf%s')
+    return spec
+
+def prrd_self_spec():
+    """
+    Statistics of the render runs of prrd itself, as recorded by prrdself
+    """
+    spec = prrdspec('Render runs', [(key, 'prrd/%s.rrd' % name) for name, key in
+                                    [('duration-run', 'duration'), ('count-drawn', 'drawn'),
+                                     ('count-cached', 'cached'), ('count-skipped', 'skipped'),
+                                     ('count-failed', 'failed'), ('memory-peak_rss', 'rss')]],
+                    ARROW + ['-l', '0', '-v', 'Seconds / graphs'])
+    for key in ['duration', 'drawn', 'cached', 'skipped', 'failed', 'rss']:
+        spec.define(key, key)
+    spec.area('duration', '#CCCCFF')
+    spec.line('duration', '#0000FF', 'Run time')
+    spec.legend('duration', '%5.1lf%s', ' ')
+    for key, colour, label in [('drawn', '#00CC00', 'Drawn   '), ('cached', '#888888', 'Cached  '),
+                               ('skipped', '#FFB000', 'Skipped '), ('failed', '#FF0000', 'Failed  ')]:
+        spec.line(key, colour, label)
+        spec.legend(key, '%5.0lf', ' ')
+    spec.gprint('rss', 'Peak RSS %5.1lf%s', 'MAX')
+    spec.gprint('rss', '(%5.1lf%s Last)\\n', 'LAST')
+    return spec
+
+def fleet_spec():
+    # percentiles across hosts, computed by prrdpercentiles, drawn like the load
+    spec = prrdspec('{instance}', [('fleet', '{instance}')])
+    spec.define('p50', 'fleet', 'p50')
+    spec.define('p95', 'fleet', 'p95')
+    spec.define('max', 'fleet', 'max')
+    for v in ['p50', 'p95', 'max']:
+        for name, rpn in [('last', 'LAST'), ('min', 'MINIMUM'), ('max', 'MAXIMUM'), ('avg', 'AVERAGE')]:
+            spec.var(v + name, v + ',' + rpn)
+    spec.comment("            Now       Min      Max      Avg\\n")
+    spec.area('max', '#AAFFAA')
+    for v, colour, label in [('p50', '#FF0000', 'p50   '), ('p95', '#00FF00', 'p95   '), ('max', '#0000FF', 'max   ')]:
+        spec.line(v, colour, label)
+        spec.gprint(v + 'last', '%6.2lf%s')
+        spec.gprint(v + 'min', '%6.2lf%s')
+        spec.gprint(v + 'max', '%6.2lf%s')
+        spec.gprint(v + 'avg', '%6.2lf%s\\n')
+    return spec
+
+# data sources compared across hosts by the fleet graph: RRD file relative to
+# the host directory, data source and title; ping takes the target as
+# instance, e.g. 'ping-example.com'
+FLEET_METRICS = {
+    'load': ('load/load.rrd', 'shortterm', 'Load (1 min)'),
+    'memory': ('memory/memory-used.rrd', 'value', 'Memory used'),
+    'df_root': ('df-root/df_complex-used.rrd', 'value', 'Disk space used (root)'),
+    'ping': ('ping/ping-{target}.rrd', 'value', 'Ping {target}'),
+}
+
+GPU = 'cuda-00000000:{instance:02d}:00.0/'
+
+SPECS = {
+    'load': load_spec(),
+    'cpu': cpu_spec('CPU {instance} Utilization', [(s, 'cpu-{instance}/cpu-%s.rrd' % s) for s, _, _ in CPU_STATES]),
+    # all cores combined into one RRD file by prrdbase.aggregate_cpu
+    'cpu_all': cpu_spec('CPU Utilization', [('cpu', '{instance}')]),
+    'memory': memory_spec(),
+    'internet': internet_spec(),
+    # all interfaces summed into one RRD file by prrdinterfaces.aggregate
+    'internet_all': internet_spec('All interfaces', '{instance}'),
+    'fleet': fleet_spec(),
+    'ping': counter_spec('Ping {instance}', 'ping/ping-{instance}.rrd', 'ms', 'Ping'),
+    'gpu_temperature': threshold_spec('Temperature', GPU + 'temperature-temperature_gpu.rrd',
+                                      30, 80, 50, 70, 'Temperature', 'Temperature'),
+    'gpu_power': threshold_spec('Power Consumption', GPU + 'power-power_draw.rrd',
+                                0, 200, 50, 150, 'Power', 'Power'),
+    'gpu_utilization': threshold_spec('Utilization', GPU + 'percent-utilization_gpu.rrd',
+                                      0, 100, 50, 90, 'Utilization', 'Utilization'),
+    'gpu_fan': threshold_spec('Fan speed', GPU + 'percent-fan_speed.rrd',
+                              0, 100, 50, 90, 'Utilization', 'Utilization'),
+    # temperature sensors on Raspberry Pi (in millidegrees) and mac mini
+    'temperature_rpi': threshold_spec('CPU Temperature', 'curl-CpuTemp/temperature-CPUTemp_switchpi.rrd',
+                                      30, 80, 50, 70, 'Temperature', 'Temperature', scale=1000),
+    'temperature': threshold_spec('CPU Temperature', 'sensors-coretemp-isa-0000/temperature-temp2.rrd',
+                                  30, 120, 50, 70, 'Temperature', 'Temperature'),
+    'df_root': df_spec('Disk space (root)', 'root'),
+    'df': df_spec('Disk space ({instance})', '{instance}'),
+    'ssh_invalid_user': counter_spec('Invalid SSHD login', 'tail-auth/counter-sshd-invalid_user.rrd',
+                                     'attempts', 'Invalid logins'),
+    'fail2ban': fail2ban_spec(),
+    'prrd_self': prrd_self_spec(),
+}
@@ -0,0 +1,347 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+
+import csv
+import io
+import math
+import struct
+import time as systime
+import warnings
+import zlib
+import numpy as np
+import rrdtool
+
+# upper bounds of the latency buckets in milliseconds, from fast to slow
+BUCKETS = [5, 10, 25, 50, 100, 250, 500]
+
+# colour of every bucket and of latencies above the last bound, followed by
+# the colour of unknown values, i.e. lost pings
+COLOURS = ['#1a9850', '#66bd63', '#a6d96a', '#d9ef8b', '#fee08b', '#fdae61', '#f46d43', '#d73027', '#c8c8c8']
+
+# palette of the image: the colours of the buckets, the background and text
+PALETTE = COLOURS + ['#ffffff', '#000000']
+BACKGROUND = len(COLOURS)
+TEXT = len(COLOURS) + 1
+
+# 5x8 pixel glyphs as columns from left to right, the lowest bit at the top;
+# other characters are drawn as '?'
+FONT = {
+    ' ': (0x00, 0x00, 0x00, 0x00, 0x00), '%': (0x23, 0x13, 0x08, 0x64, 0x62),
+    '+': (0x08, 0x08, 0x3e, 0x08, 0x08), '-': (0x08, 0x08, 0x08, 0x08, 0x08),
+    '.': (0x00, 0x60, 0x60, 0x00, 0x00), '/': (0x20, 0x10, 0x08, 0x04, 0x02),
+    '0': (0x3e, 0x51, 0x49, 0x45, 0x3e), '1': (0x00, 0x42, 0x7f, 0x40, 0x00),
+    '2': (0x42, 0x61, 0x51, 0x49, 0x46), '3': (0x21, 0x41, 0x45, 0x4b, 0x31),
+    '4': (0x18, 0x14, 0x12, 0x7f, 0x10), '5': (0x27, 0x45, 0x45, 0x45, 0x39),
+    '6': (0x3c, 0x4a, 0x49, 0x49, 0x30), '7': (0x01, 0x71, 0x09, 0x05, 0x03),
+    '8': (0x36, 0x49, 0x49, 0x49, 0x36), '9': (0x06, 0x49, 0x49, 0x29, 0x1e),
+    ':': (0x00, 0x36, 0x36, 0x00, 0x00), '<': (0x08, 0x14, 0x22, 0x41, 0x00),
+    '=': (0x14, 0x14, 0x14, 0x14, 0x14), '>': (0x00, 0x41, 0x22, 0x14, 0x08),
+    '?': (0x02, 0x01, 0x51, 0x09, 0x06), '_': (0x40, 0x40, 0x40, 0x40, 0x40),
+    '(': (0x00, 0x1c, 0x22, 0x41, 0x00), ')': (0x00, 0x41, 0x22, 0x1c, 0x00),
+    'A': (0x7e, 0x11, 0x11, 0x11, 0x7e), 'B': (0x7f, 0x49, 0x49, 0x49, 0x36),
+    'C': (0x3e, 0x41, 0x41, 0x41, 0x22), 'D': (0x7f, 0x41, 0x41, 0x22, 0x1c),
+    'E': (0x7f, 0x49, 0x49, 0x49, 0x41), 'F': (0x7f, 0x09, 0x09, 0x09, 0x01),
+    'G': (0x3e, 0x41, 0x49, 0x49, 0x7a), 'H': (0x7f, 0x08, 0x08, 0x08, 0x7f),
+    'I': (0x00, 0x41, 0x7f, 0x41, 0x00), 'J': (0x20, 0x40, 0x41, 0x3f, 0x01),
+    'K': (0x7f, 0x08, 0x14, 0x22, 0x41), 'L': (0x7f, 0x40, 0x40, 0x40, 0x40),
+    'M': (0x7f, 0x02, 0x0c, 0x02, 0x7f), 'N': (0x7f, 0x04, 0x08, 0x10, 0x7f),
+    'O': (0x3e, 0x41, 0x41, 0x41, 0x3e), 'P': (0x7f, 0x09, 0x09, 0x09, 0x06),
+    'Q': (0x3e, 0x41, 0x51, 0x21, 0x5e), 'R': (0x7f, 0x09, 0x19, 0x29, 0x46),
+    'S': (0x46, 0x49, 0x49, 0x49, 0x31), 'T': (0x01, 0x01, 0x7f, 0x01, 0x01),
+    'U': (0x3f, 0x40, 0x40, 0x40, 0x3f), 'V': (0x1f, 0x20, 0x40, 0x20, 0x1f),
+    'W': (0x3f, 0x40, 0x38, 0x40, 0x3f), 'X': (0x63, 0x14, 0x08, 0x14, 0x63),
+    'Y': (0x07, 0x08, 0x70, 0x08, 0x07), 'Z': (0x61, 0x51, 0x49, 0x45, 0x43),
+    'a': (0x20, 0x54, 0x54, 0x54, 0x78), 'b': (0x7f, 0x48, 0x44, 0x44, 0x38),
+    'c': (0x38, 0x44, 0x44, 0x44, 0x20), 'd': (0x38, 0x44, 0x44, 0x48, 0x7f),
+    'e': (0x38, 0x54, 0x54, 0x54, 0x18), 'f': (0x08, 0x7e, 0x09, 0x01, 0x02),
+    'g': (0x18, 0xa4, 0xa4, 0xa4, 0x7c), 'h': (0x7f, 0x08, 0x04, 0x04, 0x78),
+    'i': (0x00, 0x44, 0x7d, 0x40, 0x00), 'j': (0x40, 0x80, 0x84, 0x7d, 0x00),
+    'k': (0x7f, 0x10, 0x28, 0x44, 0x00), 'l': (0x00, 0x41, 0x7f, 0x40, 0x00),
+    'm': (0x7c, 0x04, 0x18, 0x04, 0x78), 'n': (0x7c, 0x08, 0x04, 0x04, 0x78),
+    'o': (0x38, 0x44, 0x44, 0x44, 0x38), 'p': (0xfc, 0x24, 0x24, 0x24, 0x18),
+    'q': (0x18, 0x24, 0x24, 0x24, 0xfc), 'r': (0x7c, 0x08, 0x04, 0x04, 0x08),
+    's': (0x48, 0x54, 0x54, 0x54, 0x20), 't': (0x04, 0x3f, 0x44, 0x40, 0x20),
+    'u': (0x3c, 0x40, 0x40, 0x20, 0x7c), 'v': (0x1c, 0x20, 0x40, 0x20, 0x1c),
+    'w': (0x3c, 0x40, 0x30, 0x40, 0x3c), 'x': (0x44, 0x28, 0x10, 0x28, 0x44),
+    'y': (0x1c, 0xa0, 0xa0, 0xa0, 0x7c), 'z': (0x44, 0x64, 0x54, 0x4c, 0x44),
+}
+
+# pixels per character and per line of text
+ADVANCE = 6
+LINE = 11
+# characters of the row labels, longer target names are cut
+LABEL = 20
+# seconds between the ticks of the time axis, the first that leaves room for
+# the labels is used
+TICKS = [60, 300, 600, 1800, 3600, 7200, 10800, 21600, 43200, 86400, 172800, 604800, 2592000]
+
+def png_chunk(kind, data):
+    """
+    Encode a png chunk
+
+    kind        chunk type, e.g. b'IDAT'
+    data        chunk data
+
+    @return chunk as bytes
+    """
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def draw_text(canvas, x, y, text, colour=TEXT):
+    """
+    Draw a line of text into an image, cut at its edges
+
+    canvas      rows x columns array of palette indices, drawn into
+    x           column of the left edge of the text
+    y           row of the top edge of the text
+    text        the text
+    colour      palette index
+
+    @return void
+    """
+    height, width = canvas.shape
+    for i, char in enumerate(text):
+        for j, column in enumerate(FONT.get(char, FONT['?'])):
+            col = x + i * ADVANCE + j
+            for bit in range(8):
+                if column >> bit & 1 and 0 <= col < width and 0 <= y + bit < height:
+                    canvas[y + bit, col] = colour
+
+def get_ticks(time, columns, end):
+    """
+    Get the ticks of a time axis at round local times
+
+    time        number of seconds in the past
+    columns     number of pixel columns
+    end         time of the right edge in seconds since the epoch
+
+    @return list of (column, label) tuples
+    """
+    step = next((t for t in TICKS if time / t * 8 * ADVANCE <= columns), TICKS[-1])
+    fmt = '%H:%M' if step < 86400 else '%m-%d'
+    offset = systime.localtime(end).tm_gmtoff
+    start = end - time
+    first = math.ceil((start + offset) / step) * step - offset
+    return [(int((t - start) * columns / time), systime.strftime(fmt, systime.localtime(t)))
+            for t in range(first, end, step)]
+
+def write_png(indices, palette):
+    """
+    Encode an image of palette colours as png without rrdtool
+
+    indices     rows x columns array of indices into the palette
+    palette     list of colours as #RRGGBB
+
+    @return png as bytes
+    """
+    height, width = indices.shape
+    # every row starts with filter type 0, i.e. no filter
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), indices.astype(np.uint8)])
+    return b'\x89PNG\r\n\x1a\n' + \
+        png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)) + \
+        png_chunk(b'PLTE', b''.join(bytes.fromhex(c[1:]) for c in palette)) + \
+        png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 9)) + \
+        png_chunk(b'IEND', b'')
+
+##
+## @brief      Heatmap of the latency of all ping targets of a host: one row
+##             per target, one column per pixel of the time window and the
+##             colour of the latency bucket of every point.
+##
+## The ping RRD files are read by rrdtool xport calls of up to 'batch' files
+## each into a single targets x time array, and the image is drawn in-process,
+## so the cost does not grow with one rrdtool graph per target. The image has
+## a title, the names of the targets next to their rows, a time axis and a
+## colour scale. The targets are sorted worst first by their 'rank' statistic
+## (avg, p95 or max), and a table of the targets in the same order holds
+## their statistics. All
+## keys are read from a 'heatmap' block inside the 'settings' block, 'buckets'
+## replaces the default latency bounds.
+##
+class prrdheatmap:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      base  prrdbase object of the host
+        """
+        self.base = base
+        config = base.settings['settings'].get('heatmap', {})
+        self.buckets = config.get('buckets', BUCKETS)
+        self.rank_by = config.get('rank', 'p95')
+        self.batch = config.get('batch', 64)
+        if self.rank_by not in ('avg', 'p95', 'max'):
+            raise ValueError('Unknown heatmap ranking: %s' % self.rank_by)
+        if len(self.buckets) != len(COLOURS) - 2:
+            raise ValueError('The heatmap takes %i latency buckets' % (len(COLOURS) - 2))
+
+    def get_targets(self):
+        """
+        @brief      List the ping targets of the host
+
+        @param      self  The object
+
+        @return     sorted list of ping targets
+        """
+        return self.base.get_index().get_type_instances('ping', None, 'ping')
+
+    def fetch(self, time):
+        """
+        @brief      Fetch the latency of all targets in batches
+
+        @param      self  The object
+        @param      time  number of seconds in the past
+
+        @return     tuple of the targets and a targets x columns array of
+                    milliseconds, NaN for unknown values; None if there are
+                    no targets
+        """
+        targets = self.get_targets()
+        if not targets:
+            return None
+
+        index = self.base.get_index()
+        width = self.base.width
+        columns = []
+        for i in range(0, len(targets), self.batch):
+            args = ['--start', 'end - %i' % time, '--end', 'now',
+                    '--step', str(max(1, time // width)), '--maxrows', str(width)]
+            if self.base.daemon:
+                args += ['--daemon', self.base.daemon]
+            batch = targets[i:i + self.batch]
+            for j, target in enumerate(batch):
+                path = index.find('ping', None, 'ping', target).replace(':', '\\:')
+                args += ['DEF:v%i=%s:value:AVERAGE' % (j, path), 'XPORT:v%i' % j]
+            data = rrdtool.xport(*args)
+            columns.append(np.array(data['data'], dtype=float).reshape(len(data['data']), len(batch)))
+
+        rows = min(len(c) for c in columns)
+        return targets, np.concatenate([c[:rows] for c in columns], axis=1).T
+
+    @staticmethod
+    def get_stats(values):
+        """
+        @brief      Compute the statistics of every target
+
+        @param      values  targets x columns array of milliseconds
+
+        @return     dictionary mapping 'avg', 'p95', 'max' and 'lost' to
+                    arrays with one value per target; lost is the fraction of
+                    unknown values
+        """
+        # targets that never answered have no statistics
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return {'avg': np.nanmean(values, axis=1),
+                    'p95': np.nanpercentile(values, 95, axis=1),
+                    'max': np.nanmax(values, axis=1),
+                    'lost': np.isnan(values).mean(axis=1) if values.shape[1] else np.zeros(len(values))}
+
+    def draw(self, time):
+        """
+        @brief      Draw the heatmap and its table of targets, worst first
+
+        @param      self  The object
+        @param      time  number of seconds in the past
+
+        @return     dictionary holding the png under 'image', the table as
+                    csv under 'table' and the 'graph_width' and
+                    'graph_height'; None if there are no ping targets
+        """
+        data = self.fetch(time)
+        if data is None:
+            return None
+
+        targets, values = data
+        stats = self.get_stats(values)
+        # the most lost pings first, then the slowest
+        order = np.lexsort((-np.nan_to_num(stats[self.rank_by], nan=np.inf), -stats['lost']))
+
+        indices = np.digitize(values[order], self.buckets, right=True)
+        indices[np.isnan(values[order])] = len(COLOURS) - 1
+        height = max(1, self.base.height // len(targets))
+        image = self.compose(np.repeat(indices, height, axis=0), [targets[i] for i in order], height, time)
+
+        table = io.StringIO()
+        writer = csv.writer(table, lineterminator='\n')
+        writer.writerow(['rank', 'target', 'avg', 'p95', 'max', 'lost'])
+        for rank, i in enumerate(order, 1):
+            writer.writerow([rank, targets[i]] + ['' if np.isnan(stats[k][i]) else '%.4g' % stats[k][i]
+                                                  for k in ('avg', 'p95', 'max', 'lost')])
+
+        return {'image': image['image'], 'table': table.getvalue().encode('utf-8'),
+                'graph_left': image['graph_left'], 'graph_top': image['graph_top'],
+                'graph_width': indices.shape[1], 'graph_height': height * len(targets),
+                'image_width': image['image_width'], 'image_height': image['image_height']}
+
+    def compose(self, indices, targets, height, time):
+        """
+        @brief      Draw the heatmap into an image with the title above it, the
+                    targets to the left of their rows, the time axis below it
+                    and a colour scale of the latency buckets at the bottom
+
+        @param      self     The object
+        @param      indices  rows x columns array of indices into COLOURS
+        @param      targets  targets from the top to the bottom row
+        @param      height   number of pixel rows per target
+        @param      time     number of seconds in the past
+
+        @return     dictionary holding the png under 'image', the position
+                    of the heatmap in the image as 'graph_left' and
+                    'graph_top' and the 'image_width' and 'image_height'
+        """
+        rows, columns = indices.shape
+        labels = [t[:LABEL] for t in targets]
+        left = 4 + ADVANCE * max(len(l) for l in labels) + 4
+        top = 4 + LINE + 4
+        # the right margin leaves room for half a tick label
+        canvas = np.full((top + rows + 4 + LINE + 4 + LINE + 4, left + columns + 3 * ADVANCE), BACKGROUND,
+                         dtype=np.uint8)
+
+        draw_text(canvas, left, 4, self.base.build_title('Ping latency'))
+        canvas[top:top + rows, left:left + columns] = indices
+
+        # rows lower than a line of text are labelled only every few rows
+        every = math.ceil(LINE / height)
+        for i in range(0, len(labels), every):
+            draw_text(canvas, 4, top + i * height + (height - 8) // 2, labels[i])
+
+        axis = top + rows
+        canvas[axis, left:left + columns] = TEXT
+        for x, label in get_ticks(time, columns, int(systime.time())):
+            canvas[axis:axis + 3, left + x] = TEXT
+            draw_text(canvas, left + x - len(label) * ADVANCE // 2, axis + 4, label)
+
+        # colour scale: the upper bound of every bucket in milliseconds
+        names = ['<=%g' % b for b in self.buckets] + ['>%g ms' % self.buckets[-1], 'lost']
+        x, y = left, axis + 4 + LINE + 4
+        for colour, name in enumerate(names):
+            canvas[y:y + 8, x:x + 8] = colour
+            draw_text(canvas, x + 10, y, name)
+            x += 10 + ADVANCE * len(name) + 6
+
+        return {'image': write_png(canvas, PALETTE), 'graph_left': left, 'graph_top': top,
+                'image_width': canvas.shape[1], 'image_height': canvas.shape[0]}
@@ -0,0 +1,93 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import socket       # hostname
+import time
+from datetime import datetime
+
+##
+## @brief      Metadata of the host the graphs are drawn for. Every value is
+##             looked up on first use and kept for the lifetime of the object.
+##
+class prrdhost:
+
+    def __init__(self, hostname=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self      The object
+        @param      hostname  name of the host; resolved with getfqdn() on
+                              first use when omitted
+        """
+        self.hostname = hostname
+        self.os_name = None
+        self.stamp = None
+        self.footer = None
+
+    def get_hostname(self):
+        """
+        Get the fully qualified name of the host
+
+        @return hostname
+        """
+        if self.hostname is None:
+            self.hostname = socket.getfqdn()
+
+        return self.hostname
+
+    def get_os_name(self):
+        """
+        Gets the operating system name.
+
+        @return get the operating system name
+        """
+        if self.os_name is None:
+            self.os_name = "Unknown"
+            try:
+                with open("/etc/os-release") as f:
+                    for line in f:
+                        k, _, v = line.rstrip().partition("=")
+                        if k == 'PRETTY_NAME':
+                            self.os_name = v.strip('"')
+            except OSError:
+                pass
+
+        return self.os_name
+
+    def get_footer(self):
+        """
+        Get the footer printed below every graph: the operating system name
+        and the current time. The footer is only rebuilt when the second
+        changes.
+
+        @return tuple of rrdtool COMMENT arguments
+        """
+        stamp = int(time.time())
+        if stamp != self.stamp:
+            now = datetime.fromtimestamp(stamp).strftime("%Y-%m-%d %H:%M:%S")
+            self.footer = ("COMMENT:" + self.get_os_name() + "\\r",
+                           "COMMENT:" + now.replace(':', '\\:') + "\\r")
+            self.stamp = stamp
+
+        return self.footer
@@ -0,0 +1,219 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import os
+import re
+import rrdtool
+
+##
+## @brief      Index of the RRD files of a single host, built by one walk of
+##             the collectd tree.
+##
+## collectd stores its data as <plugin>[-<plugin instance>]/<type>[-<type
+## instance>].rrd below the host directory. The index maps these names to the
+## RRD files so that graph generation never has to touch the filesystem to
+## find out what is there.
+##
+class prrdindex:
+
+    def __init__(self, root):
+        """
+        @brief      Constructs the object and scans the tree.
+
+        @param      self  The object
+        @param      root  host directory of the collectd tree
+        """
+        self.root = os.path.normpath(root)
+        self.files = {}
+        self.plugins = {}
+        self.sources = {}
+        self.rras = {}
+        self.mtimes = {}
+        self.scan()
+
+    @staticmethod
+    def split(name):
+        """
+        @brief      Split a collectd name into its name and instance
+
+        @param      name  e.g. 'interface-eth0' or 'load'
+
+        @return     tuple of name and instance, instance is None if absent
+        """
+        if '-' in name:
+            return tuple(name.split('-', 1))
+        return name, None
+
+    def scan(self):
+        """
+        @brief      Walk the host directory and (re)build the index
+
+        @param      self  The object
+
+        @return     void
+        """
+        self.files = {}
+        self.plugins = {}
+        self.mtimes = {}
+        if not os.path.isdir(self.root):
+            return
+
+        with os.scandir(self.root) as plugindirs:
+            for plugindir in plugindirs:
+                if not plugindir.is_dir():
+                    continue
+                plugin, pinstance = self.split(plugindir.name)
+                with os.scandir(plugindir.path) as rrdfiles:
+                    for rrdfile in rrdfiles:
+                        if not rrdfile.name.endswith('.rrd') or not rrdfile.is_file():
+                            continue
+                        type, tinstance = self.split(rrdfile.name[:-4])
+                        path = os.path.join(self.root, plugindir.name, rrdfile.name)
+                        self.files[path] = (plugin, pinstance, type, tinstance)
+                        types = self.plugins.setdefault(plugin, {}).setdefault(pinstance, {})
+                        types.setdefault(type, {})[tinstance] = path
+
+    def exists(self, path):
+        """
+        @brief      Check whether an RRD file is present
+
+        @param      self  The object
+        @param      path  path to RRD file
+
+        @return     True if the file was found during the scan
+        """
+        return os.path.normpath(path) in self.files
+
+    def find(self, plugin, pinstance=None, type=None, tinstance=None):
+        """
+        @brief      Look up the path of an RRD file by its collectd names
+
+        @param      self       The object
+        @param      plugin     plugin name, e.g. 'interface'
+        @param      pinstance  plugin instance, e.g. 'eth0'
+        @param      type       type name, e.g. 'if_octets'
+        @param      tinstance  type instance
+
+        @return     path to RRD file or None
+        """
+        return self.plugins.get(plugin, {}).get(pinstance, {}).get(type, {}).get(tinstance)
+
+    def get_plugin_instances(self, plugin):
+        """
+        @brief      List the instances of a plugin, e.g. all cpu cores or
+                    network interfaces
+
+        @param      self    The object
+        @param      plugin  plugin name
+
+        @return     sorted list of plugin instances
+        """
+        return sorted(i for i in self.plugins.get(plugin, {}) if i is not None)
+
+    def get_type_instances(self, plugin, pinstance, type):
+        """
+        @brief      List the type instances of a plugin, e.g. all ping targets
+
+        @param      self       The object
+        @param      plugin     plugin name
+        @param      pinstance  plugin instance
+        @param      type       type name
+
+        @return     sorted list of type instances
+        """
+        types = self.plugins.get(plugin, {}).get(pinstance, {})
+        return sorted(i for i in types.get(type, {}) if i is not None)
+
+    def read_info(self, path):
+        """
+        @brief      Read the header of an RRD file once and keep the names of
+                    its data sources and the layout of its archives
+
+        @param      self  The object
+        @param      path  path to RRD file
+
+        @return     void
+        """
+        info = rrdtool.info(path)
+        names = set()
+        rras = {}
+        for key, value in info.items():
+            m = re.match(r'ds\[(.+)\]\.', key)
+            if m:
+                names.add(m.group(1))
+            m = re.match(r'rra\[(\d+)\]\.(cf|pdp_per_row|rows)$', key)
+            if m:
+                rras.setdefault(int(m.group(1)), {})[m.group(2)] = value
+        self.sources[path] = sorted(names)
+        self.rras[path] = [(rra['cf'], info['step'] * rra['pdp_per_row'], rra['rows'])
+                           for _, rra in sorted(rras.items()) if len(rra) == 3]
+
+    def get_data_sources(self, path):
+        """
+        @brief      Get the names of the data sources of an RRD file; the file
+                    header is only read on first use
+
+        @param      self  The object
+        @param      path  path to RRD file
+
+        @return     list of data source names
+        """
+        if path not in self.sources:
+            self.read_info(path)
+
+        return self.sources[path]
+
+    def get_rras(self, path):
+        """
+        @brief      Get the archives of an RRD file; the file header is only
+                    read on first use
+
+        @param      self  The object
+        @param      path  path to RRD file
+
+        @return     list of (consolidation function, seconds per row, number
+                    of rows) tuples
+        """
+        if path not in self.rras:
+            self.read_info(path)
+
+        return self.rras[path]
+
+    def get_mtime(self, path):
+        """
+        @brief      Get the modification time of an RRD file; every file is
+                    only looked up once per scan
+
+        @param      self  The object
+        @param      path  path to RRD file
+
+        @return     modification time or None if the file is missing
+        """
+        if path not in self.mtimes:
+            try:
+                self.mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                self.mtimes[path] = None
+
+        return self.mtimes[path]
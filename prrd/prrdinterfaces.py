@@ -0,0 +1,156 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+
+import fnmatch
+import os
+import numpy as np
+import rrdtool
+
+from prrd import prrddata
+
+##
+## @brief      Network interfaces of a host with many (virtual) interfaces,
+##             e.g. the veth and docker interfaces of a container host.
+##
+## The if_octets files of all interfaces are read with a few rrdtool xport
+## calls of up to 'batch' files each, instead of one call per file. The
+## interfaces are ranked by their 'total' or 'peak' traffic in the 'window'
+## of the ranking, so that only the 'top' interfaces get a graph of their own,
+## and all interfaces are summed into one RRD file for a combined graph.
+## Interfaces matching a pattern of 'exclude' are left out of both. All keys
+## are read from an 'interfaces' block inside the 'settings' block.
+##
+class prrdinterfaces:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      base  prrdbase object of the host
+        """
+        self.base = base
+        config = base.settings['settings'].get('interfaces', {})
+        self.top = config.get('top', 10)
+        self.rank_by = config.get('rank', 'total')
+        self.window = base.get_window(config.get('window', 'day'))
+        self.exclude = config.get('exclude', ['lo'])
+        self.batch = config.get('batch', 64)
+        if self.rank_by not in ('total', 'peak'):
+            raise ValueError('Unknown interface ranking: %s' % self.rank_by)
+
+    def get_names(self):
+        """
+        @brief      List the interfaces that have an if_octets file and are not
+                    excluded
+
+        @param      self  The object
+
+        @return     sorted list of interface names
+        """
+        index = self.base.get_index()
+        return [name for name in index.get_plugin_instances('interface')
+                if index.find('interface', name, 'if_octets') is not None
+                and not any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)]
+
+    def fetch(self, time, width=None):
+        """
+        @brief      Fetch the traffic of all interfaces in batches
+
+        @param      self   The object
+        @param      time   number of seconds in the past
+        @param      width  number of rows to fetch, the graph width by default
+
+        @return     tuple of the time just before the first row, the step, the
+                    interface names and a rows x interfaces x (rx, tx) array
+                    of bytes per second, NaN for unknown values; None if there
+                    are no interfaces
+        """
+        names = self.get_names()
+        if not names:
+            return None
+
+        width = width or self.base.width
+        index = self.base.get_index()
+        start, step, batches = None, None, []
+        for i in range(0, len(names), self.batch):
+            args = ['--start', 'end - %i' % time, '--end', 'now',
+                    '--step', str(max(1, time // width)), '--maxrows', str(width)]
+            if self.base.daemon:
+                args += ['--daemon', self.base.daemon]
+            batch = names[i:i + self.batch]
+            for j, name in enumerate(batch):
+                path = index.find('interface', name, 'if_octets').replace(':', '\\:')
+                args += ['DEF:rx%i=%s:rx:AVERAGE' % (j, path), 'DEF:tx%i=%s:tx:AVERAGE' % (j, path),
+                         'XPORT:rx%i' % j, 'XPORT:tx%i' % j]
+            data = rrdtool.xport(*args)
+            values = np.array(data['data'], dtype=float)
+            start, step = data['meta']['start'], data['meta']['step']
+            batches.append(values.reshape(len(values), len(batch), 2))
+
+        # batches read in the same second line up; guard against a step change
+        rows = min(len(b) for b in batches)
+        return start, step, names, np.concatenate([b[:rows] for b in batches], axis=1)
+
+    def rank(self, time=None, count=None):
+        """
+        @brief      Rank the interfaces by their traffic
+
+        @param      self   The object
+        @param      time   number of seconds in the past, the ranking window
+                           by default
+        @param      count  number of interfaces to return, 'top' by default
+
+        @return     list of the names of the busiest interfaces, busiest first
+        """
+        data = self.fetch(time or self.window)
+        if data is None:
+            return []
+
+        _, step, names, values = data
+        traffic = np.nan_to_num(values).sum(axis=2)
+        score = traffic.sum(axis=0) * step if self.rank_by == 'total' else traffic.max(axis=0, initial=0)
+        order = np.argsort(-score, kind='stable')[:count or self.top]
+        return [names[i] for i in order]
+
+    def aggregate(self, time):
+        """
+        @brief      Sum the traffic of all interfaces into a single RRD file
+                    with an rx and tx data source
+
+        @param      self  The object
+        @param      time  number of seconds in the past
+
+        @return     path to the RRD file or None if there are no interfaces
+        """
+        data = self.fetch(time)
+        if data is None:
+            return None
+
+        start, step, _, values = data
+        path = os.path.join(self.base.workdir, self.base.hostname, 'interface-all-%i.rrd' % time)
+        total = np.stack([prrddata.combine(list(values[:, :, k].T), 'sum') for k in range(2)], axis=1)
+        prrddata.write_rrd(path, start, step, ['rx', 'tx'], total)
+        return path
@@ -0,0 +1,133 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import os
+
+from prrd.prrdinterfaces import prrdinterfaces
+from prrd.prrdrender import prrdjob
+
+##
+## @brief      Expands the 'graphs' manifest of the settings file into a list
+##             of graph jobs.
+##
+## Every manifest entry has a graph 'type' (the name of a prrdbase graph_*
+## method without the prefix), a list of time 'windows' and an 'output'
+## filename pattern. Graphs that take an interface, partition, gpu id or ping
+## target list these under 'instances'; "*" takes every instance found in the
+## collectd tree and "top" the busiest interfaces, see prrdinterfaces. An
+## optional 'priority' of "low" or "normal" decides whether the graphs may be
+## deferred on a busy host, see prrdqueue.
+##
+##     {"type": "internet", "instances": ["eth0"], "windows": ["day", "week"],
+##      "output": "{instance}_{window}.png"}
+##
+class prrdmanifest:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      base  prrdbase object holding the settings
+        """
+        self.base = base
+        self.entries = base.settings.get('graphs', [])
+
+    def get_instances(self, entry):
+        """
+        @brief      Get the instances of a manifest entry
+
+        @param      self   The object
+        @param      entry  manifest entry
+
+        @return     list of instances, [None] for graphs without instances
+        """
+        instances = entry.get('instances')
+        if instances is None:
+            return [None]
+        if instances == 'top':
+            return prrdinterfaces(self.base).rank()
+        if instances != '*':
+            return instances
+
+        return self.base.get_graph_instances(entry['type'])
+
+    def get_priority(self, entry, time):
+        """
+        @brief      Get the priority of the graphs of a manifest entry, unless
+                    set by 'priority' the graphs of windows longer than a week
+                    have low priority
+
+        @param      self   The object
+        @param      entry  manifest entry
+        @param      time   time window in seconds
+
+        @return     'normal' or 'low'
+        """
+        return entry.get('priority', 'low' if time > 86400 * 7 else 'normal')
+
+    def has_rrds(self, type, instance):
+        """
+        @brief      Check whether all RRD files of a graph are present
+
+        @param      self      The object
+        @param      type      type of the graph
+        @param      instance  graph instance or None
+
+        @return     True when all files exist
+        """
+        return all(self.base.rrd_exists(path) for path in self.base.get_graph_rrds(type, instance))
+
+    def expand(self, outdir='.'):
+        """
+        @brief      Expand the manifest into graph jobs
+
+        @param      self    The object
+        @param      outdir  directory to write the images to
+
+        @return     tuple of the list of jobs to run and the list of jobs that
+                    were skipped because their RRD files are missing
+        """
+        jobs = []
+        skipped = []
+        for entry in self.entries:
+            type = 'df_root' if entry['type'] == 'diskspace' else entry['type']
+            method = 'graph_' + type
+            if not hasattr(self.base, method):
+                raise ValueError('Unknown graph type: %s' % entry['type'])
+
+            for instance in self.get_instances(entry):
+                present = self.has_rrds(type, instance)
+                for window in entry['windows']:
+                    imgfile = os.path.join(outdir, entry['output'].format(window=window, instance=instance))
+                    args = [self.base.get_window(window), imgfile]
+                    if instance is not None:
+                        args.append(instance)
+                    job = prrdjob(method, *args, host=self.base.hostname, priority=self.get_priority(entry, args[0]))
+                    if present:
+                        jobs.append(job)
+                    else:
+                        skipped.append(job)
+
+        return jobs, skipped
@@ -0,0 +1,163 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+
+import os
+import time as systime
+import warnings
+import numpy as np
+import rrdtool
+
+from prrd import prrddata
+from prrd.prrdgraphs import FLEET_METRICS
+
+##
+## @brief      Percentiles of a data source across all hosts below the base
+##             path, e.g. the median and 95th percentile of the load of a
+##             fleet of servers.
+##
+## The RRD files of the hosts are read by rrdtool xport calls of up to 'batch'
+## files each. All calls ask for the same start, end and step, so that rrdtool
+## consolidates every host onto a common time grid. The p50, p95 and maximum
+## per row are computed with NumPy and written to a single RRD file in the
+## workdir. All keys are read from a 'fleet' block inside the 'settings'
+## block; its 'hosts' are a list of host names or "*" for every host directory,
+## the default. These are independent of the 'hosts' of the settings block,
+## which draw every graph once per host.
+##
+class prrdpercentiles:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      base  prrdbase object holding the settings
+        """
+        self.base = base
+        config = base.settings['settings'].get('fleet', {})
+        self.batch = config.get('batch', 64)
+        self.hosts = config.get('hosts', '*')
+
+    @staticmethod
+    def get_metric(metric):
+        """
+        @brief      Look up the RRD file, data source and title of a metric
+
+        @param      metric  name of the metric, e.g. 'load' or 'ping-example.com'
+
+        @return     tuple of the path relative to the host directory, the data
+                    source and the title
+        """
+        name, _, target = metric.partition('-')
+        if name not in FLEET_METRICS or bool(target) != (name == 'ping'):
+            raise ValueError('Unknown fleet metric: %s' % metric)
+
+        path, ds, title = FLEET_METRICS[name]
+        return path.format(target=target), ds, title.format(target=target)
+
+    def get_paths(self, metric):
+        """
+        @brief      Find the RRD files of a metric of all hosts
+
+        @param      self    The object
+        @param      metric  name of the metric
+
+        @return     list of paths to RRD files, hosts without the file are
+                    left out
+        """
+        hosts = self.hosts
+        if hosts == '*':
+            if not os.path.isdir(self.base.base_path):
+                return []
+            with os.scandir(self.base.base_path) as entries:
+                hosts = sorted(e.name for e in entries if e.is_dir())
+        elif isinstance(hosts, str):
+            hosts = hosts.split(',')
+
+        rrd = self.get_metric(metric)[0]
+        paths = [os.path.join(self.base.base_path, host, rrd) for host in hosts]
+        return [path for path in paths if os.path.isfile(path)]
+
+    def fetch(self, metric, time, width=None):
+        """
+        @brief      Fetch a metric of all hosts onto a common time grid
+
+        @param      self    The object
+        @param      metric  name of the metric
+        @param      time    number of seconds in the past
+        @param      width   number of rows, the graph width by default
+
+        @return     tuple of the time just before the first row, the step and
+                    a rows x hosts array, NaN for unknown values; None if no
+                    host has the RRD file
+        """
+        paths = self.get_paths(metric)
+        if not paths:
+            return None
+
+        ds = self.get_metric(metric)[1]
+        step = max(1, time // (width or self.base.width))
+        end = int(systime.time()) // step * step
+        head = ['--start', str(end - time), '--end', str(end), '--step', str(step)]
+        if self.base.daemon:
+            head += ['--daemon', self.base.daemon]
+
+        columns = []
+        for i in range(0, len(paths), self.batch):
+            args = list(head)
+            batch = paths[i:i + self.batch]
+            for j, path in enumerate(batch):
+                args += ['DEF:v%i=%s:%s:AVERAGE' % (j, path.replace(':', '\\:'), ds), 'XPORT:v%i' % j]
+            data = rrdtool.xport(*args)
+            columns.append(np.array(data['data'], dtype=float).reshape(len(data['data']), len(batch)))
+
+        rows = min(len(c) for c in columns)
+        return data['meta']['start'], data['meta']['step'], np.concatenate([c[:rows] for c in columns], axis=1)
+
+    def aggregate(self, metric, time):
+        """
+        @brief      Compute the p50, p95 and maximum of a metric across all
+                    hosts into a single RRD file
+
+        @param      self    The object
+        @param      metric  name of the metric
+        @param      time    number of seconds in the past
+
+        @return     path to the RRD file or None if no host has the RRD file
+        """
+        data = self.fetch(metric, time)
+        if data is None:
+            return None
+
+        start, step, values = data
+        # rows where every host is unknown stay unknown
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            p50, p95 = np.nanpercentile(values, [50, 95], axis=1)
+            peak = np.nanmax(values, axis=1)
+
+        path = os.path.join(self.base.workdir, 'fleet', '%s-%i.rrd' % (metric, time))
+        prrddata.write_rrd(path, start, step, ['p50', 'p95', 'max'], np.stack([p50, p95, peak], axis=1))
+        return path
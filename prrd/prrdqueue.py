@@ -0,0 +1,199 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import fcntl
+import json
+import os
+import time as systime
+
+##
+## @brief      Exclusive lock on a file, so that a run started by cron while
+##             the previous one is still busy does not draw the same images.
+##             The lock is released by the kernel when the process dies.
+##
+class prrdlock:
+
+    def __init__(self, path):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      path  path to the lock file
+        """
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        """
+        @brief      Take the lock without waiting
+
+        @param      self  The object
+
+        @return     True if the lock was taken, False if another process
+                    holds it
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, b'%i\n' % os.getpid())
+        self.fd = fd
+        return True
+
+    def release(self):
+        """
+        @brief      Release the lock
+
+        @param      self  The object
+
+        @return     void
+        """
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+##
+## @brief      Decides which graphs of a run are drawn first and which are
+##             deferred to the next run.
+##
+## Graphs that a previous run did not get to are persisted in a queue file and
+## drawn first by the next run. When the load average per cpu exceeds
+## 'max_load', low priority graphs (by default those of windows longer than a
+## week) are deferred, unless they were deferred before. Graphs that are not
+## started within the time 'budget' of the run are deferred as well.
+##
+class prrdqueue:
+
+    def __init__(self, base, outdir='.', budget=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self    The object
+        @param      base    prrdbase object holding the settings
+        @param      outdir  directory the images are written to, holding
+                            the lock and queue files by default
+        @param      budget  number of seconds a run may start graphs for,
+                            taken from the settings file if omitted
+        """
+        config = base.settings['settings']
+        self.lock = config.get('lock', os.path.join(outdir, '.prrd.lock'))
+        self.path = config.get('queue', os.path.join(outdir, '.prrd-queue.json'))
+        self.budget = budget if budget is not None else config.get('budget')
+        self.max_load = config.get('max_load')
+
+    @staticmethod
+    def get_key(job):
+        """
+        @brief      Get the key a job is stored under in the queue file
+
+        @param      job   prrdjob object
+
+        @return     string
+        """
+        return json.dumps([job.host, job.method, [str(a) for a in job.args]])
+
+    def load(self):
+        """
+        @brief      Read the jobs left over by the previous run
+
+        @param      self  The object
+
+        @return     set of job keys
+        """
+        try:
+            with open(self.path) as f:
+                return set(json.load(f)['pending'])
+        except (OSError, ValueError, KeyError):
+            return set()
+
+    def save(self, jobs):
+        """
+        @brief      Store the jobs to draw first in the next run
+
+        @param      self  The object
+        @param      jobs  list of prrdjob objects
+
+        @return     void
+        """
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'saved': systime.time(), 'pending': [self.get_key(job) for job in jobs]}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def is_busy(self):
+        """
+        @brief      Check whether the load average per cpu exceeds max_load
+
+        @param      self  The object
+
+        @return     True if low priority graphs should be deferred
+        """
+        if self.max_load is None:
+            return False
+
+        return os.getloadavg()[0] / (os.cpu_count() or 1) > self.max_load
+
+    def schedule(self, jobs):
+        """
+        @brief      Order the jobs of a run: jobs left over by the previous
+                    run first, then normal and then low priority jobs
+
+        @param      self  The object
+        @param      jobs  list of prrdjob objects
+
+        @return     tuple of the list of jobs to run and the list of jobs
+                    deferred to the next run
+        """
+        pending = self.load()
+        busy = self.is_busy()
+        first, normal, low, deferred = [], [], [], []
+        for job in jobs:
+            if self.get_key(job) in pending:
+                first.append(job)
+            elif job.priority != 'low':
+                normal.append(job)
+            elif busy:
+                deferred.append(job)
+            else:
+                low.append(job)
+
+        return first + normal + low, deferred
+
+    def get_deadline(self):
+        """
+        @brief      Get the time after which no more graphs are started
+
+        @param      self  The object
+
+        @return     time.monotonic() value or None without budget
+        """
+        if self.budget is None:
+            return None
+
+        return systime.monotonic() + self.budget
@@ -0,0 +1,455 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import copy
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from prrd import prrdexport
+from prrd import prrdgen
+
+##
+## @brief      A single graph to be drawn: the name of a prrdbase method, the
+##             arguments to call it with and the host to draw it for.
+##
+class prrdjob:
+
+    def __init__(self, method, *args, host=None, priority='normal'):
+        """
+        @brief      Constructs the object.
+
+        @param      self      The object
+        @param      method    name of the prrdbase method, e.g. 'graph_load'
+        @param      args      positional arguments passed on to the method
+        @param      host      name of the host, None for the host of the
+                              settings file
+        @param      priority  'normal' or 'low', low priority graphs are
+                              deferred when the host is busy
+        """
+        self.method = method
+        self.args = args
+        self.host = host
+        self.priority = priority
+
+    def __repr__(self):
+        call = '%s(%s)' % (self.method, ', '.join(repr(a) for a in self.args))
+        return call if self.host is None else '%s: %s' % (self.host, call)
+
+##
+## @brief      Outcome of a single prrdjob.
+##
+class prrdresult:
+
+    def __init__(self, job, success, elapsed, error=None, stats=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self     The object
+        @param      job      the prrdjob that was run
+        @param      success  whether the job finished without raising
+        @param      elapsed  wall time in seconds
+        @param      error    error message when the job failed
+        @param      stats    dictionary with the 'status' of the graph
+                             (drawn, cached or missing) and, if rrdtool was
+                             called, the number of 'rrds' and 'defs', the
+                             'rrdtool' time in seconds and the image 'size';
+                             RRD files and windows no archive covers are
+                             listed under 'uncovered' and the lines of PRINT
+                             elements under 'prints'
+        """
+        self.job = job
+        self.success = success
+        self.elapsed = elapsed
+        self.error = error
+        self.stats = stats or {}
+
+    def to_dict(self):
+        """
+        @brief      Get the result as a dictionary, e.g. for a json report
+
+        @param      self  The object
+
+        @return     dictionary
+        """
+        result = {'host': self.job.host, 'method': self.job.method,
+                  'args': [str(a) for a in self.job.args],
+                  'success': self.success, 'elapsed': self.elapsed}
+        if self.error is not None:
+            result['error'] = self.error
+        result.update(self.stats)
+        return result
+
+# status of a graph by the return value of its graph_* method
+STATUS = {True: 'drawn', False: 'cached', None: 'missing'}
+
+# settings file and prrdbase objects of the current (worker) process
+_settings = None
+_shared = {}
+_bases = {}
+# time.monotonic() value of the last scan of the collectd tree of every host
+_scanned = {}
+
+def _init_worker(settings, shared):
+    """
+    Prepare a (worker) process for running jobs
+
+    settings    path to settings json file
+    shared      dictionary mapping hostnames to the prrdhost and prrdindex
+                objects of the parent, so that the worker does not look these
+                up again
+    """
+    global _settings, _shared, _bases, _scanned
+    _settings = settings
+    _shared = shared
+    _bases = {}
+    _scanned = {}
+
+def _get_base(host):
+    """
+    Get the prrdbase object of a host, every object is only built once per
+    process
+
+    host        name of the host or None for the host of the settings file
+
+    @return prrdbase
+    """
+    if host not in _bases:
+        if None not in _bases:
+            _bases[None] = prrdgen.prrdbase(_settings)
+        if host is not None:
+            base = _bases[None].for_host(host)
+            if host in _shared:
+                base.host, base.index = _shared[host]
+            _bases[host] = base
+
+    return _bases[host]
+
+def _get_current_base(host):
+    """
+    Get the prrdbase object of a host for a single request to a long-lived
+    worker. The collectd tree is scanned again every 'rescan' seconds, as by
+    the daemon, and the buffers of the data store are dropped, so that data
+    is fetched up to the current time.
+
+    host        name of the host or None for the host of the settings file
+
+    @return prrdbase
+    """
+    base = _get_base(host)
+    now = time.monotonic()
+    if now - _scanned.setdefault(host, now) >= base.settings['settings'].get('rescan', 3600):
+        base.index = None
+        _scanned[host] = now
+    base.store.plan([])
+    return base
+
+def _run_job(job):
+    """
+    Run a single job on the prrdbase object of its host
+
+    job         prrdjob to run
+
+    @return prrdresult
+    """
+    base = _get_base(job.host)
+    base.stats = {}
+    start = time.perf_counter()
+    try:
+        drawn = getattr(base, job.method)(*job.args)
+    except Exception as e:
+        return prrdresult(job, False, time.perf_counter() - start,
+                          '%s: %s' % (type(e).__name__, e), base.stats)
+
+    elapsed = time.perf_counter() - start
+    base.stats['status'] = STATUS[drawn]
+    return prrdresult(job, True, elapsed, stats=base.stats)
+
+def run_group(jobs):
+    """
+    Run the jobs of a single graph that only differ in their time window, so
+    that they share the fetched data of the prrdbase data store and the
+    modification times of their RRD files
+
+    jobs        list of prrdjob objects
+
+    @return list of prrdresult
+    """
+    base = _get_base(jobs[0].host)
+    # the RRD files change between the groups of a long-lived worker, e.g. of
+    # the daemon, which only scans the collectd tree every 'rescan' seconds
+    base.get_index().mtimes.clear()
+    base.store.plan([job.args[0] for job in jobs], base.width)
+    return [_run_job(job) for job in jobs]
+
+def render_image(method, time, width, height, *args, host=None):
+    """
+    Draw a single graph of a custom size in memory, bypassing the render cache
+
+    method      name of the prrdbase method, e.g. 'graph_load'
+    time        number of seconds in the past
+    width       width of the graph in pixels
+    height      height of the graph in pixels
+    args        further arguments of the method, e.g. the interface
+    host        name of the host or None for the host of the settings file
+
+    @return dictionary returned by rrdtool.graphv, holding the png under
+            'image', or None if RRD files are missing
+    """
+    base = copy.copy(_get_current_base(host))
+    base.width, base.height = width, height
+    return getattr(base, method)(time, '-', *args)
+
+def export_data(type, time, points, format, *args, host=None):
+    """
+    Export the data of a single graph, see prrdbase.export
+
+    type        type of the graph, e.g. 'load'
+    time        number of seconds in the past
+    points      number of rows to downsample to
+    format      'json' or 'csv'
+    args        instance of the graph, if any
+    host        name of the host or None for the host of the settings file
+
+    @return encoded document as bytes or None if RRD files are missing
+    """
+    base = _get_current_base(host)
+    data = base.export(type, time, *args, points=points)
+    if data is None:
+        return None
+
+    return prrdexport.encode(data, format, base.get_title(type, *args))
+
+##
+## @brief      Runs a list of graph jobs on a pool of worker processes.
+##
+class prrdrender:
+
+    def __init__(self, settings, workers=None, bases=()):
+        """
+        @brief      Constructs the object.
+
+        @param      self      The object
+        @param      settings  path to settings json file
+        @param      workers   number of worker processes; taken from the
+                              settings file or the number of cpus if omitted
+        @param      bases     prrdbase objects whose host metadata and index
+                              are shared with the workers, so that these are
+                              not looked up again
+        """
+        self.settings = settings
+        self.shared = {b.hostname: (b.host, b.get_index()) for b in bases}
+        if workers is None:
+            if bases:
+                data = bases[0].settings
+            else:
+                with open(settings) as f:
+                    data = json.load(f)
+            workers = data['settings'].get('workers', os.cpu_count() or 1)
+        self.workers = max(1, workers)
+        # time.monotonic() value after which no more jobs are started
+        self.deadline = None
+        # RRD files and windows that were warned about
+        self.uncovered = set()
+
+    def pool(self):
+        """
+        @brief      Start the pool of worker processes; jobs are handed to the
+                    pool as lists of jobs to run_group
+
+        @param      self  The object
+
+        @return     ProcessPoolExecutor
+        """
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   initializer=_init_worker,
+                                   initargs=(self.settings, self.shared))
+
+    def run(self, jobs):
+        """
+        @brief      Run all jobs and collect their results. Jobs are handed to
+                    the workers one at a time in the order given, so jobs of
+                    different hosts should be interleaved to share the workers
+                    fairly between them.
+
+        @param      self  The object
+        @param      jobs  list of prrdjob objects
+
+        @return     list of prrdresult objects, in the order of jobs; None
+                    for jobs that were not started before the deadline
+        """
+        jobs = list(jobs)
+        groups = self.group(jobs)
+        tasks = [[jobs[i] for i in group] for group in groups]
+
+        # no need to spawn processes for a single worker
+        if self.workers == 1 or len(tasks) <= 1:
+            _init_worker(self.settings, self.shared)
+            results = [None if self.expired() else run_group(task) for task in tasks]
+        else:
+            with self.pool() as pool:
+                results = self.run_until(pool, tasks)
+
+        ordered = [None] * len(jobs)
+        for group, grouped in zip(groups, results):
+            for i, result in zip(group, grouped or ()):
+                ordered[i] = result
+
+        self.warn(ordered)
+        return ordered
+
+    def warn(self, results):
+        """
+        @brief      Warn once about every RRD file and window that no archive
+                    covers; the workers only report these in their results
+
+        @param      self     The object
+        @param      results  list of prrdresult objects or None
+
+        @return     void
+        """
+        for result in results:
+            for path, window in (result.stats.get('uncovered', ()) if result else ()):
+                if (path, window) not in self.uncovered:
+                    self.uncovered.add((path, window))
+                    sys.stderr.write('No archive of %s covers %i seconds, the graph is cut short\n'
+                                     % (path, window))
+
+    def expired(self):
+        """
+        @brief      Check whether the deadline has passed
+
+        @param      self  The object
+
+        @return     True if no more jobs may be started
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def run_until(self, pool, tasks):
+        """
+        @brief      Hand groups of jobs to the pool until the deadline; a few
+                    groups per worker are in flight, so that the remaining
+                    groups can still be held back
+
+        @param      self   The object
+        @param      pool   executor to run the groups on
+        @param      tasks  list of lists of prrdjob objects
+
+        @return     list of lists of prrdresult objects, None for groups that
+                    were not started
+        """
+        results = [None] * len(tasks)
+        waiting = iter(range(len(tasks)))
+        inflight = {}
+        while True:
+            while len(inflight) < 2 * self.workers and not self.expired():
+                i = next(waiting, None)
+                if i is None:
+                    break
+                inflight[pool.submit(run_group, tasks[i])] = i
+            if not inflight:
+                return results
+
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[inflight.pop(future)] = future.result()
+
+    @staticmethod
+    def group(jobs):
+        """
+        @brief      Group the jobs that draw the same graph for different time
+                    windows, e.g. the day and week graph of an interface. These
+                    run on the same worker and share their fetched data and
+                    the modification times of their RRD files.
+
+        @param      jobs  list of prrdjob objects
+
+        @return     list of lists of indices into jobs
+        """
+        groups = {}
+        for i, job in enumerate(jobs):
+            groups.setdefault((job.host, job.method, job.args[2:]), []).append(i)
+
+        return list(groups.values())
+
+    @staticmethod
+    def make_dirs(jobs):
+        """
+        @brief      Create the directories the images of the jobs go to
+
+        @param      jobs  list of prrdjob objects
+
+        @return     void
+        """
+        for outdir in set(os.path.dirname(job.args[1]) for job in jobs):
+            os.makedirs(outdir or '.', exist_ok=True)
+
+    @staticmethod
+    def summary(results):
+        """
+        @brief      Build a human readable summary of a run
+
+        @param      results  list of prrdresult objects
+
+        @return     summary as string
+        """
+        failed = [r for r in results if not r.success]
+        lines = ['%i graphs, %i failed, %.2f s graph time' %
+                 (len(results), len(failed), sum(r.elapsed for r in results))]
+        for r in failed:
+            lines.append('  %r: %s' % (r.job, r.error))
+
+        return '\n'.join(lines)
+
+    @staticmethod
+    def profile(results):
+        """
+        @brief      Build a report of the time spent per graph, slowest first,
+                    preceded by the totals per graph method
+
+        @param      results  list of prrdresult objects
+
+        @return     report as string
+        """
+        methods = {}
+        for r in results:
+            total = methods.setdefault(r.job.method, [0, 0.0])
+            total[0] += 1
+            total[1] += r.elapsed
+
+        lines = ['%8s %6s  %s' % ('time', 'graphs', 'method')]
+        for method, (count, elapsed) in sorted(methods.items(), key=lambda m: -m[1][1]):
+            lines.append('%8.3f %6i  %s' % (elapsed, count, method))
+
+        lines.append('')
+        lines.append('%8s %8s %4s %4s %7s %-7s  %s' % ('time', 'rrdtool', 'rrds', 'defs', 'size', 'status', 'graph'))
+        for r in sorted(results, key=lambda r: -r.elapsed):
+            s = r.stats
+            lines.append('%8.3f %8.3f %4i %4i %7i %-7s  %r' %
+                         (r.elapsed, s.get('rrdtool', 0), s.get('rrds', 0), s.get('defs', 0),
+                          s.get('size', 0), s.get('status', 'failed'), r.job))
+
+        return '\n'.join(lines)
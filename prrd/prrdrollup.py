@@ -0,0 +1,341 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+
+import os
+import sqlite3
+import time as systime
+import zlib
+import numpy as np
+
+from prrd import prrddata
+from prrd.prrdindex import prrdindex
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    plugin TEXT NOT NULL,
+    pinstance TEXT NOT NULL,
+    type TEXT NOT NULL,
+    tinstance TEXT NOT NULL,
+    ds TEXT NOT NULL,
+    cf TEXT NOT NULL,
+    last INTEGER NOT NULL,
+    UNIQUE (host, plugin, pinstance, type, tinstance, ds, cf)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    series INTEGER NOT NULL REFERENCES series (id),
+    time INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, time)
+) WITHOUT ROWID;
+'''
+
+##
+## @brief      Long-term store of the consolidated rows of all RRD files, kept
+##             beyond the retention of the RRD files themselves.
+##
+## Every render run appends the rows that were completed since the last run
+## to an SQLite database: one series per host, collectd names, data source
+## and consolidation function, and rows of the time the row ends, its step and
+## its value. Rows are fetched at a 'step' of an hour by default; the first
+## run of a file goes back 'backfill' seconds, a year by default, and gets
+## the coarser rows of the longest archive. Unknown values are not stored.
+## Every file is due at an offset into the step hashed from its path, so
+## that the files are spread over the runs instead of all being fetched in
+## the first run after the hour.
+## The series are indexed by host and collectd names, the rows by series and
+## time. All keys are read from a 'rollup' block inside the 'settings' block.
+##
+class prrdrollup:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object and opens the database
+
+        @param      self  The object
+        @param      base  prrdbase object holding the settings
+        """
+        self.base = base
+        config = base.settings['settings'].get('rollup', {})
+        self.path = self.get_path(base)
+        self.step = config.get('step', 3600)
+        self.backfill = config.get('backfill', 31622400)
+        self.cfs = config.get('cfs', ['AVERAGE', 'MAX'])
+        # rows ending less than this many seconds ago may still change
+        self.lag = config.get('lag', 120)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def get_path(base):
+        """
+        @brief      Get the path to the database without opening it
+
+        @param      base  prrdbase object holding the settings
+
+        @return     path to the SQLite file
+        """
+        return base.settings['settings'].get('rollup', {}).get('path', 'rollup.sqlite')
+
+    @staticmethod
+    def get_names(root, path):
+        """
+        @brief      Get the collectd names of an RRD file
+
+        @param      root  host directory
+        @param      path  path to RRD file
+
+        @return     tuple of plugin, plugin instance, type and type instance;
+                    absent instances are empty strings
+        """
+        plugin, pinstance = prrdindex.split(os.path.basename(os.path.dirname(path)))
+        type, tinstance = prrdindex.split(os.path.basename(path)[:-4])
+        return plugin, pinstance or '', type, tinstance or ''
+
+    @staticmethod
+    def split_graph(graph):
+        """
+        @brief      Split the graph drawn from the store into its type and
+                    instance
+
+        @param      graph  e.g. 'load', 'df:home' or 'cpu:3'
+
+        @return     tuple of the graph type and instance, None if absent
+        """
+        type, _, instance = graph.partition(':')
+        if type in ('cpu_all', 'internet_all', 'fleet', 'ping_heatmap', 'rollup'):
+            raise ValueError('Graph type %s cannot be drawn from the rollup store' % type)
+        if not instance:
+            return type, None
+        return type, int(instance) if instance.isdigit() else instance
+
+    def update(self, bases):
+        """
+        @brief      Append the rows completed since the last run for every RRD
+                    file of the hosts
+
+        @param      self   The object
+        @param      bases  prrdbase objects of the hosts
+
+        @return     number of rows appended
+        """
+        now = int(systime.time())
+        added = 0
+        with self.db:
+            # overlapping runs append one after the other
+            self.db.execute('BEGIN IMMEDIATE')
+            series = self.get_series()
+            for base in bases:
+                for path in sorted(base.get_index().files):
+                    key = (base.hostname,) + self.get_names(base.get_rrd_root(), path)
+                    for cf in self.cfs:
+                        added += self.append(base, path, key, cf, now, series.get(key + (cf,), {}))
+
+        return added
+
+    def get_series(self):
+        """
+        @brief      Get all series and the time of their last stored row
+
+        @param      self  The object
+
+        @return     dictionary mapping tuples of host, plugin, plugin
+                    instance, type, type instance and consolidation function
+                    to dictionaries mapping data sources to (id, last) tuples
+        """
+        series = {}
+        for row in self.db.execute('SELECT host, plugin, pinstance, type, tinstance, cf, ds, id, last FROM series'):
+            series.setdefault(row[:6], {})[row[6]] = row[7:]
+
+        return series
+
+    def is_due(self, path, last, now):
+        """
+        @brief      Check whether an RRD file has a new row to append; every
+                    file is due at an offset into the step hashed from its
+                    path, so that the files are spread over the runs
+
+        @param      self  The object
+        @param      path  path to RRD file
+        @param      last  end time of the last stored row
+        @param      now   current time in seconds since the epoch
+
+        @return     True if the file is due
+        """
+        slot = zlib.crc32(path.encode('utf-8')) % self.step
+        return last + self.step + self.lag + slot <= now
+
+    def append(self, base, path, key, cf, now, known):
+        """
+        @brief      Append the new rows of an RRD file and consolidation
+                    function
+
+        @param      self   The object
+        @param      base   prrdbase object of the host
+        @param      path   path to RRD file
+        @param      key    tuple of host, plugin, plugin instance, type and
+                           type instance
+        @param      cf     consolidation function
+        @param      now    current time in seconds since the epoch
+        @param      known  dictionary mapping the data sources of the series
+                           stored so far to (id, last) tuples, updated with
+                           new series
+
+        @return     number of rows appended
+        """
+        last = min(last for _, last in known.values()) if known else now - self.backfill
+        if not self.is_due(path, last, now):
+            return 0
+
+        first, step, names, values = prrddata.fetch(path, cf, last, now, self.step, base.daemon)
+        times = first + (np.arange(len(values)) + 1) * step
+        complete = (times > last) & (times + self.lag <= now)
+        if not complete.any():
+            return 0
+
+        added = 0
+        end = int(times[complete][-1])
+        for i, ds in enumerate(names):
+            if ds not in known:
+                cursor = self.db.execute('INSERT INTO series (host, plugin, pinstance, type, tinstance, ds, cf, last) '
+                                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', key + (ds, cf, last))
+                known[ds] = (cursor.lastrowid, last)
+            id = known[ds][0]
+            rows = complete & (times > known[ds][1]) & ~np.isnan(values[:, i])
+            self.db.executemany('INSERT OR IGNORE INTO rows (series, time, step, value) VALUES (?, ?, ?, ?)',
+                                [(id, int(t), int(step), float(v)) for t, v in zip(times[rows], values[rows, i])])
+            self.db.execute('UPDATE series SET last = ? WHERE id = ?', (end, id))
+            added += int(rows.sum())
+
+        return added
+
+    def query(self, host, plugin, start, end, pinstance=None, type=None, tinstance=None, cf='AVERAGE'):
+        """
+        @brief      Get the stored rows of a host and plugin in a period
+
+        @param      self       The object
+        @param      host       name of the host
+        @param      plugin     plugin name, e.g. 'load'
+        @param      start      start time in seconds since the epoch
+        @param      end        end time in seconds since the epoch
+        @param      pinstance  plugin instance, all instances if None
+        @param      type       type name, all types if None
+        @param      tinstance  type instance, all type instances if None
+        @param      cf         consolidation function
+
+        @return     list of (plugin instance, type, type instance, data
+                    source, time, step, value) tuples, ordered by series and
+                    time
+        """
+        sql = ('SELECT s.pinstance, s.type, s.tinstance, s.ds, r.time, r.step, r.value '
+               'FROM series s JOIN rows r ON r.series = s.id '
+               'WHERE s.host = ? AND s.plugin = ? AND s.cf = ? AND r.time > ? AND r.time <= ?')
+        params = [host, plugin, cf, start, end]
+        for column, value in [('pinstance', pinstance), ('type', type), ('tinstance', tinstance)]:
+            if value is not None:
+                sql += ' AND s.%s = ?' % column
+                params.append(value)
+
+        return self.db.execute(sql + ' ORDER BY s.id, r.time', params).fetchall()
+
+    def load(self, host, names, start, end, cf='AVERAGE'):
+        """
+        @brief      Put the stored rows of an RRD file and consolidation
+                    function onto a grid of the step of the store; a row
+                    fills every grid point of the period it consolidates
+
+        @param      self   The object
+        @param      host   name of the host
+        @param      names  tuple of plugin, plugin instance, type and type
+                           instance
+        @param      start  start time of the grid, a multiple of the step
+        @param      end    end time of the grid
+        @param      cf     consolidation function
+
+        @return     tuple of the names of the data sources and a rows x data
+                    sources array, NaN for unknown values
+        """
+        plugin, pinstance, type, tinstance = names
+        rows = self.query(host, plugin, start, end, pinstance, type, tinstance, cf)
+        sources = sorted(set(r[3] for r in rows))
+        grid = np.full(((end - start) // self.step, len(sources)), np.nan)
+        for j, ds in enumerate(sources):
+            data = np.array([r[4:] for r in rows if r[3] == ds], dtype=float).reshape(-1, 3)
+            times, steps, values = data[:, 0], data[:, 1], data[:, 2]
+            lo = np.clip((times - steps - start) // self.step, 0, len(grid)).astype(int)
+            hi = np.clip((times - start) // self.step, 0, len(grid)).astype(int)
+            counts = np.maximum(hi - lo, 0)
+            # the grid points lo..hi of every row, all rows in one go
+            slots = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+            grid[slots, j] = np.repeat(values, counts)
+
+        return sources, grid
+
+    def derive(self, type, instance, time):
+        """
+        @brief      Write the stored data of a graph to RRD files in the
+                    workdir, so that the graph can be drawn from its usual
+                    specification for a window longer than the RRD files
+                    hold. Every consolidation function gets a file of its
+                    own rows, which rrdtool consolidates to pixels; a
+                    function that is not stored is drawn from the averages.
+
+        @param      self      The object
+        @param      type      type of the graph
+        @param      instance  interface, partition, gpu id or ping target
+        @param      time      number of seconds in the past
+
+        @return     tuple of a dictionary mapping RRD keys to the paths of
+                    the averages and a dictionary mapping (path, consolidation
+                    function) to the path of its rows, see prrdbase.share;
+                    None if the store holds no data of the graph
+        """
+        root = self.base.get_rrd_root()
+        end = int(systime.time()) // self.step * self.step
+        start = end - time // self.step * self.step
+        paths = {}
+        derived = {}
+        for key, path in self.base.get_spec(type).get_rrds(root, instance).items():
+            names = self.get_names(root, path)
+            average = self.load(self.base.hostname, names, start, end)
+            if not average[0] or np.isnan(average[1]).all():
+                return None
+            stem = os.path.join(self.base.workdir, self.base.hostname, 'rollup',
+                                '%s-%i' % ('-'.join(n for n in names if n), time))
+            paths[key] = stem + '-AVERAGE.rrd'
+            for cf in ('AVERAGE', 'MIN', 'MAX'):
+                sources, grid = self.load(self.base.hostname, names, start, end, cf) if cf != 'AVERAGE' else average
+                if not sources:
+                    derived[paths[key], cf] = paths[key]
+                    continue
+                derived[paths[key], cf] = '%s-%s.rrd' % (stem, cf)
+                # one more row than the grid, so that the file covers the window
+                prrddata.write_rrd(derived[paths[key], cf], start, self.step, sources, grid,
+                                   ['RRA:AVERAGE:0.5:1:%i' % (len(grid) + 1)])
+
+        return paths, derived
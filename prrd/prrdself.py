@@ -0,0 +1,155 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import os
+import resource
+import socket
+import sys
+
+import rrdtool
+
+from prrd import prrddata
+
+# statistics of a run by the collectd type and type instance they are stored as
+METRICS = [
+    ('duration-run', 'duration'),
+    ('count-drawn', 'drawn'),
+    ('count-cached', 'cached'),
+    ('count-skipped', 'skipped'),
+    ('count-failed', 'failed'),
+    ('memory-peak_rss', 'rss'),
+]
+
+##
+## @brief      Records the statistics of a render run in the collectd tree, so
+##             that prrd can draw its own graph (graph_prrd_self).
+##
+## The statistics are written to RRD files below the 'prrd' plugin directory
+## of the host, in the layout collectd uses. Alternatively they are handed to
+## the collectd unixsock plugin, which then writes them like any other value:
+##
+##     "self_metrics": {"unixsock": "/var/run/collectd-unixsock", "interval": 60}
+##
+class prrdself:
+
+    def __init__(self, base):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      base  prrdbase object holding the settings
+        """
+        self.base = base
+        config = base.settings['settings'].get('self_metrics') or {}
+        if not isinstance(config, dict):
+            config = {}
+        self.unixsock = config.get('unixsock')
+        # expected number of seconds between two runs
+        self.interval = config.get('interval', 60)
+
+    @staticmethod
+    def collect(results, skipped, elapsed):
+        """
+        @brief      Gather the statistics of a run
+
+        @param      results  list of prrdresult objects
+        @param      skipped  list of jobs skipped because RRD files are missing
+        @param      elapsed  wall time of the run in seconds
+
+        @return     dictionary of the statistics, peak RSS in bytes
+        """
+        status = [r.stats.get('status') if r.success else 'failed' for r in results]
+        # kilobytes on Linux, the workers are children of this process
+        rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return {
+            'duration': elapsed,
+            'drawn': status.count('drawn'),
+            'cached': status.count('cached'),
+            'skipped': len(skipped) + status.count('missing'),
+            'failed': status.count('failed'),
+            'rss': rss * 1024,
+        }
+
+    def record(self, values):
+        """
+        @brief      Store the statistics of a run; failures are reported but
+                    do not fail the run
+
+        @param      self    The object
+        @param      values  dictionary of statistics, see collect
+
+        @return     True if the statistics were stored
+        """
+        try:
+            if self.unixsock:
+                self.putval(values)
+            else:
+                self.update(values)
+        except (OSError, rrdtool.OperationalError) as e:
+            sys.stderr.write('Recording the statistics of the run failed: %s\n' % e)
+            return False
+
+        return True
+
+    def update(self, values):
+        """
+        @brief      Write the statistics to the RRD files, which are created
+                    with the archives of collectd when missing
+
+        @param      self    The object
+        @param      values  dictionary of statistics
+
+        @return     void
+        """
+        for name, key in METRICS:
+            path = os.path.join(self.base.get_rrd_root(), 'prrd', name + '.rrd')
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                rrdtool.create(path, '--step', str(self.interval),
+                               'DS:value:GAUGE:%i:0:U' % (2 * self.interval),
+                               *prrddata.collectd_rras(self.interval))
+            rrdtool.update(path, 'N:%r' % float(values[key]))
+
+    def putval(self, values):
+        """
+        @brief      Hand the statistics to the collectd unixsock plugin
+
+        @param      self    The object
+        @param      values  dictionary of statistics
+
+        @return     void
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.unixsock)
+            stream = sock.makefile('rw')
+            for name, key in METRICS:
+                stream.write('PUTVAL "%s/prrd/%s" interval=%i N:%r\n' %
+                             (self.base.hostname, name, self.interval, float(values[key])))
+                stream.flush()
+                # every command is answered by a status line, negative on error
+                reply = stream.readline()
+                if not reply or reply.startswith('-'):
+                    raise OSError('collectd refused %s: %s' % (name, reply.strip()))
@@ -0,0 +1,390 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import asyncio
+import collections
+import functools
+import inspect
+import signal
+import sys
+import time
+import urllib.parse
+
+from prrd import prrdexport
+from prrd import prrdfleet
+from prrd import prrdgen
+from prrd.prrdrender import export_data, prrdrender, render_image
+
+STATUS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+def draw_png(*args, **kwargs):
+    """
+    Draw a graph in memory on a worker process, see render_image
+
+    @return png image as bytes or None if RRD files are missing
+    """
+    graph = render_image(*args, **kwargs)
+    return None if graph is None else graph['image']
+
+##
+## @brief      Least recently used cache of images, bounded by the total
+##             number of bytes of the images it holds.
+##
+class prrdlru:
+
+    def __init__(self, size):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        @param      size  maximum number of bytes to hold
+        """
+        self.size = size
+        self.used = 0
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        """
+        @brief      Get an image and mark it as recently used
+
+        @param      self  The object
+        @param      key   cache key
+
+        @return     image as bytes or None
+        """
+        if key not in self.entries:
+            return None
+
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, image):
+        """
+        @brief      Store an image, the least recently used images are evicted
+                    to stay within the size
+
+        @param      self   The object
+        @param      key    cache key
+        @param      image  image as bytes
+
+        @return     void
+        """
+        if len(image) > self.size:
+            return
+
+        if key in self.entries:
+            self.used -= len(self.entries.pop(key))
+        self.entries[key] = image
+        self.used += len(image)
+        while self.used > self.size:
+            _, old = self.entries.popitem(last=False)
+            self.used -= len(old)
+
+##
+## @brief      HTTP server that draws graphs on request, e.g.
+##
+##                 GET /graph/load?window=week&width=900
+##                 GET /graph/internet?instance=eth0&host=web1
+##                 GET /data/load?window=week&points=200&format=csv
+##
+## Graphs are drawn on a pool of worker processes so that the event loop keeps
+## serving requests. Identical requests that arrive while a graph is being
+## drawn wait for the same render, and drawn images are kept in an LRU cache
+## until the refresh interval of their time window has passed. Exported data
+## is handled the same way.
+##
+class prrdserver:
+
+    def __init__(self, settings, bind=None, port=None, workers=None, hosts=None):
+        """
+        @brief      Constructs the object.
+
+        @param      self      The object
+        @param      settings  path to settings json file
+        @param      bind      address to listen on
+        @param      port      port to listen on
+        @param      workers   number of worker processes
+        @param      hosts     list of host names, "*" or None, see prrdfleet
+        """
+        self.settings = settings
+        self.base = prrdgen.prrdbase(settings)
+        config = self.base.settings['settings'].get('server', {})
+        self.bind = bind or config.get('bind', '127.0.0.1')
+        self.port = port or config.get('port', 8080)
+        self.workers = workers
+        self.max_size = config.get('max_size', 4096)
+        self.lru = prrdlru(config.get('cache_size', 64 * 1024 * 1024))
+        self.inflight = {}
+        self.pool = None
+
+        # the collectd tree is scanned again every so often to pick up new
+        # hosts and RRD files, as by the daemon
+        self.hosts = hosts
+        self.rescan = self.base.settings['settings'].get('rescan', 3600)
+        self.scanned = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        @brief      Look up the hosts and scan their collectd trees again, once
+                    every 'rescan' seconds
+
+        @param      self  The object
+
+        @return     void
+        """
+        now = time.monotonic()
+        if self.scanned is not None and now - self.scanned < self.rescan:
+            return
+
+        self.scanned = now
+        self.base.index = None
+        bases = prrdfleet.prrdfleet(self.base, self.hosts).bases if self.hosts else [self.base]
+        self.bases = {base.hostname: base for base in bases}
+        self.default_host = bases[0].hostname if bases else self.base.hostname
+
+    def run(self):
+        """
+        @brief      Serve requests until stopped by SIGTERM or SIGINT
+
+        @param      self  The object
+
+        @return     void
+        """
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """
+        @brief      Start the worker pool and the server and wait for a signal
+                    to stop
+
+        @param      self  The object
+
+        @return     void
+        """
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+
+        with prrdrender(self.settings, self.workers, list(self.bases.values())).pool() as pool:
+            self.pool = pool
+            server = await asyncio.start_server(self.handle, self.bind, self.port)
+            async with server:
+                await stop.wait()
+
+    async def handle(self, reader, writer):
+        """
+        @brief      Answer a single HTTP request, the connection is closed
+                    afterwards
+
+        @param      self    The object
+        @param      reader  stream to read the request from
+        @param      writer  stream to write the response to
+
+        @return     void
+        """
+        try:
+            line = await asyncio.wait_for(reader.readline(), 10)
+            # the headers are of no interest
+            while (await asyncio.wait_for(reader.readline(), 10)).strip():
+                pass
+
+            status, headers, body = await self.respond(line.decode('latin-1'))
+            if line.startswith(b'HEAD '):
+                headers['Content-Length'], body = len(body), b''
+
+            head = ['HTTP/1.1 %i %s' % (status, STATUS[status])]
+            head += ['%s: %s' % item for item in headers.items()]
+            head += ['Connection: close', '', '']
+            writer.write('\r\n'.join(head).encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, line):
+        """
+        @brief      Build the response to a request line
+
+        @param      self  The object
+        @param      line  request line, e.g. 'GET /graph/load HTTP/1.1'
+
+        @return     tuple of the status code, dictionary of headers and body
+        """
+        parts = line.split()
+        if len(parts) != 3:
+            return self.error(400, 'Malformed request')
+        if parts[0] not in ('GET', 'HEAD'):
+            return self.error(405, 'Only GET and HEAD are supported')
+
+        url = urllib.parse.urlsplit(parts[1])
+        path = url.path.strip('/').split('/')
+        if len(path) != 2 or path[0] not in ('graph', 'data'):
+            return self.error(404, 'Not found, use /graph/<type> or /data/<type>')
+
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            key, call, content_type, expires = self.parse(path[0], path[1], query)
+        except ValueError as e:
+            return self.error(400, str(e))
+        except LookupError as e:
+            return self.error(404, str(e))
+
+        try:
+            body = await self.get(key, call)
+        except Exception as e:
+            sys.stderr.write('%s: %s: %s\n' % (parts[1], type(e).__name__, e))
+            return self.error(500, 'Drawing the graph failed')
+        if body is None:
+            return self.error(404, 'RRD files missing')
+
+        return 200, {'Content-Type': content_type, 'Content-Length': len(body),
+                     'Cache-Control': 'max-age=%i' % expires}, body
+
+    def parse(self, kind, type, query):
+        """
+        @brief      Check the parameters of a request
+
+        @param      self   The object
+        @param      kind   'graph' for an image, 'data' for exported data
+        @param      type   type of the graph
+        @param      query  dictionary of query parameters: window, instance
+                           and host; width and height of images; points and
+                           format (json or csv) of exported data
+
+        @return     tuple of the cache key, the call to run on the worker
+                    pool, the content type and the number of seconds the
+                    response stays valid
+        """
+        self.refresh()
+        type = 'df_root' if type == 'diskspace' else type
+        host = query.get('host', self.default_host)
+        if host not in self.bases:
+            raise LookupError('Unknown host: %s' % host)
+        base = self.bases[host]
+
+        method = 'graph_' + type
+        if not hasattr(base, method):
+            raise LookupError('Unknown graph type: %s' % type)
+
+        window = base.get_window(query.get('window', 'day'))
+        names = ['points'] if kind == 'data' else ['width', 'height']
+        try:
+            size = tuple(int(query.get(name, getattr(base, name, base.width))) for name in names)
+        except ValueError:
+            raise ValueError('%s must be integers' % ' and '.join(names).capitalize())
+        if not all(0 < n <= self.max_size for n in size):
+            raise ValueError('%s must be between 1 and %i' % (' and '.join(names).capitalize(), self.max_size))
+        format = query.get('format', 'json')
+        if kind == 'data' and format not in prrdexport.FORMATS:
+            raise ValueError('Unknown format: %s' % format)
+
+        # graphs of cpu cores and gpus take a number as instance
+        instance = query.get('instance')
+        if instance is not None and instance.isdigit():
+            instance = int(instance)
+        params = list(inspect.signature(getattr(base, method)).parameters.values())[2:]
+        if instance is None and params:
+            if params[0].default is inspect.Parameter.empty:
+                raise ValueError('Graph type %s needs an instance' % type)
+            instance = params[0].default
+        if instance is not None and not params:
+            raise ValueError('Graph type %s takes no instance' % type)
+        args = () if instance is None else (instance,)
+
+        if not all(base.rrd_exists(path) for path in base.get_graph_rrds(type, instance)):
+            raise LookupError('RRD files missing')
+
+        if kind == 'data':
+            call = functools.partial(export_data, type, window, size[0], format, *args, host=host)
+            content_type = prrdexport.FORMATS[format]
+        else:
+            call = functools.partial(draw_png, method, window, size[0], size[1], *args, host=host)
+            content_type = 'image/png'
+
+        # responses are valid until the next refresh of their time window
+        refresh = base.get_refresh(window)
+        now = time.time()
+        key = (kind, host, type, instance, window, size, format, int(now // refresh))
+        return key, call, content_type, refresh - now % refresh
+
+    async def get(self, key, call):
+        """
+        @brief      Get a response body from the LRU cache, or run its call on
+                    the worker pool. Concurrent requests for the same body
+                    share a single call.
+
+        @param      self  The object
+        @param      key   cache key
+        @param      call  function drawing the image or exporting the data
+
+        @return     body as bytes or None if RRD files are missing
+        """
+        body = self.lru.get(key)
+        if body is not None:
+            return body
+
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, call)
+            self.inflight[key] = future
+            future.add_done_callback(functools.partial(self.done, key))
+
+        # a client hanging up must not cancel the call of the others
+        return await asyncio.shield(future)
+
+    def done(self, key, future):
+        """
+        @brief      Store a finished call in the LRU cache
+
+        @param      self    The object
+        @param      key     cache key
+        @param      future  future of the render
+
+        @return     void
+        """
+        del self.inflight[key]
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            self.lru.put(key, future.result())
+
+    @staticmethod
+    def error(status, message):
+        """
+        @brief      Build an error response
+
+        @param      status   HTTP status code
+        @param      message  error message
+
+        @return     tuple of the status code, dictionary of headers and body
+        """
+        body = (message + '\n').encode('utf-8')
+        return status, {'Content-Type': 'text/plain; charset=utf-8', 'Content-Length': len(body)}, body
@@ -0,0 +1,346 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import os
+
+##
+## @brief      Specification of a graph: its RRD files, data definitions,
+##             stacked areas and legend rows. A specification compiles to
+##             the rrdtool graph argument vector.
+##
+## RRD files are given relative to the host directory and may refer to the
+## graph instance, e.g. 'interface-{instance}/if_octets.rrd'. The compiled
+## argument template of a time window and image size is cached, so only the
+## paths, the title and the footer are filled in per graph.
+##
+## Usage note: remember to use \\n for newlines, see:
+## https://github.com/oetiker/rrdtool-1.x/issues/23
+##
+class prrdspec:
+
+    def __init__(self, title, rrds, options=()):
+        """
+        @brief      Constructs the object.
+
+        @param      self     The object
+        @param      title    title of the graph, may refer to {instance}
+        @param      rrds     list of (key, path) tuples of the RRD files read
+                             by the graph; the path is relative to the host
+                             directory unless absolute and may refer to
+                             {instance}
+        @param      options  graph specific rrdtool options
+        """
+        self.title = title
+        self.rrds = list(rrds)
+        self.options = list(options)
+        self.elements = []
+        self.templates = {}
+
+    def get_rrds(self, root, instance=None):
+        """
+        @brief      Get the RRD files read by the graph
+
+        @param      self      The object
+        @param      root      host directory
+        @param      instance  graph instance
+
+        @return     dictionary mapping RRD keys to paths
+        """
+        return {key: os.path.join(root, path.format(instance=instance)) for key, path in self.rrds}
+
+    def define(self, name, rrd, ds='value', cf='AVERAGE'):
+        """
+        @brief      Add a data definition (DEF)
+
+        @param      self  The object
+        @param      name  name of the variable
+        @param      rrd   key of the RRD file
+        @param      ds    name of the data source
+        @param      cf    consolidation function
+
+        @return     the object
+        """
+        self.elements.append('DEF:%s={%s}:%s:%s' % (name, rrd, ds, cf))
+        return self
+
+    def calc(self, name, rpn):
+        """
+        @brief      Add a calculated variable (CDEF)
+
+        @param      self  The object
+        @param      name  name of the variable
+        @param      rpn   RPN expression
+
+        @return     the object
+        """
+        self.elements.append('CDEF:%s=%s' % (name, rpn))
+        return self
+
+    def var(self, name, rpn):
+        """
+        @brief      Add a variable that reduces a series to a value (VDEF)
+
+        @param      self  The object
+        @param      name  name of the variable
+        @param      rpn   RPN expression
+
+        @return     the object
+        """
+        self.elements.append('VDEF:%s=%s' % (name, rpn))
+        return self
+
+    def stack(self, names, cdef='cdef-%s', below=None):
+        """
+        @brief      Stack series on top of each other; unknown values count as
+                    zero
+
+        @param      self   The object
+        @param      names  variables from the bottom to the top of the stack
+        @param      cdef   pattern of the names of the stacked variables
+        @param      below  variable the stack is put on, drawn as it is
+
+        @return     the object
+        """
+        for name in names:
+            rpn = '%s,UN,0,%s,IF' % (name, name)
+            if below is not None:
+                rpn += ',%s,+' % below
+            below = cdef % name
+            self.calc(below, rpn)
+
+        return self
+
+    def area(self, name, colour, label=None):
+        """
+        @brief      Add a filled area
+
+        @param      self    The object
+        @param      name    variable to draw
+        @param      colour  colour as #RRGGBB
+        @param      label   legend label
+
+        @return     the object
+        """
+        self.elements.append('AREA:%s%s' % (name, colour) + (':' + label if label is not None else ''))
+        return self
+
+    def line(self, name, colour, label=None):
+        """
+        @brief      Add a line
+
+        @param      self    The object
+        @param      name    variable to draw
+        @param      colour  colour as #RRGGBB
+        @param      label   legend label
+
+        @return     the object
+        """
+        self.elements.append('LINE1:%s%s' % (name, colour) + (':' + label if label is not None else ''))
+        return self
+
+    def gprint(self, name, fmt, cf=None):
+        """
+        @brief      Print a value in the legend
+
+        @param      self  The object
+        @param      name  variable to print
+        @param      fmt   printf format
+        @param      cf    consolidation function, omitted for VDEFs
+
+        @return     the object
+        """
+        self.elements.append('GPRINT:%s:' % name + (cf + ':' if cf else '') + fmt)
+        return self
+
+    def legend(self, name, fmt, prefix='', last='Last\\n', max='Max,'):
+        """
+        @brief      Print the average, minimum, maximum and last value of a
+                    series in the legend
+
+        @param      self    The object
+        @param      name    variable to print
+        @param      fmt     printf format of a single value
+        @param      prefix  text in front of the average, e.g. to align rows
+        @param      last    label of the last value, ends the legend row
+        @param      max     label of the maximum
+
+        @return     the object
+        """
+        self.gprint(name, prefix + fmt + ' Avg,', 'AVERAGE')
+        self.gprint(name, fmt + ' Min,', 'MIN')
+        self.gprint(name, fmt + ' ' + max, 'MAX')
+        self.gprint(name, fmt + ' ' + last, 'LAST')
+        return self
+
+    def comment(self, text):
+        """
+        @brief      Add a line of text
+
+        @param      self  The object
+        @param      text  the text
+
+        @return     the object
+        """
+        self.elements.append('COMMENT:' + text)
+        return self
+
+    def raw(self, arg):
+        """
+        @brief      Add an rrdtool argument as it is, e.g. TEXTALIGN
+
+        @param      self  The object
+        @param      arg   the argument
+
+        @return     the object
+        """
+        self.elements.append(arg)
+        return self
+
+    def get_defs(self):
+        """
+        @brief      List the data definitions of the graph
+
+        @param      self  The object
+
+        @return     list of (name, RRD key, consolidation function) tuples
+        """
+        defs = []
+        for element in self.elements:
+            if element.startswith('DEF:'):
+                name, _, rest = element[4:].partition('=')
+                defs.append((name, rest.split('}')[0][1:], rest.rpartition(':')[2]))
+
+        return defs
+
+    @staticmethod
+    def resolve(arg, resolutions):
+        """
+        @brief      Set the consolidation function and step of a DEF argument
+
+        @param      arg          DEF argument with the path filled in
+        @param      resolutions  dictionary mapping DEF names to tuples of the
+                                 consolidation function and seconds per row
+
+        @return     DEF argument
+        """
+        name = arg[4:].partition('=')[0]
+        if name not in resolutions:
+            return arg
+
+        cf, step = resolutions[name]
+        return '%s:%s:step=%i' % (arg.rpartition(':')[0], cf, step)
+
+    def compile(self, time, width, height, font):
+        """
+        @brief      Compile the argument template of a time window and image
+                    size; templates are cached
+
+        @param      self    The object
+        @param      time    number of seconds in the past
+        @param      width   width of the graph in pixels
+        @param      height  height of the graph in pixels
+        @param      font    rrdtool font specification
+
+        @return     tuple of the argument template and the positions of the
+                    arguments that refer to paths or the title
+        """
+        key = (time, width, height, font)
+        if key not in self.templates:
+            args = ['--imgformat', 'PNG',
+                    '--width', str(width),
+                    '--height', str(height),
+                    '--start', 'end - ' + str(time),
+                    '--end', 'now',
+                    '--title', '{title}',
+                    '--font', font]
+            args += self.options + self.elements + ['COMMENT: \\n']
+            fields = [i for i, arg in enumerate(args) if arg == '{title}' or arg.startswith('DEF:')]
+            self.templates[key] = (args, fields)
+
+        return self.templates[key]
+
+    def export(self, time, points, paths, resolutions=None):
+        """
+        @brief      Build the rrdtool xport arguments of the data drawn in the
+                    graph: its DEFs and CDEFs and an XPORT per labelled line,
+                    or per DEF if no line is labelled
+
+        @param      self         The object
+        @param      time         number of seconds in the past
+        @param      points       number of rows to downsample to
+        @param      paths        dictionary mapping RRD keys to paths
+        @param      resolutions  dictionary mapping DEF names to tuples of
+                                 the consolidation function and seconds per
+                                 row of the archive to read, see resolve
+
+        @return     list of rrdtool xport arguments
+        """
+        values = {key: path.replace(':', '\\:') for key, path in paths.items()}
+        args = ['--start', 'end - ' + str(time),
+                '--end', 'now',
+                '--step', str(max(1, time // points)),
+                '--maxrows', str(points)]
+        series = []
+        for element in self.elements:
+            kind, _, rest = element.partition(':')
+            if kind == 'DEF':
+                args.append(self.resolve(element.format_map(values), resolutions or {}))
+            elif kind == 'CDEF':
+                args.append(element)
+            elif kind == 'LINE1' and rest.count(':'):
+                name, _, label = rest.partition(':')
+                series.append((name.partition('#')[0], label.strip()))
+        if not series:
+            series = [(arg[4:].partition('=')[0],) * 2 for arg in args if arg.startswith('DEF:')]
+
+        return args + ['XPORT:%s:%s' % s for s in series]
+
+    def build(self, time, width, height, font, paths, title, footer=(), resolutions=None):
+        """
+        @brief      Build the rrdtool graph arguments
+
+        @param      self         The object
+        @param      time         number of seconds in the past
+        @param      width        width of the graph in pixels
+        @param      height       height of the graph in pixels
+        @param      font         rrdtool font specification
+        @param      paths        dictionary mapping RRD keys to paths
+        @param      title        title of the graph
+        @param      footer       COMMENT arguments appended to the graph
+        @param      resolutions  dictionary mapping DEF names to tuples of
+                                 the consolidation function and seconds per
+                                 row of the archive to read, see resolve
+
+        @return     list of rrdtool graph arguments
+        """
+        template, fields = self.compile(time, width, height, font)
+        values = {key: path.replace(':', '\\:') for key, path in paths.items()}
+        values['title'] = title
+        args = list(template)
+        for i in fields:
+            args[i] = template[i].format_map(values)
+            if resolutions and args[i].startswith('DEF:'):
+                args[i] = self.resolve(args[i], resolutions)
+
+        return args + list(footer)
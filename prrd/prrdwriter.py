@@ -0,0 +1,135 @@
+ ##################################################################################
+ # The MIT License (MIT)
+ # Copyright (c) 2018 ifilot
+ #
+ # Permission is hereby granted, free of charge, to any person obtaining a copy
+ # of this software and associated documentation files (the "Software"), to deal
+ # in the Software without restriction, including without limitation the rights
+ # to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ # copies of the Software, and to permit persons to whom the Software is
+ # furnished to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be included in all
+ # copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+ # IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+ # DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+ # OR OTHER DEALINGS IN THE SOFTWARE
+ #
+ ##################################################################################
+
+import hashlib
+import json
+import os
+import tempfile
+import time as systime
+
+##
+## @brief      Writes images atomically.
+##
+## An image is written to a temporary file next to it and renamed over the old
+## image, so that a web server never serves a half written file. Whether an
+## image needs to be drawn and written at all is up to the render cache. The
+## hashes of the written images can be published in an index json file, e.g.
+## for use as ETag.
+##
+class prrdwriter:
+
+    def __init__(self):
+        """
+        @brief      Constructs the object.
+
+        @param      self  The object
+        """
+        # path -> (size, mtime_ns, sha1) of the files seen by this process
+        self.hashes = {}
+
+    def get_hash(self, path):
+        """
+        @brief      Get the content hash of a file, files are only read again
+                    when their size or modification time changed
+
+        @param      self  The object
+        @param      path  path to the file
+
+        @return     sha1 as hex string or None if the file does not exist
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        known = self.hashes.get(path)
+        if known is not None and known[:2] == (st.st_size, st.st_mtime_ns):
+            return known[2]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.hashes[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def write(self, path, image):
+        """
+        @brief      Write an image and remember its hash
+
+        @param      self   The object
+        @param      path   path to the image file
+        @param      image  image as bytes
+
+        @return     void
+        """
+        fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                       prefix='.' + os.path.basename(path) + '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            # mkstemp creates files only readable by the owner
+            os.chmod(tmpfile, 0o644)
+            os.replace(tmpfile, path)
+        except BaseException:
+            os.remove(tmpfile)
+            raise
+
+        st = os.stat(path)
+        self.hashes[path] = (st.st_size, st.st_mtime_ns, hashlib.sha1(image).hexdigest())
+
+    def update_index(self, path, imgfiles):
+        """
+        @brief      Record the hash, size and modification time of images in
+                    an index json file. Names are relative to the directory of
+                    the index, entries of other images are kept.
+
+        @param      self      The object
+        @param      path      path to the index json file
+        @param      imgfiles  list of paths to image files
+
+        @return     void
+        """
+        root = os.path.dirname(os.path.abspath(path))
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {'images': {}}
+
+        for imgfile in imgfiles:
+            name = os.path.relpath(os.path.abspath(imgfile), root)
+            entry = index['images'].get(name, {})
+            if imgfile not in self.hashes and 'mtime_ns' in entry:
+                # images the render cache kept are not read again
+                self.hashes[imgfile] = (entry['size'], entry['mtime_ns'], entry['sha1'])
+            digest = self.get_hash(imgfile)
+            if digest is None:
+                index['images'].pop(name, None)
+                continue
+            size, mtime_ns, _ = self.hashes[imgfile]
+            index['images'][name] = {'sha1': digest, 'size': size, 'mtime': mtime_ns / 1e9, 'mtime_ns': mtime_ns}
+        index['updated'] = systime.time()
+
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
@@ -22,63 +22,12 @@
  #
  ##################################################################################
 
-import os
-from prrd import prrdgen
+import sys
+from prrd.prrdcli import main
 
 #
-# GRAPH TYPES
+# Draws all graphs listed under 'graphs' in settings.json, see
 #
-# load - load average
-# cpu  - cpu usage (idle, user, etc.)
+#   python -m prrd render --help
 #
-
-# construct object
-p = prrdgen.prrdbase('settings.json')
-
-# generate load graphs
-p.create_graph('load', 86400, 'load_day.png')
-p.create_graph('load', 86400 * 7, 'load_week.png')
-
-# generate cpu usage graphs
-p.create_graph('cpu', 86400, 'cpu_day.png')
-p.create_graph('cpu', 86400 * 7, 'cpu_week.png')
-
-# generate memory usage
-p.create_graph('memory', 86400, 'memory_day.png')
-p.create_graph('memory', 86400 * 7, 'memory_week.png')
-
-# generate internet usage graphs
-interfaces = ['eno1', 'eth0', 'wlan0', 'enp4s0f0', 'enp0s25', 'enp10s0', 'wlx74da387f8eed', 'enxb827eb10dc2b', 'enp2s0', 'usb0']
-for interface in interfaces:
-	p.graph_internet(86400, interface + '_day.png', interface)
-	p.graph_internet(86400 * 7, interface + '_week.png', interface)
-
-# generate GPU data
-for i in range(0,10):
-	p.graph_gpu_temperature(86400, 'temperature_gpu_%02i.png' % i, i)
-	p.graph_gpu_power(86400, 'power_gpu_%02i.png' % i, i)
-	p.graph_gpu_utilization(86400, 'utilization_gpu_%02i.png' % i, i)
-	p.graph_gpu_fan(86400, 'fan_gpu_%02i.png' % i, i)
-
-# generate temperature graphs
-p.create_graph('temperature', 86400 * 7, 'temperature_week.png')
-
-# generate disk space for 100 days
-p.create_graph('diskspace', 86400 * 100, 'disk_root_100days.png')
-
-# generate disk space for other partitions
-partitions = ['storage-disk1', 'storage', '/dev/md0']
-for partition in partitions:
-	p.graph_df(86400 * 100, 'disk_%s_100days.png' % partition, partition)
-
-# create any ping websites
-path = p.get_rrd_root() + "/ping"
-if os.path.isdir(path):
-	for filename in os.listdir(path):
-		if filename.startswith("ping-") and filename.endswith(".rrd"):
-			website = filename[5:-4]
-			p.graph_ping(86400 * 7, 'ping_%s_week.png' % website, website)
-
-# invalid user logins and fail2ban
-p.graph_ssh_invalid_user(86400 * 7, 'ssh_invalid.png')
-p.graph_fail2ban(86400 * 7, 'fail2ban.png')
+sys.exit(main(['render', '--settings', 'settings.json'] + sys.argv[1:]))
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from prrd.prrdgraphs import SPECS
+
+# rrdtool graph arguments of the graph_* methods of the original prrdgen.py,
+# captured with rrdtool.graph replaced by a stub for host 'host', a width of
+# 450, a height of 100 and a window of a day
+with open(os.path.join(os.path.dirname(__file__), 'baseline_graphs.json')) as f:
+    BASELINE = json.load(f)
+
+# graph_* method to graph type and instance
+GRAPHS = {
+    'graph_load': ('load', None),
+    'graph_cpu': ('cpu', 0),
+    'graph_memory': ('memory', None),
+    'graph_utilization': ('memory', None),
+    'graph_internet': ('internet', 'eth0'),
+    'graph_ping': ('ping', 'example.com'),
+    'graph_gpu_temperature': ('gpu_temperature', 0),
+    'graph_gpu_power': ('gpu_power', 0),
+    'graph_gpu_utilization': ('gpu_utilization', 0),
+    'graph_gpu_fan': ('gpu_fan', 0),
+    'graph_temperature': ('temperature_rpi', None),
+    'graph_temperature_mac': ('temperature', None),
+    'graph_df_root': ('df_root', None),
+    'graph_df': ('df', 'home'),
+    'graph_ssh_invalid_user': ('ssh_invalid_user', None),
+    'graph_fail2ban': ('fail2ban', None),
+}
+
+# options without a value
+FLAGS = {'-Y', '-r'}
+
+def normalize(args):
+    """
+    Reduce rrdtool graph arguments to what is drawn: the options in any order,
+    with '-v Bytes/s' taken as '-v', 'Bytes/s', and the graph elements in
+    order with the variables they draw expanded into their definitions, so
+    that renamed or unused CDEFs make no difference
+
+    args        rrdtool graph arguments
+
+    @return tuple of the sorted options and the list of elements
+    """
+    options, elements, names = [], [], {}
+    args = iter(args)
+    for arg in args:
+        if arg.startswith('-'):
+            option, _, value = arg.partition(' ')
+            if not value and option not in FLAGS:
+                value = next(args)
+            options.append((option, value))
+            continue
+
+        kind, _, rest = arg.partition(':')
+        if kind == 'DEF':
+            name, _, source = rest.partition('=')
+            names[name] = '<%s>' % source
+        elif kind in ('CDEF', 'VDEF'):
+            name, _, rpn = rest.partition('=')
+            tokens = [names.get(t, t) for t in rpn.split(',')]
+            names[name] = tokens[0] if len(tokens) == 1 else '(%s)' % ','.join(tokens)
+        else:
+            var, sep, tail = rest.partition(':')
+            var, hash, colour = var.partition('#')
+            elements.append('%s:%s%s%s%s%s' % (kind, names.get(var, var), hash, colour, sep, tail))
+
+    return sorted(options), elements
+
+@pytest.mark.parametrize('method', sorted(GRAPHS))
+def test_matches_baseline(method):
+    type, instance = GRAPHS[method]
+    baseline = BASELINE[method]
+    spec = SPECS[type]
+    title = baseline[baseline.index('--title') + 1]
+    args = spec.build(86400, 450, 100, 'DEFAULT:8', spec.get_rrds('/var/lib/collectd/rrd/host', instance),
+                      title, baseline[-2:])
+    assert normalize(args) == normalize(baseline)
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+pytest.importorskip('rrdtool')
+
+from prrd import prrdbench
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'bench_baseline.json')
+
+def test_work_matches_baseline(tmp_path):
+    # the files and DEFs read do not depend on the days of data
+    layout = {'cores': 4, 'interfaces': 2, 'partitions': 2, 'gpus': 1, 'targets': 2, 'windows': 'day,week,100days'}
+    tree = str(tmp_path / 'rrd')
+    hosts = prrdbench.make_tree(tree, 1, 2, 60, **{k: v for k, v in layout.items() if k != 'windows'})
+    bench = prrdbench.prrdbench(tree, hosts, layout['windows'].split(','), 1)
+    results = bench.time_methods()
+
+    report, regressed = prrdbench.prrdbench.compare(results, BASELINE, work=bench.work, layout=layout)
+    assert [name for name in regressed if name.startswith('work/')] == [], report
@@ -0,0 +1,64 @@
+import math
+import types
+
+import pytest
+
+pytest.importorskip('rrdtool')
+
+from prrd.prrdrollup import prrdrollup
+
+STEP = 3600
+NAMES = ('load', '', 'load', '')
+
+def make_store(tmp_path):
+    settings = {'settings': {'rollup': {'path': str(tmp_path / 'rollup.sqlite'), 'step': STEP, 'lag': 120}}}
+    return prrdrollup(types.SimpleNamespace(settings=settings))
+
+def add_rows(store, cf, rows):
+    cursor = store.db.execute('INSERT INTO series (host, plugin, pinstance, type, tinstance, ds, cf, last) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', ('host',) + NAMES + ('shortterm', cf, 0))
+    store.db.executemany('INSERT INTO rows (series, time, step, value) VALUES (?, ?, ?, ?)',
+                         [(cursor.lastrowid,) + row for row in rows])
+
+def test_files_are_due_at_their_slot(tmp_path):
+    store = make_store(tmp_path)
+    last = 10 * STEP
+    for i in range(20):
+        path = '/var/lib/collectd/rrd/host/cpu-%i/cpu-idle.rrd' % i
+        first = next(now for now in range(last, last + 3 * STEP) if store.is_due(path, last, now))
+        # due once the step, the lag and the offset of the file have passed
+        assert 0 <= first - last - STEP - store.lag < STEP
+        assert all(store.is_due(path, last, now) for now in range(first, last + 3 * STEP, 61))
+
+def test_slots_spread_over_the_step(tmp_path):
+    store = make_store(tmp_path)
+    last = 10 * STEP
+    now = last + STEP + store.lag + STEP // 2
+    paths = ['/var/lib/collectd/rrd/host/interface-eth%i/if_octets.rrd' % i for i in range(400)]
+    due = sum(store.is_due(path, last, now) for path in paths)
+    # about half of the files are due halfway through the step
+    assert 120 < due < 280
+
+def test_load_fills_the_grid_points_of_a_row(tmp_path):
+    store = make_store(tmp_path)
+    start = 100 * STEP
+    add_rows(store, 'AVERAGE', [(start + STEP, STEP, 1.0),
+                                # a row of two steps fills two grid points
+                                (start + 4 * STEP, 2 * STEP, 2.0),
+                                # a row reaching back before the grid is cut off
+                                (start, 2 * STEP, 5.0)])
+    sources, grid = store.load('host', NAMES, start, start + 5 * STEP)
+
+    assert sources == ['shortterm']
+    assert grid.shape == (5, 1)
+    assert [None if math.isnan(v) else v for v in grid[:, 0]] == [1.0, None, 2.0, 2.0, None]
+
+def test_load_reads_the_rows_of_a_consolidation_function(tmp_path):
+    store = make_store(tmp_path)
+    start = 100 * STEP
+    add_rows(store, 'AVERAGE', [(start + STEP, STEP, 1.0)])
+    add_rows(store, 'MAX', [(start + STEP, STEP, 3.0)])
+
+    assert store.load('host', NAMES, start, start + STEP)[1][0, 0] == 1.0
+    assert store.load('host', NAMES, start, start + STEP, 'MAX')[1][0, 0] == 3.0
+    assert store.load('host', NAMES, start, start + STEP, 'MIN')[0] == []
@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+rrdtool = pytest.importorskip('rrdtool')
+pytestmark = pytest.mark.skipif(shutil.which('rrdcached') is None, reason='rrdcached is not installed')
+
+from prrd import prrdgen
+
+@pytest.fixture
+def rrdcached(tmp_path):
+    # a write timeout of an hour holds every update back until it is flushed
+    sock = tmp_path / 'rrdcached.sock'
+    proc = subprocess.Popen(['rrdcached', '-g', '-w', '3600', '-z', '0',
+                             '-l', 'unix:%s' % sock, '-p', str(tmp_path / 'rrdcached.pid')],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(50):
+        if sock.exists():
+            break
+        time.sleep(0.1)
+    yield 'unix:%s' % sock
+    proc.terminate()
+    proc.wait()
+
+@pytest.fixture
+def base(tmp_path, rrdcached):
+    path = tmp_path / 'rrd' / 'host' / 'load' / 'load.rrd'
+    path.parent.mkdir(parents=True)
+    start = int(time.time()) - 3600
+    rrdtool.create(str(path), '--start', str(start), '--step', '10',
+                   *['DS:%s:GAUGE:20:0:U' % ds for ds in ('shortterm', 'midterm', 'longterm')],
+                   'RRA:AVERAGE:0.5:1:1200', 'RRA:MAX:0.5:1:1200')
+    rrdtool.update(str(path), *['%i:1:1:1' % t for t in range(start + 10, start + 3590, 10)])
+
+    settings = tmp_path / 'settings.json'
+    settings.write_text(json.dumps({'settings': {
+        'width': 450, 'height': 100, 'hostname': 'host', 'base_path': str(tmp_path / 'rrd') + '/',
+        'cache': str(tmp_path / 'cache'), 'workdir': str(tmp_path / 'work'), 'daemon': rrdcached}}))
+    return prrdgen.prrdbase(str(settings)), str(path)
+
+def test_graph_reads_through_rrdcached(base, tmp_path):
+    base, path = base
+    assert base.graph_load(86400, '-')['image'].startswith(b'\x89PNG')
+
+def test_render_cache_sees_held_back_updates(base, tmp_path):
+    base, path = base
+    imgfile = str(tmp_path / 'load.png')
+    assert base.graph_load(3600, imgfile) is True
+
+    # the update only reaches the file when it is flushed
+    mtime = os.stat(path).st_mtime
+    time.sleep(1.1)
+    rrdtool.update(path, '--daemon', base.daemon, 'N:5:5:5')
+    assert os.stat(path).st_mtime == mtime
+
+    base.index = None
+    assert base.graph_load(3600, imgfile) is True
+    assert os.stat(path).st_mtime > mtime
@@ -0,0 +1,15 @@
+import pytest
+
+from prrd.prrdgraphs import SPECS
+
+FOOTER = ['COMMENT:Generated 2018-01-01 00\\:00\\:00']
+
+def build(spec):
+    paths = {key: '/var/lib/collectd/rrd/host/%s.rrd' % key for key, _ in spec.rrds}
+    return spec.build(86400, 450, 100, 'DEFAULT:8', paths, 'host / title', FOOTER)
+
+@pytest.mark.parametrize('type', sorted(SPECS))
+def test_no_raw_newlines(type):
+    # rrdtool rejects a real newline in COMMENT and GPRINT, legends end with \\n
+    args = build(SPECS[type])
+    assert [a for a in args if '\n' in a] == []